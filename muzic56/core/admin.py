@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Music, Playlist, PlaylistSong
+from django.utils import timezone
+from .models import CustomUser, Job, Music, Playlist, PlaylistSong
 
 
 @admin.register(CustomUser)
@@ -17,42 +18,50 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(Music)
 class MusicAdmin(admin.ModelAdmin):
-    list_display = ['title', 'artist', 'uploaded_by', 'uploaded_at', 'like_count']
-    list_filter = ['uploaded_at', 'artist']
+    list_display = ['title', 'artist', 'uploaded_by', 'uploaded_at', 'like_count', 'processing_status']
+    list_filter = ['uploaded_at', 'artist', 'processing_status']
     search_fields = ['title', 'artist', 'uploaded_by__username']
     readonly_fields = ['uploaded_at', 'like_count']
     date_hierarchy = 'uploaded_at'
-    
-    def like_count(self, obj):
-        return obj.like_count()
-    like_count.short_description = 'تعداد لایک'
 
 
 class PlaylistSongInline(admin.TabularInline):
     model = PlaylistSong
     extra = 1
     raw_id_fields = ['song']
+    fields = ['song', 'position']
 
 
 @admin.register(Playlist)
 class PlaylistAdmin(admin.ModelAdmin):
-    list_display = ['name', 'owner', 'created_at', 'is_public', 'song_count']
+    list_display = ['name', 'owner', 'created_at', 'updated_at', 'is_public', 'song_count']
     list_filter = ['is_public', 'created_at', 'owner']
     search_fields = ['name', 'owner__username', 'description']
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'updated_at', 'song_count', 'total_duration', 'cover_song']
+    list_select_related = ['owner']
     inlines = [PlaylistSongInline]
     date_hierarchy = 'created_at'
-    
-    def song_count(self, obj):
-        return obj.songs.count()
-    song_count.short_description = 'تعداد آهنگ'
 
 
 @admin.register(PlaylistSong)
 class PlaylistSongAdmin(admin.ModelAdmin):
-    list_display = ['playlist', 'song', 'added_at']
+    list_display = ['playlist', 'song', 'position', 'added_at']
     list_filter = ['added_at', 'playlist']
     search_fields = ['playlist__name', 'song__title']
     readonly_fields = ['added_at']
     date_hierarchy = 'added_at'
 
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'attempts', 'run_after', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['created_at', 'finished_at', 'locked_by', 'locked_until', 'last_error']
+    actions = ['retry_jobs']
+
+    def retry_jobs(self, request, queryset):
+        queryset.exclude(status=Job.STATUS_RUNNING).update(
+            status=Job.STATUS_QUEUED, attempts=0, run_after=timezone.now(), finished_at=None
+        )
+    retry_jobs.short_description = 'اجرای دوباره'
@@ -0,0 +1,431 @@
+"""
+خواندن مشخصات فایل صوتی (مدت، bitrate، codec و تگ‌ها) فقط از روی هدرها، بدون decode.
+
+این ماژول به Django وابسته نیست تا در پروسس‌های جدای backfill هم قابل اجرا باشد.
+"""
+import os
+import struct
+
+
+MP3_SCAN_LIMIT = 64 * 1024  # برای پیدا کردن اولین فریم بعد از تگ ID3
+MAX_TAG_SIZE = 1024 * 1024  # تگ‌های بزرگ‌تر (معمولاً به خاطر کاور) فقط تا این حد خوانده می‌شوند
+MAX_MOOV_SIZE = 16 * 1024 * 1024
+
+MPEG_VERSION_1 = 3
+MPEG_VERSION_2 = 2
+MPEG_VERSION_25 = 0
+
+MP3_BITRATES = {
+    (MPEG_VERSION_1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (MPEG_VERSION_1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (MPEG_VERSION_1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (MPEG_VERSION_2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (MPEG_VERSION_2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (MPEG_VERSION_2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = {
+    MPEG_VERSION_1: (44100, 48000, 32000),
+    MPEG_VERSION_2: (22050, 24000, 16000),
+    MPEG_VERSION_25: (11025, 12000, 8000),
+}
+
+
+class AudioParseError(ValueError):
+    pass
+
+
+class FrameHeader:
+    __slots__ = ("version", "layer", "bitrate", "sample_rate", "padding", "channels", "length", "samples")
+
+    def __init__(self, version, layer, bitrate, sample_rate, padding, channels):
+        self.version = version
+        self.layer = layer
+        self.bitrate = bitrate  # kbps
+        self.sample_rate = sample_rate
+        self.padding = padding
+        self.channels = channels
+        if layer == 1:
+            self.samples = 384
+            self.length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+        else:
+            self.samples = 576 if layer == 3 and version != MPEG_VERSION_1 else 1152
+            self.length = self.samples // 8 * bitrate * 1000 // sample_rate + padding
+
+
+def parse_frame_header(data, offset=0):
+    """هدر ۴ بایتی فریم MPEG را می‌خواند؛ اگر هدر معتبر نباشد None برمی‌گرداند."""
+    if len(data) < offset + 4:
+        return None
+    b1, b2, b3, b4 = data[offset:offset + 4]
+    if b1 != 0xFF or b2 & 0xE0 != 0xE0:
+        return None
+    version = (b2 >> 3) & 0x03
+    layer = 4 - ((b2 >> 1) & 0x03)
+    bitrate_index = b3 >> 4
+    rate_index = (b3 >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    table_version = MPEG_VERSION_1 if version == MPEG_VERSION_1 else MPEG_VERSION_2
+    return FrameHeader(
+        version=version,
+        layer=layer,
+        bitrate=MP3_BITRATES[(table_version, layer)][bitrate_index],
+        sample_rate=MP3_SAMPLE_RATES[version][rate_index],
+        padding=(b3 >> 1) & 0x01,
+        channels=1 if (b4 >> 6) == 3 else 2,
+    )
+
+
+def find_first_frame(data, start=0):
+    """
+    اولین فریم را بعد از start پیدا می‌کند. برای اطمینان از اینکه بایت‌های تصادفی
+    شبیه هدر نیستند، هدر فریم بعدی هم باید معتبر باشد.
+    """
+    position = data.find(b"\xff", start)
+    while position != -1:
+        header = parse_frame_header(data, position)
+        if header is not None:
+            following = parse_frame_header(data, position + header.length)
+            if following is not None or position + header.length >= len(data):
+                return position, header
+        position = data.find(b"\xff", position + 1)
+    return None, None
+
+
+def id3v2_size(head):
+    """اندازه‌ی کل تگ ID3v2 در ابتدای فایل (با هدر و footer)، یا صفر."""
+    if len(head) < 10 or head[:3] != b"ID3":
+        return 0
+    size = _syncsafe(head[6:10])
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_text(data):
+    if not data:
+        return ""
+    encoding, text = data[0], data[1:]
+    if encoding == 1:
+        value = text.decode("utf-16", errors="replace")
+    elif encoding == 2:
+        value = text.decode("utf-16-be", errors="replace")
+    elif encoding == 3:
+        value = text.decode("utf-8", errors="replace")
+    else:
+        value = text.decode("latin-1")
+    # ID3v2.4 چند مقدار را با \0 جدا می‌کند؛ اولی کافی است
+    return value.split("\x00")[0].strip()
+
+
+def parse_id3v2(tag):
+    major = tag[3]
+    names = {"title": ("TT2",), "artist": ("TP1",)} if major == 2 else {
+        "title": ("TIT2",),
+        "artist": ("TPE1",),
+    }
+    wanted = {frame_id: key for key, ids in names.items() for frame_id in ids}
+    header_size = 6 if major == 2 else 10
+    position = 10
+    if major >= 3 and tag[5] & 0x40:
+        # extended header
+        ext = tag[10:14]
+        position += _syncsafe(ext) if major == 4 else struct.unpack(">I", ext)[0] + 4
+
+    tags = {}
+    while position + header_size <= len(tag):
+        if major == 2:
+            frame_id = tag[position:position + 3]
+            size = int.from_bytes(tag[position + 3:position + 6], "big")
+        else:
+            frame_id = tag[position:position + 4]
+            raw = tag[position + 4:position + 8]
+            size = _syncsafe(raw) if major == 4 else struct.unpack(">I", raw)[0]
+        if not frame_id.strip(b"\x00") or size <= 0:
+            break
+        key = wanted.get(frame_id.decode("latin-1"))
+        if key and key not in tags:
+            value = _decode_text(tag[position + header_size:position + header_size + size])
+            if value:
+                tags[key] = value
+        position += header_size + size
+    return tags
+
+
+def parse_id3v1(tail):
+    if len(tail) < 128 or tail[-128:-125] != b"TAG":
+        return {}
+    block = tail[-128:]
+    tags = {}
+    for key, field in (("title", block[3:33]), ("artist", block[33:63])):
+        value = field.split(b"\x00")[0].decode("latin-1").strip()
+        if value:
+            tags[key] = value
+    return tags
+
+
+def _xing_frames(frame, header):
+    """تعداد فریم‌ها از هدر Xing/Info یا VBRI، برای محاسبه‌ی دقیق مدت فایل‌های VBR."""
+    if header.version == MPEG_VERSION_1:
+        side_info = 17 if header.channels == 1 else 32
+    else:
+        side_info = 9 if header.channels == 1 else 17
+    xing = frame[4 + side_info:]
+    if xing[:4] in (b"Xing", b"Info") and len(xing) >= 12:
+        flags = struct.unpack(">I", xing[4:8])[0]
+        if flags & 0x01:
+            return struct.unpack(">I", xing[8:12])[0]
+    vbri = frame[36:]
+    if vbri[:4] == b"VBRI" and len(vbri) >= 18:
+        return struct.unpack(">I", vbri[14:18])[0]
+    return None
+
+
+def probe_mp3(f, file_size):
+    head = f.read(10)
+    tag_size = id3v2_size(head)
+    tags = {}
+    if tag_size:
+        f.seek(0)
+        tags.update(parse_id3v2(f.read(min(tag_size, MAX_TAG_SIZE))))
+
+    f.seek(tag_size)
+    data = f.read(MP3_SCAN_LIMIT)
+    position, header = find_first_frame(data)
+    if header is None:
+        raise AudioParseError("No MPEG audio frame found")
+
+    f.seek(max(file_size - 128, 0))
+    tail = f.read(128)
+    v1 = parse_id3v1(tail)
+    for key, value in v1.items():
+        tags.setdefault(key, value)
+
+    audio_start = tag_size + position
+    audio_bytes = file_size - audio_start - (128 if v1 or tail[:3] == b"TAG" else 0)
+    frames = _xing_frames(data[position:position + header.length], header)
+    if frames:
+        duration = frames * header.samples / header.sample_rate
+        bitrate = round(audio_bytes * 8 / duration / 1000) if duration else header.bitrate
+    else:
+        # بدون هدر Xing فایل CBR فرض می‌شود
+        bitrate = header.bitrate
+        duration = audio_bytes * 8 / (bitrate * 1000)
+
+    return {
+        "codec": "mp3",
+        "duration": duration,
+        "bitrate": bitrate,
+        "sample_rate": header.sample_rate,
+        "channels": header.channels,
+        **tags,
+    }
+
+
+def probe_wav(f, file_size):
+    header = f.read(12)
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise AudioParseError("Not a RIFF/WAVE file")
+
+    fmt = None
+    data_size = None
+    tags = {}
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        padded = size + (size & 1)
+        if chunk_id == b"fmt ":
+            fmt = f.read(size)
+            f.seek(padded - size, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            data_size = min(size, file_size - f.tell())
+            f.seek(padded, os.SEEK_CUR)
+        elif chunk_id == b"LIST" and size <= MAX_TAG_SIZE:
+            tags.update(_parse_riff_info(f.read(size)))
+            f.seek(padded - size, os.SEEK_CUR)
+        else:
+            f.seek(padded, os.SEEK_CUR)
+
+    if fmt is None or len(fmt) < 16 or data_size is None:
+        raise AudioParseError("WAV file has no fmt or data chunk")
+    audio_format, channels, sample_rate, byte_rate = struct.unpack("<HHII", fmt[:12])
+    if not byte_rate:
+        raise AudioParseError("WAV byte rate is zero")
+    return {
+        "codec": "pcm" if audio_format in (1, 0xFFFE) else f"wav-{audio_format}",
+        "duration": data_size / byte_rate,
+        "bitrate": round(byte_rate * 8 / 1000),
+        "sample_rate": sample_rate,
+        "channels": channels,
+        **tags,
+    }
+
+
+def _parse_riff_info(data):
+    if data[:4] != b"INFO":
+        return {}
+    keys = {b"INAM": "title", b"IART": "artist"}
+    tags = {}
+    position = 4
+    while position + 8 <= len(data):
+        chunk_id, size = data[position:position + 4], struct.unpack("<I", data[position + 4:position + 8])[0]
+        key = keys.get(chunk_id)
+        if key:
+            value = data[position + 8:position + 8 + size].split(b"\x00")[0]
+            value = value.decode("utf-8", errors="replace").strip()
+            if value:
+                tags[key] = value
+        position += 8 + size + (size & 1)
+    return tags
+
+
+def _iter_boxes(data, start=0, end=None):
+    end = len(data) if end is None else end
+    position = start
+    while position + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[position:position + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[position + 8:position + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header:
+            return
+        yield box_type, position + header, min(position + size, end)
+        position += size
+
+
+def _find_box(data, path, start=0, end=None):
+    for box_type, body, box_end in _iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return body, box_end
+            return _find_box(data, path[1:], body, box_end)
+    return None
+
+
+def probe_m4a(f, file_size):
+    """
+    moov و اندازه‌ی mdat با پرش روی باکس‌های سطح بالا پیدا می‌شوند؛ خود mdat خوانده نمی‌شود.
+    """
+    moov = None
+    mdat_size = 0
+    position = 0
+    while position + 8 <= file_size:
+        f.seek(position)
+        header = f.read(16)
+        size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - position
+        if size < header_size:
+            break
+        if box_type == b"moov":
+            if size > MAX_MOOV_SIZE:
+                raise AudioParseError("moov box is too large")
+            f.seek(position + header_size)
+            moov = f.read(size - header_size)
+        elif box_type == b"mdat":
+            mdat_size += size - header_size
+        position += size
+
+    if moov is None:
+        raise AudioParseError("No moov box found")
+
+    found = _find_box(moov, [b"mvhd"])
+    if found is None:
+        raise AudioParseError("No mvhd box found")
+    body, _ = found
+    if moov[body] == 1:
+        timescale, duration = struct.unpack(">IQ", moov[body + 20:body + 32])
+    else:
+        timescale, duration = struct.unpack(">II", moov[body + 12:body + 20])
+    if not timescale:
+        raise AudioParseError("mvhd timescale is zero")
+    seconds = duration / timescale
+
+    info = {"codec": "", "duration": seconds, "sample_rate": None, "channels": None}
+    for box_type, body, box_end in _iter_boxes(moov):
+        if box_type != b"trak":
+            continue
+        stsd = _find_box(moov, [b"mdia", b"minf", b"stbl", b"stsd"], body, box_end)
+        if stsd is None:
+            continue
+        # stsd: نسخه/فلگ (۴) + تعداد (۴) و بعد اولین sample entry
+        entry = stsd[0] + 8
+        entry_type = moov[entry + 4:entry + 8]
+        if entry_type in (b"mp4a", b"alac", b"ac-3", b"ec-3", b"Opus", b"fLaC"):
+            fields = moov[entry + 8:entry + 36]
+            info["codec"] = "aac" if entry_type == b"mp4a" else entry_type.decode("latin-1").strip().lower()
+            info["channels"] = struct.unpack(">H", fields[16:18])[0]
+            info["sample_rate"] = struct.unpack(">I", fields[24:28])[0] >> 16
+            break
+
+    if not info["codec"]:
+        raise AudioParseError("No audio track found")
+    info["bitrate"] = round(mdat_size * 8 / seconds / 1000) if seconds and mdat_size else None
+
+    ilst = _find_box(moov, [b"udta", b"meta"])
+    if ilst is not None:
+        # meta یک full box است: ۴ بایت نسخه/فلگ قبل از فرزندان
+        ilst = _find_box(moov, [b"ilst"], ilst[0] + 4, ilst[1])
+    if ilst is not None:
+        keys = {b"\xa9nam": "title", b"\xa9ART": "artist"}
+        for box_type, body, box_end in _iter_boxes(moov, *ilst):
+            key = keys.get(box_type)
+            data = _find_box(moov, [b"data"], body, box_end) if key else None
+            if data is not None:
+                value = moov[data[0] + 8:data[1]].decode("utf-8", errors="replace").strip()
+                if value:
+                    info[key] = value
+    return info
+
+
+def detect_format(head, filename=""):
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[4:8] == b"ftyp":
+        return "m4a"
+    if head[:3] == b"ID3" or parse_frame_header(head) is not None:
+        return "mp3"
+    ext = os.path.splitext(filename)[1].lower()
+    return {".mp3": "mp3", ".wav": "wav", ".m4a": "m4a", ".mp4": "m4a"}.get(ext)
+
+
+PROBES = {"mp3": probe_mp3, "wav": probe_wav, "m4a": probe_m4a}
+
+
+def probe_audio(path):
+    """
+    مشخصات فایل را برمی‌گرداند: codec، duration (ثانیه)، bitrate (kbps)، sample_rate،
+    channels و در صورت وجود title و artist از تگ‌ها.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(12)
+        kind = detect_format(head, path)
+        if kind is None:
+            raise AudioParseError("Unknown audio format")
+        f.seek(0)
+        try:
+            return PROBES[kind](f, file_size)
+        except (struct.error, IndexError, ZeroDivisionError) as e:
+            raise AudioParseError(f"Corrupt {kind} file: {e}") from e
+
+
+def read_tags(path):
+    """فقط title و artist؛ برای پر کردن فرم آپلود وقتی کاربر آن‌ها را خالی گذاشته."""
+    try:
+        info = probe_audio(path)
+    except (AudioParseError, OSError):
+        return {}
+    return {key: info[key] for key in ("title", "artist") if info.get(key)}
@@ -0,0 +1,130 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+
+from .models import AudioBlob
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    همان TemporaryFileUploadHandler، ولی sha256 فایل را همزمان با رسیدن تکه‌ها حساب
+    می‌کند تا بعد از آپلود لازم نباشد فایل دوباره خوانده شود.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.digest.hexdigest()
+        return uploaded
+
+
+PEAKS_SUFFIX = ".peaks"
+
+
+def peaks_path(audio_path):
+    return audio_path + PEAKS_SUFFIX
+
+
+def write_sidecar(path, data):
+    """فایل کناری (ساخته‌شده از فایل صوتی) را اتمیک می‌نویسد تا خواننده‌ها نیمه‌کاره‌اش را نبینند."""
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def blob_name(sha256, filename):
+    ext = os.path.splitext(filename)[1].lower()[:10]
+    return f"music/blobs/{sha256[:2]}/{sha256}{ext}"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def store_blob(source_path, sha256, filename, refs=1):
+    """
+    فایل source_path را با آدرس محتوا ذخیره و refs ارجاع به blob اضافه می‌کند.
+    اگر همین بایت‌ها قبلاً ذخیره شده باشند، فایل جدید بعد از commit حذف می‌شود.
+    اگر تراکنش صدازننده برگردد، باید restore_source را صدا بزند.
+    """
+    size = os.path.getsize(source_path)
+    with transaction.atomic():
+        blob, created = AudioBlob.objects.get_or_create(
+            sha256=sha256, defaults={"name": blob_name(sha256, filename), "size": size}
+        )
+        if created:
+            destination = default_storage.path(blob.name)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            file_move_safe(source_path, destination, allow_overwrite=True)
+            # فایل موقت آپلود 0600 است و move مجوزش را نگه می‌دارد؛ nginx (X-Accel-Redirect)
+            # با کاربر دیگری اجرا می‌شود و باید بتواند فایل را بخواند
+            os.chmod(destination, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+        AudioBlob.objects.filter(sha256=sha256).update(ref_count=F("ref_count") + refs)
+
+    if not created:
+        # تا commit نشده فایل منبع لازم است؛ ممکن است ردیف‌هایی هنوز به آن اشاره کنند
+        transaction.on_commit(lambda: _remove_if_exists(source_path))
+    blob.refresh_from_db(fields=["ref_count"])
+    return blob
+
+
+def _remove_if_exists(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def restore_source(source_path, sha256, filename):
+    """
+    بعد از برگشتن تراکنشی که store_blob در آن صدا زده شده: فایلی که به انبار منتقل شده
+    و حالا ردیف AudioBlob ندارد به source_path برگردانده می‌شود.
+    """
+    destination = default_storage.path(blob_name(sha256, filename))
+    if os.path.exists(source_path) or not os.path.exists(destination):
+        return
+    if AudioBlob.objects.filter(sha256=sha256).exists():
+        return
+    file_move_safe(destination, source_path)
+
+
+def release_blob(sha256):
+    """یک ارجاع کم می‌کند؛ وقتی به صفر برسد blob و فایلش حذف می‌شوند."""
+    with transaction.atomic():
+        AudioBlob.objects.filter(sha256=sha256, ref_count__gt=0).update(
+            ref_count=F("ref_count") - 1
+        )
+        blob = AudioBlob.objects.filter(sha256=sha256, ref_count=0).first()
+        if blob is None or blob.songs.exists():
+            return
+        name = blob.name
+        blob.delete()
+        transaction.on_commit(lambda: delete_blob_files(name))
+
+
+def delete_blob_files(name):
+    """فایل blob و فایل‌های کناری ساخته‌شده از آن (مثل <name>.frames و <name>.peaks) را پاک می‌کند."""
+    path = default_storage.path(name)
+    directory, base = os.path.split(path)
+    default_storage.delete(name)
+    if not os.path.isdir(directory):
+        return
+    for entry in os.listdir(directory):
+        if entry.startswith(base + "."):
+            os.remove(os.path.join(directory, entry))
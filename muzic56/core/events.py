@@ -0,0 +1,250 @@
+"""
+رویدادهای زنده (تعداد لایک آهنگ‌ها و وضعیت پردازش آپلودها) برای endpoint SSE.
+
+کد sync (view ها، signal ها، کارهای runworker) با publish رویداد می‌فرستد؛ رویداد بعد از
+commit تراکنش به backend می‌رسد. backend رویدادها را به hub هر پروسس ASGI می‌رساند و
+hub آن‌ها را بین listenerهای همان پروسس پخش می‌کند. listener فقط یک صف کوچک در حافظه
+است و تا رویدادی نرسد هیچ کاری (و هیچ کوئری‌ای) ندارد.
+
+EVENTS_BACKEND:
+- "local": فقط داخل همین پروسس؛ برای یک سرور تنها که کارهای پس‌زمینه را هم خودش اجرا می‌کند.
+- "database": رویداد در جدول Event نوشته می‌شود و یک thread در هر پروسس ASGI (فقط وقتی
+  listener دارد) ردیف‌های تازه را می‌خواند؛ runworker و چند پروسس وب رویدادها را شریک می‌شوند.
+- یا مسیر کامل یک کلاس با متدهای publish(channel, kind, data) و start().
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Event
+
+
+logger = logging.getLogger(__name__)
+
+
+def music_channel(music_id):
+    return f"music:{music_id}"
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+class Listener:
+    """صف رویدادهای یک اتصال SSE؛ با پر شدن، قدیمی‌ترین رویداد دور ریخته می‌شود."""
+    __slots__ = ("loop", "channels", "pending", "ready")
+
+    def __init__(self, loop, channels, max_pending):
+        self.loop = loop
+        self.channels = channels
+        self.pending = deque(maxlen=max_pending)
+        self.ready = asyncio.Event()
+
+    def _put(self, event):
+        self.pending.append(event)
+        self.ready.set()
+
+    def deliver(self, event):
+        # از هر threadی قابل صدا زدن است؛ خود صف فقط در event loop تغییر می‌کند
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    async def next_events(self, timeout):
+        """رویدادهای رسیده را برمی‌گرداند؛ اگر تا timeout چیزی نرسد لیست خالی."""
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self.ready.clear()
+        events = list(self.pending)
+        self.pending.clear()
+        return events
+
+
+class Hub:
+    """listenerهای این پروسس بر اساس channel."""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels, max_pending=None):
+        listener = Listener(
+            asyncio.get_running_loop(),
+            frozenset(channels),
+            max_pending or getattr(settings, "EVENTS_MAX_PENDING", 32),
+        )
+        with self._lock:
+            for channel in listener.channels:
+                self._channels.setdefault(channel, set()).add(listener)
+        get_backend().start()
+        return listener
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            for channel in listener.channels:
+                listeners = self._channels.get(channel)
+                if listeners is not None:
+                    listeners.discard(listener)
+                    if not listeners:
+                        del self._channels[channel]
+
+    def has_listeners(self):
+        return bool(self._channels)
+
+    def dispatch(self, channel, kind, data):
+        with self._lock:
+            listeners = list(self._channels.get(channel, ()))
+        event = (kind, data)
+        for listener in listeners:
+            try:
+                listener.deliver(event)
+            except RuntimeError:
+                # event loop اتصال بسته شده است
+                self.unsubscribe(listener)
+
+
+hub = Hub()
+
+
+class LocalBackend:
+    def publish(self, channel, kind, data):
+        hub.dispatch(channel, kind, data)
+
+    def start(self):
+        pass
+
+
+class DatabaseBackend:
+    """
+    publish یک ردیف Event می‌نویسد. thread خواننده فقط وقتی این پروسس listener دارد
+    هر poll_interval ثانیه یک کوئری می‌زند، مستقل از تعداد listenerها.
+    """
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, poll_interval, retention):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._last_prune = 0
+        self._listening_since = None
+
+    def publish(self, channel, kind, data):
+        Event.objects.create(channel=channel, kind=kind, data=data)
+        if time.monotonic() - self._last_prune > self.PRUNE_INTERVAL:
+            self._last_prune = time.monotonic()
+            Event.objects.filter(
+                created_at__lt=timezone.now() - timedelta(seconds=self.retention)
+            ).delete()
+
+    def start(self):
+        with self._start_lock:
+            if self._listening_since is None:
+                self._listening_since = timezone.now()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        last_id = None
+        while True:
+            time.sleep(self.poll_interval)
+            if not hub.has_listeners():
+                # رویدادهای زمان بی‌listener بودن لازم نیستند
+                with self._start_lock:
+                    if not hub.has_listeners():
+                        self._listening_since = None
+                last_id = None
+                continue
+            try:
+                if last_id is None:
+                    # اولین خواندن: از لحظه‌ای که اولین listener وصل شد
+                    pending = Event.objects.filter(created_at__gte=self._listening_since)
+                else:
+                    pending = Event.objects.filter(id__gt=last_id)
+                rows = list(
+                    pending.order_by("id").values_list("id", "channel", "kind", "data")[:500]
+                )
+                for event_id, channel, kind, data in rows:
+                    hub.dispatch(channel, kind, data)
+                    last_id = event_id
+            except Exception:
+                logger.exception("Failed to read live events")
+                close_old_connections()
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        name = getattr(settings, "EVENTS_BACKEND", "database")
+        if name == "local":
+            _backend = LocalBackend()
+        elif name == "database":
+            _backend = DatabaseBackend(
+                poll_interval=getattr(settings, "EVENTS_POLL_INTERVAL", 0.5),
+                retention=getattr(settings, "EVENTS_RETENTION", 300),
+            )
+        else:
+            _backend = import_string(name)()
+    return _backend
+
+
+def publish(channel, kind, data):
+    """رویداد را بعد از commit تراکنش فعلی (یا همین الان، بیرون از تراکنش) می‌فرستد."""
+    def send():
+        try:
+            get_backend().publish(channel, kind, data)
+        except Exception:
+            # رویداد زنده نباید نوشتن اصلی را خراب کند
+            logger.exception("Failed to publish %s event to %s", kind, channel)
+
+    transaction.on_commit(send)
+
+
+def like_count_changed(music_id, like_count):
+    publish(music_channel(music_id), "like_count", {"music_id": music_id, "like_count": like_count})
+
+
+def processing_changed(music_id, user_id, status):
+    publish(user_channel(user_id), "processing", {"music_id": music_id, "status": status})
+
+
+def format_event(kind, data):
+    return f"event: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def sse_stream(listener, expires_at):
+    """
+    بدنه‌ی پاسخ text/event-stream. هر heartbeat ثانیه یک comment می‌فرستد تا proxyها
+    اتصال بی‌کار را نبندند؛ در expires_at (انقضای توکن) با رویداد expired تمام می‌شود
+    تا کلاینت با توکن تازه وصل شود.
+    """
+    heartbeat = getattr(settings, "EVENTS_HEARTBEAT", 15)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                yield format_event("expired", {})
+                return
+            events = await listener.next_events(min(heartbeat, remaining))
+            if events:
+                yield "".join(format_event(kind, data) for kind, data in events)
+            else:
+                yield ": ping\n\n"
+    finally:
+        # قطع اتصال کلاینت هم generator را می‌بندد
+        hub.unsubscribe(listener)
@@ -0,0 +1,165 @@
+import logging
+import os
+import random
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = 60 * 60
+
+
+class JobType:
+    def __init__(self, name, func, max_attempts, timeout, on_failure):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.on_failure = on_failure
+
+
+_registry = {}
+
+
+def job(name, max_attempts=None, timeout=None, on_failure=None):
+    """
+    تابع را به عنوان نوع کار name ثبت می‌کند. تابع با payload کار (به صورت kwargs)
+    صدا زده می‌شود و باید با چند بار اجرا شدن مشکلی نداشته باشد.
+    on_failure بعد از آخرین تلاش ناموفق با همان payload صدا زده می‌شود.
+    """
+    def decorator(func):
+        _registry[name] = JobType(
+            name,
+            func,
+            max_attempts or getattr(settings, "JOB_MAX_ATTEMPTS", 5),
+            timeout or getattr(settings, "JOB_VISIBILITY_TIMEOUT", 300),
+            on_failure,
+        )
+        return func
+    return decorator
+
+
+def enqueue(kind, payload=None, delay=0, unique=False):
+    """
+    کار را در صف می‌گذارد. داخل تراکنش صدا زده شود تا همراه داده‌ی اصلی commit شود.
+    با unique=True اگر همین کار با همین payload هنوز در صف باشد، کار دیگری ساخته نمی‌شود.
+    """
+    job_type = _registry[kind]
+    payload = payload or {}
+    if unique and Job.objects.filter(kind=kind, payload=payload, status=Job.STATUS_QUEUED).exists():
+        return None
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        max_attempts=job_type.max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def retry_delay(attempts):
+    # backoff نمایی با کمی jitter تا کارهای شکست‌خورده همزمان برنگردند
+    base = getattr(settings, "JOB_RETRY_BACKOFF", 10)
+    delay = min(base * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+    return delay * random.uniform(1.0, 1.25)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _claimable(now):
+    # کارهای منتظر، یا کارهایی که worker شان در زمان قفل تمامشان نکرده است
+    return Q(status=Job.STATUS_QUEUED, run_after__lte=now) | Q(
+        status=Job.STATUS_RUNNING, locked_until__lt=now
+    )
+
+
+def claim_jobs(worker, limit):
+    """
+    حداکثر limit کار را برمی‌دارد و (id, token) آن‌ها را برمی‌گرداند.
+    برداشتن با update شرطی انجام می‌شود تا دو worker یک کار را با هم برندارند.
+    """
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(_claimable(now))
+        .order_by("run_after", "id")
+        .values_list("id", "kind")[: limit * 2]
+    )
+    claimed = []
+    for job_id, kind in candidates:
+        job_type = _registry.get(kind)
+        timeout = job_type.timeout if job_type else getattr(settings, "JOB_VISIBILITY_TIMEOUT", 300)
+        token = f"{worker}:{uuid.uuid4().hex[:8]}"
+        updated = Job.objects.filter(_claimable(now), id=job_id).update(
+            status=Job.STATUS_RUNNING,
+            locked_by=token,
+            locked_until=now + timedelta(seconds=timeout),
+            attempts=F("attempts") + 1,
+        )
+        if updated:
+            claimed.append((job_id, token))
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def execute_job(job_id, token):
+    """یک کار برداشته‌شده را اجرا می‌کند؛ هم در thread و هم در پروسس جدا قابل اجراست."""
+    try:
+        current = Job.objects.filter(id=job_id, locked_by=token).first()
+        if current is None:
+            # بعد از تمام شدن زمان قفل، worker دیگری کار را برداشته است
+            return
+        job_type = _registry.get(current.kind)
+        try:
+            if job_type is None:
+                raise LookupError(f"Unknown job kind: {current.kind}")
+            if current.attempts > current.max_attempts:
+                raise TimeoutError("Job did not finish within its visibility timeout")
+            job_type.func(**current.payload)
+        except Exception:
+            logger.exception("Job %s (%s) failed", current.id, current.kind)
+            _record_failure(current, token, job_type, traceback.format_exc())
+        else:
+            Job.objects.filter(id=current.id, locked_by=token).update(
+                status=Job.STATUS_DONE,
+                locked_until=None,
+                finished_at=timezone.now(),
+                last_error="",
+            )
+    finally:
+        connections.close_all()
+
+
+def _record_failure(current, token, job_type, error):
+    now = timezone.now()
+    if current.attempts < current.max_attempts and job_type is not None:
+        Job.objects.filter(id=current.id, locked_by=token).update(
+            status=Job.STATUS_QUEUED,
+            run_after=now + timedelta(seconds=retry_delay(current.attempts)),
+            locked_until=None,
+            last_error=error,
+        )
+        return
+
+    Job.objects.filter(id=current.id, locked_by=token).update(
+        status=Job.STATUS_FAILED,
+        locked_until=None,
+        finished_at=now,
+        last_error=error,
+    )
+    if job_type is not None and job_type.on_failure is not None:
+        try:
+            job_type.on_failure(**current.payload)
+        except Exception:
+            logger.exception("on_failure handler of job %s failed", current.id)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from core.audio_meta import AudioParseError
+from core.models import Music
+from core.seek_index import write_frame_index
+
+
+class Command(BaseCommand):
+    help = "Build the MP3 frame index sidecar used by ?t= seeking for every stored MP3."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild indexes that already exist.",
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Music.objects.filter(codec="mp3")
+            .order_by("audio_file")
+            .values_list("audio_file", flat=True)
+            .distinct()
+        )
+        built = skipped = failed = 0
+        for name in names.iterator():
+            path = Music.audio_file.field.storage.path(name)
+            try:
+                if write_frame_index(path, force=options["force"]):
+                    built += 1
+                else:
+                    skipped += 1
+            except (AudioParseError, OSError) as e:
+                failed += 1
+                self.stderr.write(f"{name}: {e}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Built {built} indexes, {skipped} already existed, {failed} failed.")
+        )
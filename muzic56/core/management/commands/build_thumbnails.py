@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.jobs import enqueue
+from core.models import CustomUser, Music, Playlist
+
+
+class Command(BaseCommand):
+    help = "Queue thumbnail jobs for existing song covers, profile images and playlist mosaics."
+
+    def handle(self, *args, **options):
+        counts = {}
+        with transaction.atomic():
+            songs = Music.objects.exclude(cover_image="").exclude(cover_image__isnull=True)
+            counts["covers"] = self.queue(
+                "thumbnail_music_cover", "music_id", songs.values_list("id", flat=True)
+            )
+            users = CustomUser.objects.exclude(profile_image="").exclude(profile_image__isnull=True)
+            counts["profiles"] = self.queue(
+                "thumbnail_profile_image", "user_id", users.values_list("id", flat=True)
+            )
+            counts["playlists"] = self.queue(
+                "build_playlist_mosaic", "playlist_id", Playlist.objects.values_list("id", flat=True)
+            )
+
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Queued {summary}. Run `manage.py runworker` to build them."))
+
+    def queue(self, kind, key, ids):
+        count = 0
+        for object_id in ids.iterator():
+            if enqueue(kind, {key: object_id}, unique=True):
+                count += 1
+        return count
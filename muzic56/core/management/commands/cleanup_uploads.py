@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.uploads import cleanup_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete expired resumable upload sessions and their partial files."
+
+    def handle(self, *args, **options):
+        count = cleanup_expired_sessions()
+        self.stdout.write(self.style.SUCCESS(f"Removed {count} expired uploads."))
@@ -0,0 +1,78 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import suggest
+from core.audio_meta import AudioParseError, probe_audio
+from core.models import Music
+from core.playlists import refresh_playlists_with_songs
+from core.processing import METADATA_FIELDS, apply_metadata
+from core.sync import music_updated
+
+
+def probe_file(path):
+    # در پروسس فرزند اجرا می‌شود؛ فقط مسیر می‌گیرد و دیکشنری برمی‌گرداند
+    try:
+        return probe_audio(path), None
+    except (AudioParseError, OSError) as e:
+        return None, str(e)
+
+
+class Command(BaseCommand):
+    help = "Read duration, bitrate, codec and tags for songs that have no metadata yet, using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-read songs that already have metadata.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        songs = Music.objects.exclude(audio_file="")
+        if not options["force"]:
+            songs = songs.filter(duration__isnull=True)
+
+        last_id = 0
+        updated = failed = 0
+        # در هر لحظه فقط یک batch در حافظه است
+        with ProcessPoolExecutor(max_workers=max(options["workers"], 1)) as pool:
+            while True:
+                batch = list(
+                    songs.filter(id__gt=last_id)
+                    .order_by("id")
+                    .only("id", "title", "artist", "like_count", "audio_file")[:batch_size]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                paths = [music.audio_file.path for music in batch]
+                changed = []
+                fields = set(METADATA_FIELDS)
+                for music, (info, error) in zip(batch, pool.map(probe_file, paths, chunksize=8)):
+                    if info is None:
+                        failed += 1
+                        self.stderr.write(f"Music {music.id}: {error}")
+                        continue
+                    fields.update(apply_metadata(music, info))
+                    changed.append(music)
+
+                if changed:
+                    with transaction.atomic():
+                        Music.objects.bulk_update(changed, sorted(fields))
+                        refresh_playlists_with_songs([music.id for music in changed])
+                        music_updated(*[music.id for music in changed])
+                    # bulk_update سیگنال post_save ندارد؛ عنوان و هنرمند تازه به ایندکس پیشنهاد می‌رسند
+                    for music in changed:
+                        suggest.upsert(music.id, music.title, music.artist, music.like_count)
+                updated += len(changed)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated {updated} songs. {failed} files could not be read.")
+        )
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.sync import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete sync change-log entries older than --days. Clients with an older cursor must resync from a snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+        with transaction.atomic():
+            count = prune_changes(before)
+        self.stdout.write(self.style.SUCCESS(f"Removed {count} change-log entries."))
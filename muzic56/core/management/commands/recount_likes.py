@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from core.models import Music, MusicLike
+
+
+class Command(BaseCommand):
+    help = "Recount Music.like_count from the likes table and fix any drift, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report songs whose stored count is wrong.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+        last_id = 0
+        checked = fixed = 0
+
+        while True:
+            batch = list(
+                Music.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "like_count")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            ids = [music_id for music_id, _ in batch]
+            actual = dict(
+                MusicLike.objects.filter(music_id__in=ids)
+                .values("music_id")
+                .annotate(total=Count("id"))
+                .values_list("music_id", "total")
+            )
+            drifted = [
+                Music(id=music_id, like_count=actual.get(music_id, 0))
+                for music_id, stored in batch
+                if stored != actual.get(music_id, 0)
+            ]
+            checked += len(batch)
+            fixed += len(drifted)
+
+            if drifted and not dry_run:
+                # like_count از طریق COUNTER_FIELDS در ETag است؛ نسخه‌ی کاتالوگ لازم نیست
+                Music.objects.bulk_update(drifted, ["like_count"])
+
+        verb = "Found" if dry_run else "Fixed"
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} songs. {verb} {fixed} drifted counts.")
+        )
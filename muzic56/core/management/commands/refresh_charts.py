@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.models import ChartEntry
+from core.trending import refresh_chart
+
+
+class Command(BaseCommand):
+    help = "Update the daily, weekly and all-time trending charts with events since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window",
+            choices=[choice for choice, _ in ChartEntry.WINDOW_CHOICES],
+            action="append",
+            help="Only refresh this window (can be repeated). Defaults to all.",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Rescore every event in the window instead of only the new and expired ones.",
+        )
+
+    def handle(self, *args, **options):
+        windows = options["window"] or [choice for choice, _ in ChartEntry.WINDOW_CHOICES]
+        for window in windows:
+            count = refresh_chart(window, rebuild=options["rebuild"])
+            self.stdout.write(self.style.SUCCESS(f"{window}: {count} songs charted."))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Playlist
+from core.playlists import refresh_summary, summary_expressions
+
+
+def differs(stored, expected):
+    for current, actual in zip(stored, expected):
+        if isinstance(current, float):
+            if abs(current - actual) > 0.001:
+                return True
+        elif current != actual:
+            return True
+    return False
+
+
+class Command(BaseCommand):
+    help = "Recompute Playlist.song_count, total_duration, total_likes and cover_song from playlist songs and fix any drift, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report playlists whose stored summary is wrong.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+        expressions = summary_expressions()
+        fields = list(expressions)
+        expected = {f"expected_{name}": value for name, value in expressions.items()}
+        last_id = 0
+        checked = fixed = 0
+
+        while True:
+            batch = list(
+                Playlist.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .annotate(**expected)
+                .values_list("id", *fields, *expected)[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            drifted = [
+                row[0]
+                for row in batch
+                if differs(row[1 : len(fields) + 1], row[len(fields) + 1 :])
+            ]
+            checked += len(batch)
+            fixed += len(drifted)
+
+            if drifted and not dry_run:
+                with transaction.atomic():
+                    refresh_summary(Playlist.objects.filter(id__in=drifted))
+
+        verb = "Found" if dry_run else "Fixed"
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} playlists. {verb} {fixed} drifted summaries.")
+        )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Music
+from core.processing import enqueue_processing
+
+
+class Command(BaseCommand):
+    help = "Queue post-upload processing (metadata, seek index, waveform, renditions) for existing songs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", type=int, help="Only these songs.")
+        parser.add_argument(
+            "--unanalyzed",
+            action="store_true",
+            help="Only songs without a loudness value yet.",
+        )
+        parser.add_argument(
+            "--untranscoded",
+            action="store_true",
+            help="Only songs without any lower-bitrate rendition yet.",
+        )
+
+    def handle(self, *args, **options):
+        songs = Music.objects.exclude(audio_file="")
+        if options["ids"]:
+            songs = songs.filter(id__in=options["ids"])
+        if options["unanalyzed"]:
+            songs = songs.filter(loudness__isnull=True)
+        if options["untranscoded"]:
+            songs = songs.filter(renditions__isnull=True)
+
+        count = 0
+        with transaction.atomic():
+            for music in songs.only("id").iterator():
+                enqueue_processing(music)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Queued {count} songs. Run `manage.py runworker` to process them."))
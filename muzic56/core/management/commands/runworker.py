@@ -0,0 +1,86 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import claim_jobs, execute_job, worker_name
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue with a thread or process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "JOB_WORKER_CONCURRENCY", 4),
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Use a process pool instead of threads (for CPU-heavy jobs).",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=getattr(settings, "JOB_POLL_INTERVAL", 1.0),
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(options["concurrency"], 1)
+        poll_interval = options["poll_interval"]
+        worker = worker_name()
+        self.stopping = False
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        if options["processes"]:
+            pool = ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        else:
+            pool = ThreadPoolExecutor(max_workers=concurrency)
+
+        self.stdout.write(f"Worker {worker} started with concurrency {concurrency}")
+        processed = 0
+        running = set()
+        with pool:
+            while not self.stopping:
+                claimed = claim_jobs(worker, concurrency - len(running)) if len(running) < concurrency else []
+                for job_id, token in claimed:
+                    running.add(pool.submit(execute_job, job_id, token))
+
+                if running:
+                    done, running = wait(
+                        running,
+                        timeout=0 if claimed else poll_interval,
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        future.result()
+                    processed += len(done)
+                elif options["burst"]:
+                    break
+                else:
+                    time.sleep(poll_interval)
+
+            # کارهای در حال اجرا تمام می‌شوند؛ کار جدیدی برداشته نمی‌شود
+            wait(running)
+            processed += len(running)
+        connections.close_all()
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker} stopped after {processed} jobs."))
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,117 @@
+import base64
+import hashlib
+import hmac
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.urls import reverse
+
+
+def _signing_key():
+    key = getattr(settings, "MEDIA_URL_SIGNING_KEY", None) or settings.SECRET_KEY
+    return key.encode()
+
+
+def sign_media_path(name, expires):
+    message = f"{name}:{expires}".encode()
+    digest = hmac.new(_signing_key(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode()
+
+
+def stream_signature_name(music_id):
+    # امضای آدرس پخش به خود آهنگ بسته است، نه به فایل؛ ?t= و ?quality= بیرون از امضا می‌مانند
+    return f"stream/{music_id}"
+
+
+def verify_media_signature(name, expires, signature):
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign_media_path(name, expires), signature or "")
+
+
+class MediaURLBuilder:
+    """
+    ساخت آدرس فایل‌های مدیا برای یک درخواست.
+
+    پیشوند (CDN یا هاست درخواست) و زمان انقضا فقط یک بار محاسبه می‌شوند و
+    برای همه‌ی ردیف‌ها و فیلدها استفاده می‌شوند.
+    """
+
+    def __init__(self, request=None):
+        base = getattr(settings, "MEDIA_BASE_URL", "")
+        if not base and request is not None:
+            base = request.build_absolute_uri("/")
+        self.base = base.rstrip("/")
+        self.signed = getattr(settings, "MEDIA_SIGNED_URLS", False)
+
+        # انقضا به مرز پنجره گرد می‌شود تا آدرس‌ها در یک پنجره ثابت بمانند و CDN بتواند کش کند
+        ttl = getattr(settings, "MEDIA_URL_TTL", 3600)
+        self.expires = (int(time.time()) // ttl + 2) * ttl
+        self._media_prefix = self.base + settings.MEDIA_URL
+        self._signed_prefix = self.base + reverse("serve-media", args=["x"])[:-1]
+
+    def url(self, field_file):
+        if not field_file:
+            return None
+        return self.url_for_name(field_file.name)
+
+    def url_for_name(self, name):
+        if self.signed:
+            signature = sign_media_path(name, self.expires)
+            return f"{self._signed_prefix}{quote(name)}?exp={self.expires}&sig={signature}"
+        return self._media_prefix + quote(name)
+
+    def thumbnail_url(self, thumbnails, fallback=None, image_format="jpeg"):
+        """بزرگ‌ترین thumbnail (پیش‌فرض JPEG برای سازگاری)، یا فایل اصلی اگر هنوز ساخته نشده باشد."""
+        variants = (thumbnails or {}).get(image_format)
+        if variants:
+            return self.url_for_name(variants[max(variants, key=int)])
+        return self.url(fallback)
+
+    def srcset(self, thumbnails):
+        """{"webp": {"64": url, ...}, "jpeg": {...}} برای انتخاب اندازه و فرمت در کلاینت."""
+        if not thumbnails:
+            return None
+        return {
+            image_format: {size: self.url_for_name(name) for size, name in variants.items()}
+            for image_format, variants in thumbnails.items()
+            if image_format not in ("source", "failed")
+        } or None
+
+    def cover_url(self, music):
+        return self.thumbnail_url(music.cover_thumbnails, music.cover_image)
+
+    def playlist_cover_url(self, playlist):
+        # کاور موزاییکی؛ تا ساخته شدنش کاور اولین آهنگ (cover_song را select_related کنید)
+        if playlist.mosaic or playlist.cover_song is None:
+            return self.thumbnail_url(playlist.mosaic)
+        return self.cover_url(playlist.cover_song)
+
+    def audio_url(self, music):
+        if not music.audio_file:
+            return None
+        url = self.base + reverse("music-stream", args=[music.id])
+        if self.signed:
+            signature = sign_media_path(stream_signature_name(music.id), self.expires)
+            url += f"?exp={self.expires}&sig={signature}"
+        return url
+
+    def waveform_url(self, music):
+        # peaks و loudness در یک مرحله ساخته می‌شوند
+        if music.loudness is None:
+            return None
+        return self.base + reverse("music-waveform", args=[music.id])
+
+
+def get_media_urls(request):
+    builder = getattr(request, "_media_urls", None)
+    if builder is None:
+        builder = MediaURLBuilder(request)
+        if request is not None:
+            request._media_urls = builder
+    return builder
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_playlist_is_public'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='music',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='music_uploaded_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlistsong',
+            index=models.Index(fields=['playlist', 'added_at', 'id'], name='playlistsong_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:51
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_like_count(apps, schema_editor):
+    Music = apps.get_model('core', 'Music')
+    Like = Music.likes.through
+    counts = (
+        Like.objects.filter(music_id=OuterRef('pk'))
+        .values('music_id')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Music.objects.update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='music',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_like_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='music',
+            index=models.Index(fields=['-like_count', '-id'], name='music_like_count_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+
+# جدول‌های FTS5 فقط روی SQLite ساخته می‌شوند؛ تریگرها آن‌ها را با جدول‌های اصلی همگام نگه می‌دارند.
+# این SQL نسخه‌ی ثابت همین مایگریشن است و نباید از core.search وارد شود؛ تعریف زنده
+# core.search.SEARCH_TRIGGERS است و post_migrate تریگرهای متفاوت را با آن جایگزین می‌کند
+FORWARD_SQL = [
+    "CREATE VIRTUAL TABLE core_music_fts USING fts5("
+    "title, artist, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER core_music_fts_ai AFTER INSERT ON core_music BEGIN "
+    "INSERT INTO core_music_fts(rowid, title, artist) VALUES (new.id, new.title, new.artist); "
+    "END",
+    "CREATE TRIGGER core_music_fts_ad AFTER DELETE ON core_music BEGIN "
+    "DELETE FROM core_music_fts WHERE rowid = old.id; "
+    "END",
+    "CREATE TRIGGER core_music_fts_au AFTER UPDATE OF title, artist ON core_music BEGIN "
+    "DELETE FROM core_music_fts WHERE rowid = old.id; "
+    "INSERT INTO core_music_fts(rowid, title, artist) VALUES (new.id, new.title, new.artist); "
+    "END",
+    "CREATE VIRTUAL TABLE core_playlist_fts USING fts5("
+    "name, description, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER core_playlist_fts_ai AFTER INSERT ON core_playlist WHEN new.is_public BEGIN "
+    "INSERT INTO core_playlist_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); "
+    "END",
+    "CREATE TRIGGER core_playlist_fts_ad AFTER DELETE ON core_playlist BEGIN "
+    "DELETE FROM core_playlist_fts WHERE rowid = old.id; "
+    "END",
+    "CREATE TRIGGER core_playlist_fts_au AFTER UPDATE OF name, description, is_public "
+    "ON core_playlist BEGIN "
+    "DELETE FROM core_playlist_fts WHERE rowid = old.id; "
+    "INSERT INTO core_playlist_fts(rowid, name, description) "
+    "SELECT new.id, new.name, new.description WHERE new.is_public; "
+    "END",
+    "INSERT INTO core_music_fts(rowid, title, artist) SELECT id, title, artist FROM core_music",
+    "INSERT INTO core_playlist_fts(rowid, name, description) "
+    "SELECT id, name, description FROM core_playlist WHERE is_public",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS core_music_fts_ai",
+    "DROP TRIGGER IF EXISTS core_music_fts_ad",
+    "DROP TRIGGER IF EXISTS core_music_fts_au",
+    "DROP TRIGGER IF EXISTS core_playlist_fts_ai",
+    "DROP TRIGGER IF EXISTS core_playlist_fts_ad",
+    "DROP TRIGGER IF EXISTS core_playlist_fts_au",
+    "DROP TABLE IF EXISTS core_music_fts",
+    "DROP TABLE IF EXISTS core_playlist_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_music_like_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FORWARD_SQL), _run(REVERSE_SQL)),
+    ]
@@ -0,0 +1,54 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_liked_at(apps, schema_editor):
+    # زمان واقعی لایک‌های قدیمی معلوم نیست؛ زمان آپلود آهنگ جایگزین می‌شود تا در چارت روزانه جهش ایجاد نکنند
+    Music = apps.get_model('core', 'Music')
+    MusicLike = apps.get_model('core', 'MusicLike')
+    uploaded_at = Music.objects.filter(pk=OuterRef('music_id')).values('uploaded_at')[:1]
+    MusicLike.objects.update(liked_at=Subquery(uploaded_at))
+
+
+class Migration(migrations.Migration):
+    """
+    جدول خودکار core_music_likes به مدل MusicLike تبدیل می‌شود (فقط در state)،
+    سپس ستون liked_at به همان جدول اضافه می‌شود.
+    """
+
+    dependencies = [
+        ('core', '0008_search_fts'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='MusicLike',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('music', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.music')),
+                        ('user', models.ForeignKey(db_column='customuser_id', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'core_music_likes',
+                        'unique_together': {('music', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='music',
+                    name='likes',
+                    field=models.ManyToManyField(blank=True, related_name='liked_music', through='core.MusicLike', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='musiclike',
+            name='liked_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_liked_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_music_like_through'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('all_time', 'All time')], max_length=16)),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('music', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chart_entries', to='core.music')),
+            ],
+            options={
+                'ordering': ['window', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('window', 'rank'), name='chart_window_rank_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_chart_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='music',
+            name='play_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='PlayEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('played_at', models.DateTimeField(db_index=True)),
+                ('music', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.music')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyPlayCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('music', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.music')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('music', 'day'), name='daily_play_count_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_music_audio_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='music',
+            name='loudness',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='music',
+            name='replay_gain',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Rendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bitrate', models.PositiveIntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('music', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='core.music')),
+            ],
+            options={
+                'ordering': ['music', 'bitrate'],
+                'constraints': [models.UniqueConstraint(fields=('music', 'bitrate'), name='rendition_music_bitrate_uniq')],
+            },
+        ),
+    ]
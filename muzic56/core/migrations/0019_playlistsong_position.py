@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:18
+
+from django.db import migrations, models
+
+
+def number_positions(apps, schema_editor):
+    # ترتیب فعلی (added_at) به position های 1, 2, 3, ... در هر پلی‌لیست تبدیل می‌شود
+    PlaylistSong = apps.get_model('core', 'PlaylistSong')
+    rows = PlaylistSong.objects.order_by('playlist_id', 'added_at', 'id').only('id', 'playlist_id')
+    batch = []
+    playlist_id = None
+    for row in rows.iterator(chunk_size=1000):
+        if row.playlist_id != playlist_id:
+            playlist_id = row.playlist_id
+            position = 0
+        position += 1
+        row.position = position
+        batch.append(row)
+        if len(batch) == 1000:
+            PlaylistSong.objects.bulk_update(batch, ['position'])
+            batch = []
+    if batch:
+        PlaylistSong.objects.bulk_update(batch, ['position'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='playlistsong',
+            options={'ordering': ['position', 'id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='playlistsong',
+            name='playlistsong_keyset_idx',
+        ),
+        migrations.AddField(
+            model_name='playlistsong',
+            name='position',
+            field=models.FloatField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(number_positions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='playlistsong',
+            index=models.Index(fields=['playlist', 'position', 'id'], name='playlistsong_position_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_summary(apps, schema_editor):
+    Playlist = apps.get_model('core', 'Playlist')
+    PlaylistSong = apps.get_model('core', 'PlaylistSong')
+    songs = PlaylistSong.objects.filter(playlist_id=OuterRef('pk')).order_by().values('playlist_id')
+    Playlist.objects.update(
+        song_count=Coalesce(Subquery(songs.annotate(total=Count('id')).values('total')), 0),
+        total_duration=Coalesce(
+            Subquery(songs.annotate(total=Sum('song__duration')).values('total')), 0.0
+        ),
+        cover_song=Subquery(
+            PlaylistSong.objects.filter(playlist_id=OuterRef('pk'))
+            .exclude(song__cover_image='')
+            .exclude(song__cover_image__isnull=True)
+            .order_by('position', 'id')
+            .values('song_id')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_playlistsong_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='cover_song',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.music'),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='song_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='total_duration',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(populate_summary, migrations.RunPython.noop),
+    ]
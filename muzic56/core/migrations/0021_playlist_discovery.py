@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:22
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_total_likes(apps, schema_editor):
+    Playlist = apps.get_model('core', 'Playlist')
+    PlaylistSong = apps.get_model('core', 'PlaylistSong')
+    songs = PlaylistSong.objects.filter(playlist_id=OuterRef('pk')).order_by().values('playlist_id')
+    Playlist.objects.update(
+        total_likes=Coalesce(Subquery(songs.annotate(total=Sum('song__like_count')).values('total')), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_playlist_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='total_likes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_total_likes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='playlist',
+            index=models.Index(fields=['is_public', '-created_at', '-id'], name='playlist_public_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlist',
+            index=models.Index(fields=['is_public', '-song_count', '-id'], name='playlist_public_songs_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlist',
+            index=models.Index(fields=['is_public', '-total_likes', '-id'], name='playlist_public_likes_idx'),
+        ),
+    ]
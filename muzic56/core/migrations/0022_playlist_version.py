@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_playlist_discovery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
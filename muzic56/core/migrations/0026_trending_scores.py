@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_live_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('window', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('all_time', 'All time')], max_length=16, primary_key=True, serialize=False)),
+                ('computed_at', models.DateTimeField()),
+                ('cursors', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('all_time', 'All time')], max_length=16)),
+                ('score', models.FloatField()),
+                ('music', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.music')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', '-score', '-music'], name='trending_window_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('window', 'music'), name='trending_window_music_uniq')],
+            },
+        ),
+    ]
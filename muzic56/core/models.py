@@ -1,26 +1,328 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 
 class CustomUser(AbstractUser):
     profile_image = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    # نسخه‌های کوچک profile_image (core/thumbnails.py)
+    profile_thumbnails = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return self.username
 
+class AudioBlob(models.Model):
+    """فایل صوتی ذخیره‌شده بر اساس محتوا (sha256)؛ آهنگ‌های با بایت‌های یکسان یک blob مشترک دارند."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
 class Music(models.Model):
+    PROCESSING_PENDING = 'pending'
+    PROCESSING_RUNNING = 'processing'
+    PROCESSING_READY = 'ready'
+    PROCESSING_FAILED = 'failed'
+    PROCESSING_CHOICES = [
+        (PROCESSING_PENDING, 'Pending'),
+        (PROCESSING_RUNNING, 'Processing'),
+        (PROCESSING_READY, 'Ready'),
+        (PROCESSING_FAILED, 'Failed'),
+    ]
+
     title = models.CharField(max_length=255)
     artist = models.CharField(max_length=255, blank=True)
     audio_file = models.FileField(upload_to='music/')
+    blob = models.ForeignKey(AudioBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='songs')
     cover_image = models.ImageField(upload_to='music_covers/', blank=True, null=True)
+    cover_thumbnails = models.JSONField(default=dict, blank=True)
     uploaded_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
-    likes = models.ManyToManyField(CustomUser, related_name='liked_music', blank=True)
+    likes = models.ManyToManyField(CustomUser, through='MusicLike', related_name='liked_music', blank=True)
+    # نسخه‌ی ذخیره‌شده‌ی likes.count()؛ فقط از طریق add_like/remove_like تغییر کند
+    like_count = models.PositiveIntegerField(default=0)
+    # با هر flush بافر پخش (core/plays.py) به‌روز می‌شود
+    play_count = models.PositiveIntegerField(default=0)
+    # پردازش‌های بعد از آپلود در صف کارها (core/jobs.py) انجام می‌شوند
+    processing_status = models.CharField(max_length=16, choices=PROCESSING_CHOICES, default=PROCESSING_READY)
+    # مشخصات فنی فایل؛ از هدرها خوانده می‌شوند (core/audio_meta.py)
+    duration = models.FloatField(null=True, blank=True)  # ثانیه
+    bitrate = models.PositiveIntegerField(null=True, blank=True)  # kbps
+    sample_rate = models.PositiveIntegerField(null=True, blank=True)
+    channels = models.PositiveSmallIntegerField(null=True, blank=True)
+    codec = models.CharField(max_length=16, blank=True)
+    # بلندی یکپارچه (LUFS) و بهره‌ی ReplayGain (dB)؛ core/waveform.py
+    loudness = models.FloatField(null=True, blank=True)
+    replay_gain = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-uploaded_at', '-id'], name='music_uploaded_keyset_idx'),
+            models.Index(fields=['-like_count', '-id'], name='music_like_count_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.artist}"
-    
-    def like_count(self):
-        return self.likes.count()
+
+    def add_like(self, user):
+        with transaction.atomic():
+            _, created = MusicLike.objects.get_or_create(music_id=self.id, user_id=user.id)
+            if created:
+                Music.objects.filter(id=self.id).update(like_count=F('like_count') + 1)
+                Playlist.objects.filter(playlistsong__song_id=self.id).update(
+                    total_likes=F('total_likes') + 1
+                )
+        if created:
+            self.refresh_from_db(fields=['like_count'])
+            from .events import like_count_changed
+            like_count_changed(self.id, self.like_count)
+        return created
+
+    def remove_like(self, user):
+        with transaction.atomic():
+            deleted, _ = MusicLike.objects.filter(music_id=self.id, user_id=user.id).delete()
+            if deleted:
+                Music.objects.filter(id=self.id).update(like_count=F('like_count') - 1)
+                Playlist.objects.filter(playlistsong__song_id=self.id).update(
+                    total_likes=F('total_likes') - 1
+                )
+        if deleted:
+            self.refresh_from_db(fields=['like_count'])
+            from .events import like_count_changed
+            like_count_changed(self.id, self.like_count)
+        return bool(deleted)
+
+    @staticmethod
+    def remove_all_likes(user):
+        """همه‌ی لایک‌های یک کاربر را حذف و شمارنده‌ها را کم می‌کند."""
+        with transaction.atomic():
+            liked = MusicLike.objects.filter(user_id=user.id)
+            Music.objects.filter(
+                id__in=liked.values('music_id')
+            ).update(like_count=F('like_count') - 1)
+            # هر پلی‌لیست به تعداد آهنگ‌های لایک‌شده‌اش کم می‌شود؛ از نو جمع زده می‌شود
+            from .playlists import summary_expressions
+
+            Playlist.objects.filter(
+                id__in=PlaylistSong.objects.filter(
+                    song_id__in=liked.values('music_id')
+                ).values('playlist_id')
+            ).update(total_likes=summary_expressions()['total_likes'])
+            deleted, _ = liked.delete()
+        return deleted
+
+class MusicLike(models.Model):
+    # جدول همان جدول خودکار قبلی likes است؛ liked_at برای چارت‌های ترند اضافه شده
+    music = models.ForeignKey(Music, on_delete=models.CASCADE)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_column='customuser_id')
+    liked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = 'core_music_likes'
+        unique_together = [('music', 'user')]
+
+
+class PlayEvent(models.Model):
+    music = models.ForeignKey(Music, on_delete=models.CASCADE)
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    played_at = models.DateTimeField(db_index=True)
+
+
+class DailyPlayCount(models.Model):
+    music = models.ForeignKey(Music, on_delete=models.CASCADE)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['music', 'day'], name='daily_play_count_uniq'),
+        ]
+
+
+class ChartEntry(models.Model):
+    WINDOW_DAILY = 'daily'
+    WINDOW_WEEKLY = 'weekly'
+    WINDOW_ALL_TIME = 'all_time'
+    WINDOW_CHOICES = [
+        (WINDOW_DAILY, 'Daily'),
+        (WINDOW_WEEKLY, 'Weekly'),
+        (WINDOW_ALL_TIME, 'All time'),
+    ]
+
+    window = models.CharField(max_length=16, choices=WINDOW_CHOICES)
+    rank = models.PositiveIntegerField()
+    music = models.ForeignKey(Music, on_delete=models.CASCADE, related_name='chart_entries')
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['window', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'rank'], name='chart_window_rank_uniq'),
+        ]
+
+
+class TrendingScore(models.Model):
+    """
+    امتیاز کاهشی هر آهنگ در یک بازه‌ی چارت، در لحظه‌ی TrendingState.computed_at؛
+    refresh_chart فقط رویدادهای تازه و رویدادهای بیرون‌رفته از بازه را روی آن اعمال می‌کند.
+    """
+    window = models.CharField(max_length=16, choices=ChartEntry.WINDOW_CHOICES)
+    music = models.ForeignKey(Music, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'music'], name='trending_window_music_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['window', '-score', '-music'], name='trending_window_score_idx'),
+        ]
+
+
+class TrendingState(models.Model):
+    window = models.CharField(max_length=16, choices=ChartEntry.WINDOW_CHOICES, primary_key=True)
+    computed_at = models.DateTimeField()
+    # آخرین id خوانده‌شده از هر منبع رویداد: {"core.musiclike": 123, ...}
+    cursors = models.JSONField(default=dict)
+
+
+class UploadSession(models.Model):
+    """آپلود چندتکه‌ی قابل ادامه؛ تکه‌ها مستقیم در فایل موقت روی دیسک نوشته می‌شوند."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    title = models.CharField(max_length=255)
+    artist = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class Rendition(models.Model):
+    """نسخه‌ی MP3 با bitrate کمتر از فایل اصلی (core/transcode.py)."""
+    music = models.ForeignKey(Music, on_delete=models.CASCADE, related_name='renditions')
+    bitrate = models.PositiveIntegerField()  # kbps
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['music', 'bitrate']
+        constraints = [
+            models.UniqueConstraint(fields=['music', 'bitrate'], name='rendition_music_bitrate_uniq'),
+        ]
+
+
+class ResourceVersion(models.Model):
+    """
+    شمارنده‌ی نسخه‌ی یک دامنه از داده‌ها (مثلاً "catalog" یا "likes:<user_id>")؛
+    با هر نوشتن زیاد می‌شود و ETag پاسخ‌ها از روی آن ساخته می‌شود (core/versions.py).
+    """
+    scope = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+
+class Change(models.Model):
+    """
+    رویداد تغییر برای همگام‌سازی کلاینت‌ها (core/sync.py)؛ فقط اضافه می‌شود و id آن
+    همان cursor کلاینت است. user یعنی این تغییر مخصوص کدام کاربر است (خالی برای آهنگ‌ها).
+    """
+    ENTITY_MUSIC = 'music'
+    ENTITY_PLAYLIST = 'playlist'
+    ENTITY_PLAYLIST_SONG = 'playlist_song'
+    ENTITY_LIKE = 'like'
+    ENTITY_CHOICES = [
+        (ENTITY_MUSIC, 'Music'),
+        (ENTITY_PLAYLIST, 'Playlist'),
+        (ENTITY_PLAYLIST_SONG, 'Playlist song'),
+        (ENTITY_LIKE, 'Like'),
+    ]
+    ACTION_UPSERT = 'upsert'
+    ACTION_DELETE = 'delete'
+    ACTION_CHOICES = [
+        (ACTION_UPSERT, 'Created or updated'),
+        (ACTION_DELETE, 'Deleted'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    # برای لایک‌ها id آهنگ است
+    entity_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, null=True, blank=True, related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='change_user_idx'),
+            models.Index(fields=['entity', 'id'], name='change_entity_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.entity} {self.entity_id}"
+
+
+class Event(models.Model):
+    """
+    رویداد زنده برای backend دیتابیسی core/events.py؛ هر پروسس ASGI یک thread دارد که
+    ردیف‌های تازه را می‌خواند و به listenerهای خودش می‌رساند. بعد از چند دقیقه پاک می‌شود.
+    """
+    id = models.BigAutoField(primary_key=True)
+    channel = models.CharField(max_length=100)
+    kind = models.CharField(max_length=30)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} -> {self.channel}"
+
+
+class Job(models.Model):
+    """کار پس‌زمینه در صف دیتابیسی؛ با دستور runworker اجرا می‌شود."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    # تا این زمان کار در اختیار locked_by است؛ بعد از آن worker دیگری می‌تواند برش دارد
+    locked_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
+
 
 class Playlist(models.Model):
     name = models.CharField(max_length=255)
@@ -29,7 +331,37 @@ class Playlist(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     songs = models.ManyToManyField('Music', through='PlaylistSong')
     is_public = models.BooleanField(default=False)  # اضافه کردن این فیلد
-    
+    # کاور ۲×۲ ساخته‌شده از کاور چهار آهنگ اول (core/thumbnails.py)
+    mosaic = models.JSONField(default=dict, blank=True)
+    # خلاصه‌ای که با هر تغییر PlaylistSong در همان تراکنش دوباره حساب می‌شود
+    # (core/playlists.py) تا لیست پلی‌لیست‌ها برای هر ردیف کوئری جدا نزند
+    song_count = models.PositiveIntegerField(default=0)
+    total_duration = models.FloatField(default=0)  # ثانیه
+    cover_song = models.ForeignKey(
+        'Music', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    # جمع like_count آهنگ‌های پلی‌لیست، برای مرتب‌سازی پلی‌لیست‌های عمومی؛
+    # add_like/remove_like همراه like_count آهنگ این را هم تغییر می‌دهند
+    total_likes = models.PositiveIntegerField(default=0)
+    # با هر تغییری که در صفحه‌ی پلی‌لیست دیده می‌شود یکی زیاد می‌شود؛ ETag از روی آن ساخته می‌شود
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_public', '-created_at', '-id'], name='playlist_public_new_idx'),
+            models.Index(fields=['is_public', '-song_count', '-id'], name='playlist_public_songs_idx'),
+            models.Index(fields=['is_public', '-total_likes', '-id'], name='playlist_public_likes_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None and not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -37,8 +369,23 @@ class PlaylistSong(models.Model):
     playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE)
     song = models.ForeignKey('Music', on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
-    
+    # ترتیب آهنگ‌ها (fractional index): جابه‌جایی فقط position همان یک ردیف را
+    # عوض می‌کند و مقدار جدید بین دو همسایه قرار می‌گیرد (core/playlists.py)
+    position = models.FloatField()
+
     class Meta:
-        ordering = ['added_at']
+        ordering = ['position', 'id']
+        indexes = [
+            models.Index(fields=['playlist', 'position', 'id'], name='playlistsong_position_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.position is None:
+            # ردیف جدید بدون position به انتهای پلی‌لیست می‌رود
+            last = PlaylistSong.objects.filter(playlist_id=self.playlist_id).aggregate(
+                last=models.Max('position')
+            )['last']
+            self.position = (last or 0) + 1
+        super().save(*args, **kwargs)
         
 
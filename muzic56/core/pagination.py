@@ -0,0 +1,123 @@
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import DateTimeField, Q
+from django.utils.dateparse import parse_datetime
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+ITERATOR_CHUNK_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    # زمان به صورت رشته‌ی ISO و عدد (مثل position پلی‌لیست) همان‌طور که هست
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    raw = json.dumps([value, pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if isinstance(value, str):
+            value = parse_datetime(value)
+        elif not isinstance(value, (int, float)) or isinstance(value, bool):
+            value = None
+        pk = int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor")
+    if value is None:
+        raise InvalidCursor("Invalid cursor")
+    return value, pk
+
+
+class KeysetPaginator:
+    """
+    صفحه‌بندی بر اساس کلید (time_field, id) به جای OFFSET.
+    time_field می‌تواند فیلد عددی هم باشد (مثل position در پلی‌لیست).
+
+    هر صفحه فقط ردیف‌های بعد از cursor را می‌خواند، پس هزینه‌ی آن به اندازه‌ی
+    جدول بستگی ندارد. cursor برای کلاینت مبهم (opaque) است.
+    """
+
+    def __init__(self, request, time_field, descending=True):
+        self.request = request
+        self.time_field = time_field
+        self.descending = descending
+        self.next_cursor = None
+
+    def get_page_size(self):
+        try:
+            size = int(self.request.GET.get("limit", DEFAULT_PAGE_SIZE))
+        except (TypeError, ValueError):
+            size = DEFAULT_PAGE_SIZE
+        return max(1, min(size, MAX_PAGE_SIZE))
+
+    def get_ordering(self):
+        if self.descending:
+            return ["-" + self.time_field, "-id"]
+        return [self.time_field, "id"]
+
+    def check_cursor_type(self, model, value):
+        # cursor یک endpoint دیگر (مثلاً position پلی‌لیست روی لیست زمان‌دار) باید 400 بدهد، نه 500
+        try:
+            field = model._meta.get_field(self.time_field)
+        except FieldDoesNotExist:
+            return
+        if isinstance(field, DateTimeField) != isinstance(value, datetime):
+            raise InvalidCursor("Invalid cursor")
+
+    def page_queryset(self, queryset):
+        """queryset یک صفحه (با یک ردیف اضافه برای فهمیدن صفحه‌ی بعد)؛ cursor بد InvalidCursor می‌دهد."""
+        page_size = self.get_page_size()
+        cursor = self.request.GET.get("cursor")
+
+        queryset = queryset.order_by(*self.get_ordering())
+        if cursor:
+            timestamp, pk = decode_cursor(cursor)
+            self.check_cursor_type(queryset.model, timestamp)
+            op = "lt" if self.descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.time_field}__{op}": timestamp})
+                | Q(**{self.time_field: timestamp, f"id__{op}": pk})
+            )
+        return queryset[: page_size + 1]
+
+    def paginate(self, queryset):
+        """یک صفحه را برمی‌گرداند؛ cursor صفحه‌ی بعد در self.next_cursor است."""
+        rows = list(
+            self.page_queryset(queryset).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        )
+        return self._finish(rows)
+
+    async def apaginate(self, queryset):
+        """نسخه‌ی async برای view های async (ORM async جنگو)."""
+        return await self.afetch(self.page_queryset(queryset))
+
+    async def afetch(self, page):
+        """
+        صفحه‌ای را که page_queryset ساخته می‌خواند؛ برای وقتی که cursor باید قبل از
+        اجرای همزمان کوئری‌ها بررسی شود.
+        """
+        rows = [row async for row in page.aiterator(chunk_size=ITERATOR_CHUNK_SIZE)]
+        return self._finish(rows)
+
+    def _finish(self, rows):
+        page_size = self.get_page_size()
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            self.next_cursor = encode_cursor(getattr(last, self.time_field), last.id)
+        return rows
+
+    def get_response_data(self, data):
+        return {"results": data, "next": self.next_cursor}
@@ -0,0 +1,324 @@
+"""
+ویرایش گروهی آهنگ‌های پلی‌لیست (افزودن، حذف، جابه‌جایی) در یک تراکنش.
+
+ترتیب آهنگ‌ها با position اعشاری نگه داشته می‌شود: آهنگ جابه‌جاشده مقداری بین دو
+همسایه‌ی جدیدش می‌گیرد و بقیه‌ی ردیف‌ها دست نمی‌خورند. ترتیب فعلی یک بار خوانده
+می‌شود، تغییرات در حافظه اعمال می‌شوند و در پایان با bulk_create، یک delete و
+bulk_update ذخیره می‌شوند؛ تعداد کوئری‌ها به تعداد آهنگ‌ها بستگی ندارد.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import Change, Music, Playlist, PlaylistSong
+from .sync import record_many
+from .versions import bump, playlists_scope
+
+
+MAX_EDIT_SONGS = 5000
+
+_state = threading.local()
+
+
+class PlaylistEditError(ValueError):
+    pass
+
+
+@contextmanager
+def bulk_edit():
+    """در این بازه signal های PlaylistSong برای هر ردیف کاری نمی‌کنند؛ ویرایشگر خودش یک بار کار می‌گذارد."""
+    previous = getattr(_state, "bulk", False)
+    _state.bulk = True
+    try:
+        yield
+    finally:
+        _state.bulk = previous
+
+
+def in_bulk_edit():
+    return getattr(_state, "bulk", False)
+
+
+def summary_expressions():
+    """مقدار درست فیلدهای خلاصه‌ی Playlist به صورت subquery روی PlaylistSong."""
+    songs = PlaylistSong.objects.filter(playlist_id=OuterRef("pk")).order_by().values("playlist_id")
+    return {
+        "song_count": Coalesce(Subquery(songs.annotate(total=Count("id")).values("total")), 0),
+        "total_duration": Coalesce(
+            Subquery(songs.annotate(total=Sum("song__duration")).values("total")), 0.0
+        ),
+        "total_likes": Coalesce(
+            Subquery(songs.annotate(total=Sum("song__like_count")).values("total")), 0
+        ),
+        "cover_song_id": Subquery(
+            PlaylistSong.objects.filter(playlist_id=OuterRef("pk"))
+            .exclude(song__cover_image="")
+            .exclude(song__cover_image__isnull=True)
+            .order_by("position", "id")
+            .values("song_id")[:1]
+        ),
+    }
+
+
+def refresh_summary(playlists):
+    """
+    خلاصه‌ی پلی‌لیست‌ها را با یک UPDATE از روی PlaylistSong دوباره حساب می‌کند؛ در همان
+    تراکنشی صدا زده می‌شود که آهنگ‌ها را عوض کرده. playlists یک queryset یا id است.
+    تعداد پلی‌لیست‌های به‌روزشده را برمی‌گرداند (۰ یعنی پلی‌لیست حذف شده).
+    """
+    if not hasattr(playlists, "update"):
+        playlists = Playlist.objects.filter(id=playlists)
+    affected = list(playlists.order_by().values_list("id", "owner_id"))
+    if not affected:
+        return 0
+    bump(*[playlists_scope(owner_id) for _, owner_id in affected])
+    Change.objects.bulk_create(
+        [
+            Change(entity=Change.ENTITY_PLAYLIST, entity_id=playlist_id, user_id=owner_id)
+            for playlist_id, owner_id in affected
+        ]
+    )
+    return playlists.update(
+        updated_at=timezone.now(), version=F("version") + 1, **summary_expressions()
+    )
+
+
+def refresh_playlists_with_songs(song_ids):
+    """بعد از تغییر مدت یا کاور آهنگ‌ها، پلی‌لیست‌هایی که آن‌ها را دارند."""
+    playlist_ids = PlaylistSong.objects.filter(song_id__in=song_ids).values("playlist_id")
+    return refresh_summary(Playlist.objects.filter(id__in=playlist_ids))
+
+
+class PlaylistEditor:
+    def __init__(self, playlist):
+        self.playlist = playlist
+        self.order = []
+        self.rows = {}
+        self.positions = {}
+        rows = (
+            PlaylistSong.objects.filter(playlist=playlist)
+            .order_by("position", "id")
+            .values_list("id", "song_id", "position")
+        )
+        for row_id, song_id, position in rows:
+            # ردیف‌های تکراری قدیمی: فقط اولی حساب می‌شود
+            if song_id in self.rows:
+                continue
+            self.order.append(song_id)
+            self.rows[song_id] = row_id
+            self.positions[song_id] = position
+        self.added = []
+        self.removed = set()
+        self.moved = set()
+        self.skipped = []
+
+    def _index_for(self, before=None, after=None, at=None):
+        if before is not None and after is not None:
+            raise PlaylistEditError("Use either 'before' or 'after', not both")
+        anchor = before if before is not None else after
+        if anchor is not None:
+            if anchor not in self.positions:
+                raise PlaylistEditError(f"Song {anchor} is not in the playlist")
+            index = self.order.index(anchor)
+            return index if before is not None else index + 1
+        if at in (None, "end"):
+            return len(self.order)
+        if at == "start":
+            return 0
+        raise PlaylistEditError("'at' must be 'start' or 'end'")
+
+    def _insert(self, song_ids, index):
+        """song_ids را پشت سر هم از index به بعد می‌گذارد و position آن‌ها را حساب می‌کند."""
+        low = self.positions[self.order[index - 1]] if index > 0 else None
+        high = self.positions[self.order[index]] if index < len(self.order) else None
+        if low is None and high is None:
+            low, high = 0.0, len(song_ids) + 1.0
+        elif high is None:
+            high = low + len(song_ids) + 1.0
+        elif low is None:
+            low = high - len(song_ids) - 1.0
+        step = (high - low) / (len(song_ids) + 1)
+        new_positions = [low + step * (i + 1) for i in range(len(song_ids))]
+
+        self.order[index:index] = song_ids
+        if not low < new_positions[0] or not new_positions[-1] < high or (
+            len(set(new_positions)) != len(new_positions)
+        ):
+            # دقت float بین این دو همسایه تمام شده؛ همه‌ی ترتیب از نو شماره‌گذاری می‌شود
+            for number, song_id in enumerate(self.order, start=1):
+                self.positions[song_id] = float(number)
+                if song_id in self.rows:
+                    self.moved.add(song_id)
+            return
+        for song_id, position in zip(song_ids, new_positions):
+            self.positions[song_id] = position
+
+    def add(self, song_ids, before=None, after=None, at=None):
+        index = self._index_for(before, after, at)
+        new = []
+        for song_id in song_ids:
+            if song_id in self.positions or song_id in new:
+                self.skipped.append(song_id)
+            else:
+                new.append(song_id)
+        if new:
+            self._insert(new, index)
+            self.added.extend(new)
+
+    def remove(self, song_ids):
+        for song_id in song_ids:
+            if song_id not in self.positions:
+                self.skipped.append(song_id)
+                continue
+            self.order.remove(song_id)
+            del self.positions[song_id]
+            if song_id in self.rows:
+                self.removed.add(self.rows.pop(song_id))
+                self.moved.discard(song_id)
+            else:
+                self.added.remove(song_id)
+
+    def move(self, song_id, before=None, after=None, at=None):
+        if song_id not in self.positions:
+            raise PlaylistEditError(f"Song {song_id} is not in the playlist")
+        if song_id in (before, after):
+            return
+        self.order.remove(song_id)
+        self._insert([song_id], self._index_for(before, after, at))
+        if song_id in self.rows:
+            self.moved.add(song_id)
+
+    @property
+    def changed(self):
+        return bool(self.added or self.removed or self.moved)
+
+    def save(self):
+        owner_id = self.playlist.owner_id
+        with bulk_edit():
+            if self.removed:
+                PlaylistSong.objects.filter(id__in=self.removed).delete()
+                record_many(
+                    Change.ENTITY_PLAYLIST_SONG, self.removed, Change.ACTION_DELETE, owner_id
+                )
+            if self.added:
+                created = PlaylistSong.objects.bulk_create(
+                    [
+                        PlaylistSong(
+                            playlist=self.playlist,
+                            song_id=song_id,
+                            position=self.positions[song_id],
+                        )
+                        for song_id in self.added
+                    ]
+                )
+                record_many(
+                    Change.ENTITY_PLAYLIST_SONG, [row.id for row in created], user_id=owner_id
+                )
+            if self.moved:
+                PlaylistSong.objects.bulk_update(
+                    [
+                        PlaylistSong(id=self.rows[song_id], position=self.positions[song_id])
+                        for song_id in self.moved
+                    ],
+                    ["position"],
+                )
+                record_many(
+                    Change.ENTITY_PLAYLIST_SONG,
+                    [self.rows[song_id] for song_id in self.moved],
+                    user_id=owner_id,
+                )
+        if self.changed:
+            refresh_summary(self.playlist.id)
+            enqueue("build_playlist_mosaic", {"playlist_id": self.playlist.id}, unique=True)
+
+
+def _song_id(value, field):
+    # کلاینت‌های قدیمی id را گاهی به صورت رشته می‌فرستند
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise PlaylistEditError(f"'{field}' must be a song id")
+    return value
+
+
+def valid_song_id(value):
+    try:
+        _song_id(value, "song_id")
+    except PlaylistEditError:
+        return False
+    return True
+
+
+def _song_ids(value, field):
+    if not isinstance(value, list):
+        raise PlaylistEditError(f"'{field}' must be a list of song ids")
+    return [_song_id(song_id, field) for song_id in value]
+
+
+def _anchor(operation, key):
+    value = operation.get(key)
+    return None if value is None else _song_id(value, key)
+
+
+def parse_operations(operations):
+    """
+    [{"op": "add", "song_ids": [...], "before"|"after": id, "at": "start"|"end"},
+     {"op": "remove", "song_ids": [...]},
+     {"op": "move", "song_id": id, "before"|"after": id, "at": "start"|"end"}]
+    """
+    if not isinstance(operations, list) or not operations:
+        raise PlaylistEditError("'operations' must be a non-empty list")
+    parsed = []
+    total = 0
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise PlaylistEditError("Each operation must be an object")
+        op = operation.get("op")
+        placement = {
+            "before": _anchor(operation, "before"),
+            "after": _anchor(operation, "after"),
+            "at": operation.get("at"),
+        }
+        if op in ("add", "remove"):
+            song_ids = _song_ids(operation.get("song_ids"), "song_ids")
+            total += len(song_ids)
+            parsed.append((op, song_ids, placement if op == "add" else {}))
+        elif op == "move":
+            song_id = _anchor(operation, "song_id")
+            if song_id is None:
+                raise PlaylistEditError("'song_id' is required for move")
+            total += 1
+            parsed.append((op, song_id, placement))
+        else:
+            raise PlaylistEditError(f"Unknown operation: {op!r}")
+    if total > MAX_EDIT_SONGS:
+        raise PlaylistEditError(f"At most {MAX_EDIT_SONGS} songs per request")
+    return parsed
+
+
+def edit_playlist(playlist, operations):
+    """
+    عملیات را به ترتیب روی پلی‌لیست اعمال می‌کند. آهنگ‌هایی که وجود ندارند یا تکراری‌اند
+    نادیده گرفته می‌شوند و در editor.skipped برمی‌گردند. باید داخل تراکنش صدا زده شود.
+    """
+    operations = parse_operations(operations)
+    requested = {
+        song_id for op, song_ids, _ in operations if op == "add" for song_id in song_ids
+    }
+    existing = set(Music.objects.filter(id__in=requested).values_list("id", flat=True))
+
+    editor = PlaylistEditor(playlist)
+    for op, value, placement in operations:
+        if op == "add":
+            editor.skipped.extend(song_id for song_id in value if song_id not in existing)
+            editor.add([song_id for song_id in value if song_id in existing], **placement)
+        elif op == "remove":
+            editor.remove(value)
+        else:
+            editor.move(value, **placement)
+    editor.save()
+    return editor
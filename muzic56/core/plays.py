@@ -0,0 +1,117 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import DailyPlayCount, Music, PlayEvent
+
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_PLAYS = 500
+
+
+class PlayBuffer:
+    """
+    بافر درون‌حافظه‌ای رویدادهای پخش.
+
+    درخواست فقط رویداد را به لیست اضافه می‌کند؛ یک thread پس‌زمینه وقتی تعداد به
+    max_size برسد یا flush_interval بگذرد، همه را در یک تراکنش با bulk_create
+    می‌نویسد و جمع‌های روزانه و کل هر آهنگ را به‌روز می‌کند.
+    با کرش شدن پروسس، رویدادهای flush نشده از بین می‌روند.
+    """
+
+    def __init__(self, max_size, flush_interval):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._events = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def add(self, events):
+        with self._condition:
+            self._events.extend(events)
+            self._ensure_thread()
+            if len(self._events) >= self.max_size:
+                self._condition.notify()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: len(self._events) >= self.max_size, timeout=self.flush_interval
+                )
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush play events")
+                connection.close()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._condition:
+                events, self._events = self._events, []
+            if events:
+                write_plays(events)
+            return len(events)
+
+
+def write_plays(events):
+    """
+    events: لیست (music_id, user_id, played_at). همه در یک تراکنش نوشته می‌شوند.
+    play_count جزو ETag لیست آهنگ‌هاست (versions.COUNTER_FIELDS)، پس شمارنده‌ی نسخه‌ای زیاد نمی‌شود.
+    """
+    music_ids = {music_id for music_id, _, _ in events}
+    existing = set(Music.objects.filter(id__in=music_ids).values_list("id", flat=True))
+    events = [event for event in events if event[0] in existing]
+    if not events:
+        return
+
+    per_song = Counter(music_id for music_id, _, _ in events)
+    per_day = Counter(
+        (music_id, timezone.localdate(played_at)) for music_id, _, played_at in events
+    )
+
+    music_table = connection.ops.quote_name(Music._meta.db_table)
+    daily_table = connection.ops.quote_name(DailyPlayCount._meta.db_table)
+    with transaction.atomic():
+        PlayEvent.objects.bulk_create(
+            [
+                PlayEvent(music_id=music_id, user_id=user_id, played_at=played_at)
+                for music_id, user_id, played_at in events
+            ],
+            batch_size=500,
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {music_table} SET play_count = play_count + %s WHERE id = %s",
+                [(count, music_id) for music_id, count in per_song.items()],
+            )
+            cursor.executemany(
+                f"INSERT INTO {daily_table} (music_id, day, count) VALUES (%s, %s, %s) "
+                f"ON CONFLICT (music_id, day) DO UPDATE SET count = {daily_table}.count + excluded.count",
+                [(music_id, day, count) for (music_id, day), count in per_day.items()],
+            )
+
+
+play_buffer = PlayBuffer(
+    max_size=getattr(settings, "PLAY_BUFFER_SIZE", 500),
+    flush_interval=getattr(settings, "PLAY_BUFFER_FLUSH_SECONDS", 5),
+)
+atexit.register(play_buffer.flush)
+
+
+def record_plays(music_ids, user=None, played_at=None):
+    played_at = played_at or timezone.now()
+    user_id = user.id if user is not None and user.is_authenticated else None
+    play_buffer.add([(music_id, user_id, played_at) for music_id in music_ids])
@@ -0,0 +1,130 @@
+import logging
+import os
+
+from .audio_meta import AudioParseError, probe_audio
+from .events import processing_changed
+from .jobs import enqueue, job
+from .blobs import peaks_path, write_sidecar
+from .models import Music
+from .playlists import refresh_playlists_with_songs
+from .sync import music_updated
+from .seek_index import write_frame_index
+
+
+logger = logging.getLogger(__name__)
+
+METADATA_FIELDS = ["duration", "bitrate", "sample_rate", "channels", "codec"]
+
+
+# مراحل پردازش بعد از آپلود، به ترتیب اجرا؛ هر مرحله Music را می‌گیرد
+# و باید با چند بار اجرا شدن (در تلاش‌های دوباره) مشکلی نداشته باشد
+PROCESSING_STAGES = []
+
+
+def processing_stage(func):
+    PROCESSING_STAGES.append(func)
+    return func
+
+
+def enqueue_processing(music):
+    Music.objects.filter(id=music.id).update(processing_status=Music.PROCESSING_PENDING)
+    music_updated(music.id)
+    processing_changed(music.id, music.uploaded_by_id, Music.PROCESSING_PENDING)
+    music.processing_status = Music.PROCESSING_PENDING
+    return enqueue("process_music", {"music_id": music.id})
+
+
+def mark_failed(music_id):
+    Music.objects.filter(id=music_id).update(processing_status=Music.PROCESSING_FAILED)
+    music_updated(music_id)
+    owner_id = Music.objects.filter(id=music_id).values_list("uploaded_by_id", flat=True).first()
+    if owner_id is not None:
+        processing_changed(music_id, owner_id, Music.PROCESSING_FAILED)
+
+
+@job("process_music", on_failure=mark_failed)
+def process_music(music_id):
+    music = Music.objects.filter(id=music_id).first()
+    if music is None:
+        # آهنگ قبل از پردازش حذف شده است
+        return
+
+    Music.objects.filter(id=music_id).update(processing_status=Music.PROCESSING_RUNNING)
+    processing_changed(music_id, music.uploaded_by_id, Music.PROCESSING_RUNNING)
+    for stage in PROCESSING_STAGES:
+        stage(music)
+    Music.objects.filter(id=music_id).update(processing_status=Music.PROCESSING_READY)
+    # وضعیت، مدت و waveform آهنگ در لیست‌ها عوض شده است
+    music_updated(music_id)
+    processing_changed(music_id, music.uploaded_by_id, Music.PROCESSING_READY)
+    # ساخت نسخه‌های کم‌حجم طول می‌کشد و برای پخش لازم نیست؛ کار جداگانه‌ای است
+    enqueue("transcode_music", {"music_id": music_id}, unique=True)
+
+
+def apply_metadata(music, info):
+    """نتیجه‌ی probe_audio را روی music می‌گذارد و فیلدهای تغییرکرده را برمی‌گرداند."""
+    for field in METADATA_FIELDS:
+        setattr(music, field, info.get(field) or ("" if field == "codec" else None))
+    fields = list(METADATA_FIELDS)
+    for field in ("title", "artist"):
+        if not getattr(music, field) and info.get(field):
+            setattr(music, field, info[field][:255])
+            fields.append(field)
+    return fields
+
+
+@processing_stage
+def extract_metadata(music):
+    try:
+        info = probe_audio(music.audio_file.path)
+    except AudioParseError as e:
+        # فایل خراب با تلاش دوباره درست نمی‌شود؛ بقیه‌ی مراحل ادامه پیدا می‌کنند
+        logger.warning("Could not read metadata of music %s: %s", music.id, e)
+        return
+    music.save(update_fields=apply_metadata(music, info))
+    # مدت کل پلی‌لیست‌هایی که آهنگ از قبل در آن‌ها بوده
+    refresh_playlists_with_songs([music.id])
+
+
+@processing_stage
+def build_seek_index(music):
+    # برای VBR حدس زدن offset از روی bitrate دقیق نیست؛ ایندکس فریم‌ها یک بار ساخته می‌شود
+    if music.codec != "mp3":
+        return
+    try:
+        write_frame_index(music.audio_file.path)
+    except AudioParseError as e:
+        logger.warning("Could not index frames of music %s: %s", music.id, e)
+
+
+@processing_stage
+def analyze_audio(music):
+    """شکل موج و بلندی صدا؛ فایل فقط یک بار decode می‌شود."""
+    try:
+        from . import waveform
+    except ImportError:
+        logger.warning("NumPy is not installed; skipping waveform analysis of music %s", music.id)
+        return
+
+    path = music.audio_file.path
+    if os.path.exists(peaks_path(path)) and music.blob_id:
+        # همین فایل قبلاً برای آهنگ دیگری تحلیل شده است
+        analyzed = (
+            Music.objects.filter(blob_id=music.blob_id, loudness__isnull=False)
+            .exclude(id=music.id)
+            .values("loudness", "replay_gain")
+            .first()
+        )
+        if analyzed:
+            Music.objects.filter(id=music.id).update(**analyzed)
+            return
+
+    try:
+        data, loudness = waveform.analyze(path, music.codec, music.channels)
+    except waveform.DecodeError as e:
+        logger.warning("Could not decode music %s: %s", music.id, e)
+        return
+    write_sidecar(peaks_path(path), data)
+    music.loudness = loudness
+    music.replay_gain = waveform.replay_gain(loudness)
+    music.save(update_fields=["loudness", "replay_gain"])
@@ -0,0 +1,212 @@
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+
+from .models import Music, Playlist
+
+
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# وزن ستون‌ها در bm25: عنوان مهم‌تر از هنرمند / توضیحات است
+MUSIC_FTS_WEIGHTS = (10.0, 5.0)
+PLAYLIST_FTS_WEIGHTS = (10.0, 2.0)
+
+# تعریف زنده‌ی تریگرهایی که جدول‌های FTS را با جدول‌های اصلی همگام نگه می‌دارند.
+# مایگریشن 0008 نسخه‌ی ثابت خودش را دارد؛ ensure_search_triggers هر تریگری را که
+# با این‌جا فرق داشته باشد (یا نباشد) از نو می‌سازد، پس تغییرات فقط همین‌جا اعمال می‌شوند
+SEARCH_TRIGGERS = {
+    "core_music_fts_ai": (
+        "CREATE TRIGGER core_music_fts_ai AFTER INSERT ON core_music BEGIN "
+        "INSERT INTO core_music_fts(rowid, title, artist) VALUES (new.id, new.title, new.artist); "
+        "END"
+    ),
+    "core_music_fts_ad": (
+        "CREATE TRIGGER core_music_fts_ad AFTER DELETE ON core_music BEGIN "
+        "DELETE FROM core_music_fts WHERE rowid = old.id; "
+        "END"
+    ),
+    "core_music_fts_au": (
+        "CREATE TRIGGER core_music_fts_au AFTER UPDATE OF title, artist ON core_music "
+        "BEGIN "
+        "DELETE FROM core_music_fts WHERE rowid = old.id; "
+        "INSERT INTO core_music_fts(rowid, title, artist) VALUES (new.id, new.title, new.artist); "
+        "END"
+    ),
+    "core_playlist_fts_ai": (
+        "CREATE TRIGGER core_playlist_fts_ai AFTER INSERT ON core_playlist "
+        "WHEN new.is_public BEGIN "
+        "INSERT INTO core_playlist_fts(rowid, name, description) "
+        "VALUES (new.id, new.name, new.description); "
+        "END"
+    ),
+    "core_playlist_fts_ad": (
+        "CREATE TRIGGER core_playlist_fts_ad AFTER DELETE ON core_playlist BEGIN "
+        "DELETE FROM core_playlist_fts WHERE rowid = old.id; "
+        "END"
+    ),
+    "core_playlist_fts_au": (
+        "CREATE TRIGGER core_playlist_fts_au "
+        "AFTER UPDATE OF name, description, is_public ON core_playlist BEGIN "
+        "DELETE FROM core_playlist_fts WHERE rowid = old.id; "
+        "INSERT INTO core_playlist_fts(rowid, name, description) "
+        "SELECT new.id, new.name, new.description WHERE new.is_public; "
+        "END"
+    ),
+}
+
+
+def get_search_page(request):
+    try:
+        limit = int(request.GET.get("limit", DEFAULT_SEARCH_LIMIT))
+        offset = int(request.GET.get("offset", 0))
+    except (TypeError, ValueError):
+        limit, offset = DEFAULT_SEARCH_LIMIT, 0
+    return max(1, min(limit, MAX_SEARCH_LIMIT)), max(0, offset)
+
+
+def fts_enabled(db=connection):
+    return db.vendor == "sqlite"
+
+
+def build_match_query(text):
+    """
+    متن کاربر را به یک عبارت امن FTS5 تبدیل می‌کند: هر کلمه به صورت پیشوندی و
+    همه‌ی کلمات با AND. علامت‌ها و عملگرهای FTS حذف می‌شوند.
+    """
+    tokens = TOKEN_RE.findall(text)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _ranked_ids(table, weights, match, limit, offset):
+    weight_args = ", ".join(str(w) for w in weights)
+    sql = (
+        f"SELECT rowid FROM {table} WHERE {table} MATCH %s "
+        f"ORDER BY bm25({table}, {weight_args}) LIMIT %s OFFSET %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+async def _ain_order(queryset, ids):
+    by_id = {obj.id: obj async for obj in queryset.filter(id__in=ids)}
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+def _music_queryset():
+    return Music.objects.select_related("uploaded_by")
+
+
+def _music_fallback(text, limit, offset):
+    # بدون FTS (دیتابیس غیر SQLite)
+    return (
+        _music_queryset()
+        .filter(Q(title__icontains=text) | Q(artist__icontains=text))
+        .order_by("-uploaded_at")[offset : offset + limit + 1]
+    )
+
+
+async def asearch_music(text, limit=DEFAULT_SEARCH_LIMIT, offset=0):
+    """
+    آهنگ‌ها را به ترتیب امتیاز bm25 برمی‌گرداند. خروجی: (لیست، آیا صفحه‌ی بعد هست).
+    کوئری خام FTS نسخه‌ی async ندارد و در thread اجرا می‌شود.
+    """
+    if fts_enabled():
+        match = build_match_query(text)
+        if not match:
+            return [], False
+        ids = await sync_to_async(_ranked_ids)(
+            "core_music_fts", MUSIC_FTS_WEIGHTS, match, limit + 1, offset
+        )
+        songs = await _ain_order(_music_queryset(), ids[:limit])
+        return songs, len(ids) > limit
+
+    songs = [song async for song in _music_fallback(text, limit, offset)]
+    return songs[:limit], len(songs) > limit
+
+
+def _playlist_queryset():
+    return Playlist.objects.filter(is_public=True).select_related("owner", "cover_song")
+
+
+def _playlist_fallback(text, limit, offset):
+    return (
+        _playlist_queryset()
+        .filter(Q(name__icontains=text) | Q(description__icontains=text))
+        .order_by("-created_at")[offset : offset + limit + 1]
+    )
+
+
+async def asearch_public_playlists(text, limit=DEFAULT_SEARCH_LIMIT, offset=0):
+    """پلی‌لیست‌های عمومی را به ترتیب امتیاز bm25 برمی‌گرداند."""
+    if fts_enabled():
+        match = build_match_query(text)
+        if not match:
+            return [], False
+        ids = await sync_to_async(_ranked_ids)(
+            "core_playlist_fts", PLAYLIST_FTS_WEIGHTS, match, limit + 1, offset
+        )
+        playlists = await _ain_order(_playlist_queryset(), ids[:limit])
+        return playlists, len(ids) > limit
+
+    playlists = [playlist async for playlist in _playlist_fallback(text, limit, offset)]
+    return playlists[:limit], len(playlists) > limit
+
+
+def _normalize_sql(sql):
+    # SQLite متن CREATE را همان‌طور که داده شده نگه می‌دارد؛ فاصله‌ها در مقایسه مهم نیستند
+    return " ".join((sql or "").split())
+
+
+def ensure_search_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    بعد از هر migrate (post_migrate): SQLite برای تغییر ستون‌ها جدول را از نو می‌سازد و
+    تریگرهای آن پاک می‌شوند. تریگرهای گم‌شده یا متفاوت با SEARCH_TRIGGERS دوباره ساخته
+    و ایندکس از نو پر می‌شود.
+    """
+    db = connections[using]
+    if not fts_enabled(db):
+        return
+    with db.cursor() as cursor:
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {name: _normalize_sql(sql) for name, sql in cursor.fetchall()}
+        if not {"core_music_fts", "core_playlist_fts"} <= existing.keys():
+            # هنوز به مایگریشن 0008 نرسیده (یا به قبل از آن برگشته)
+            return
+        stale = [
+            name
+            for name, sql in SEARCH_TRIGGERS.items()
+            if existing.get(name) != _normalize_sql(sql)
+        ]
+        for name in stale:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(SEARCH_TRIGGERS[name])
+    if stale:
+        rebuild_search_index(using)
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    """جدول‌های FTS را از روی جدول‌های اصلی از نو می‌سازد."""
+    db = connections[using]
+    if not fts_enabled(db):
+        return
+    with db.cursor() as cursor:
+        cursor.execute("DELETE FROM core_music_fts")
+        cursor.execute(
+            "INSERT INTO core_music_fts(rowid, title, artist) "
+            "SELECT id, title, artist FROM core_music"
+        )
+        cursor.execute("DELETE FROM core_playlist_fts")
+        cursor.execute(
+            "INSERT INTO core_playlist_fts(rowid, name, description) "
+            "SELECT id, name, description FROM core_playlist WHERE is_public"
+        )
+        cursor.execute("INSERT INTO core_music_fts(core_music_fts) VALUES ('optimize')")
+        cursor.execute(
+            "INSERT INTO core_playlist_fts(core_playlist_fts) VALUES ('optimize')"
+        )
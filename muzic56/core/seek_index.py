@@ -0,0 +1,108 @@
+"""
+ایندکس فریم‌های MP3 برای جابه‌جایی دقیق بر اساس زمان.
+
+فایل کناری (sidecar) یک هدر کوچک و بعد آرایه‌ی فشرده‌ی uint32 از offset فریم‌ها
+است؛ از هر step فریم یکی نگه داشته می‌شود. چون طول زمانی فریم‌ها در یک فایل ثابت
+است، زمان هر خانه از شماره‌اش به دست می‌آید و پیدا کردن offset یک read ساده است.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from .blobs import write_sidecar
+from .audio_meta import MP3_SCAN_LIMIT, AudioParseError, find_first_frame, id3v2_size, parse_frame_header
+
+
+INDEX_SUFFIX = ".frames"
+INDEX_MAGIC = b"MZFI"
+INDEX_VERSION = 1
+# magic, version, step, sample_rate, samples_per_frame, count
+INDEX_HEADER = struct.Struct("<4sBxHIII")
+SEEK_RESOLUTION = 0.25  # ثانیه؛ فاصله‌ی تقریبی بین خانه‌های ایندکس
+
+
+def index_path(audio_path):
+    return audio_path + INDEX_SUFFIX
+
+
+def _is_info_frame(mm, position, header):
+    # فریم Xing/Info/VBRI صدا ندارد و در زمان‌بندی حساب نمی‌شود
+    frame = mm[position:position + min(header.length, 64)]
+    return b"Xing" in frame or b"Info" in frame or b"VBRI" in frame
+
+
+def build_frame_index(path):
+    """فریم‌ها را یک بار از روی هدرها پیمایش می‌کند و محتوای فایل ایندکس را برمی‌گرداند."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        tag_size = id3v2_size(f.read(10))
+        f.seek(tag_size)
+        first_offset, first = find_first_frame(f.read(MP3_SCAN_LIMIT))
+        if first is None:
+            raise AudioParseError("No MPEG audio frame found")
+
+        step = max(1, round(SEEK_RESOLUTION * first.sample_rate / first.samples))
+        offsets = array("I")
+        frames = 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            position = tag_size + first_offset
+            if _is_info_frame(mm, position, first):
+                position += first.length
+            while 0 <= position < size:
+                header = parse_frame_header(mm[position:position + 4])
+                if (
+                    header is None
+                    or header.sample_rate != first.sample_rate
+                    or header.layer != first.layer
+                    or position + header.length > size
+                ):
+                    # داده‌ی خراب یا تگ وسط فایل؛ از sync بعدی ادامه می‌دهیم
+                    position = mm.find(b"\xff", position + 1)
+                    continue
+                if frames % step == 0:
+                    offsets.append(position)
+                frames += 1
+                position += header.length
+
+    if not offsets:
+        raise AudioParseError("No MPEG audio frame found")
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    header = INDEX_HEADER.pack(
+        INDEX_MAGIC, INDEX_VERSION, step, first.sample_rate, first.samples, len(offsets)
+    )
+    return header + offsets.tobytes()
+
+
+def write_frame_index(audio_path, force=False):
+    """ایندکس را کنار فایل صوتی می‌نویسد؛ اگر از قبل باشد (مثلاً blob مشترک) دوباره ساخته نمی‌شود."""
+    destination = index_path(audio_path)
+    if not force and os.path.exists(destination):
+        return False
+    write_sidecar(destination, build_frame_index(audio_path))
+    return True
+
+
+def seek_offset(audio_path, seconds):
+    """
+    offset اولین فریم در زمان seconds (یا کمی قبل از آن) و زمان دقیق آن فریم را
+    برمی‌گرداند. اگر ایندکسی وجود نداشته باشد None.
+    """
+    try:
+        f = open(index_path(audio_path), "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        header = f.read(INDEX_HEADER.size)
+        if len(header) < INDEX_HEADER.size:
+            return None
+        magic, version, step, sample_rate, samples, count = INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or not count:
+            return None
+        slot_seconds = step * samples / sample_rate
+        slot = min(max(int(seconds / slot_seconds), 0), count - 1)
+        f.seek(INDEX_HEADER.size + slot * 4)
+        (offset,) = struct.unpack("<I", f.read(4))
+    return offset, slot * slot_seconds
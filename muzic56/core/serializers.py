@@ -1,62 +1,106 @@
 from rest_framework import serializers
-from .models import Music, Playlist, PlaylistSong
-from django.db.models import Count  
+from .media_urls import get_media_urls
+from .models import Music, MusicLike, Playlist, PlaylistSong
+from django.db import models
+from django.db.models import prefetch_related_objects
+
+
+class MusicListSerializer(serializers.ListSerializer):
+    """
+    قبل از سریالایز کردن یک لیست، داده‌های مشترک همه‌ی ردیف‌ها را یکجا می‌خواند:
+    آپلودکننده و آهنگ‌هایی که کاربر فعلی لایک کرده.
+    این‌طوری تعداد کوئری‌ها به طول لیست بستگی ندارد.
+    """
+
+    def to_representation(self, data):
+        songs = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.preload(songs)
+        return [self.child.to_representation(song) for song in songs]
+
+    def preload(self, songs):
+        if not songs:
+            return
+        prefetch_related_objects(songs, 'uploaded_by')
+
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            self.child.liked_ids = set(
+                MusicLike.objects.filter(
+                    user_id=request.user.id,
+                    music_id__in=[song.id for song in songs],
+                ).values_list('music_id', flat=True)
+            )
+        else:
+            self.child.liked_ids = set()
+
 
 class MusicSerializer(serializers.ModelSerializer):
     audio_url = serializers.SerializerMethodField()
     cover_url = serializers.SerializerMethodField()
+    cover_srcset = serializers.SerializerMethodField()
+    waveform_url = serializers.SerializerMethodField()
     uploaded_by_username = serializers.CharField(source='uploaded_by.username', read_only=True)
-    like_count = serializers.SerializerMethodField()  
+    like_count = serializers.IntegerField(read_only=True)
     is_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Music
-        fields = ['id', 'title', 'artist', 'audio_file', 'audio_url', 'cover_image', 'cover_url', 
-                 'uploaded_by', 'uploaded_by_username', 'uploaded_at', 'like_count', 'is_liked']
+        # فایل‌های خام (audio_file/cover_image) فرستاده نمی‌شوند؛ همه‌ی آدرس‌ها از MediaURLBuilder می‌آیند
+        fields = ['id', 'title', 'artist', 'audio_url', 'cover_url', 'cover_srcset',
+                 'uploaded_by', 'uploaded_by_username', 'uploaded_at', 'like_count', 'play_count', 'duration', 'bitrate', 'codec', 'replay_gain', 'waveform_url', 'processing_status', 'is_liked']
+        list_serializer_class = MusicListSerializer
+
+    def get_waveform_url(self, obj):
+        request = self.context.get('request')
+        if request:
+            return get_media_urls(request).waveform_url(obj)
+        return None
 
     def get_audio_url(self, obj):
+        # پلیر از endpoint استریم (یا آدرس امضاشده) استفاده می‌کند که Range و کش را پشتیبانی می‌کند
         request = self.context.get('request')
-        if obj.audio_file and request:
-            return request.build_absolute_uri(obj.audio_file.url)
+        if request:
+            return get_media_urls(request).audio_url(obj)
         return None
 
     def get_cover_url(self, obj):
+        # در لیست‌ها thumbnail فرستاده می‌شود، نه فایل اصلی که ممکن است چند مگابایت باشد
         request = self.context.get('request')
-        if obj.cover_image and request:
-            return request.build_absolute_uri(obj.cover_image.url)
+        if request:
+            return get_media_urls(request).cover_url(obj)
         return None
 
-    def get_like_count(self, obj):
-        
-        if hasattr(obj, 'likes_count'):
-            return obj.likes_count
-        return obj.likes.count()
+    def get_cover_srcset(self, obj):
+        request = self.context.get('request')
+        if request:
+            return get_media_urls(request).srcset(obj.cover_thumbnails)
+        return None
 
     def get_is_liked(self, obj):
+        liked_ids = getattr(self, 'liked_ids', None)
+        if liked_ids is not None:
+            return obj.id in liked_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.likes.filter(id=request.user.id).exists()
         return False
 
 class PlaylistSerializer(serializers.ModelSerializer):
-    song_count = serializers.SerializerMethodField()
+    """song_count و کاور از خلاصه‌ی ذخیره‌شده روی Playlist خوانده می‌شوند؛ owner و cover_song را select_related کنید."""
     owner_username = serializers.CharField(source='owner.username', read_only=True)
     cover_url = serializers.SerializerMethodField()
+    cover_srcset = serializers.SerializerMethodField()
     is_liked_playlist = serializers.SerializerMethodField()
     
     class Meta:
         model = Playlist
-        fields = ['id', 'name', 'description', 'created_at', 'song_count', 'is_public', 'owner_username', 'cover_url', 'is_liked_playlist']
-    
-    def get_song_count(self, obj):
-        return obj.songs.count()
+        fields = ['id', 'name', 'description', 'created_at', 'updated_at', 'song_count', 'total_duration', 'is_public', 'owner_username', 'cover_url', 'cover_srcset', 'is_liked_playlist']
 
     def get_cover_url(self, obj):
-        request = self.context.get('request')
-        first_song = obj.songs.first()
-        if first_song and first_song.cover_image:
-            return request.build_absolute_uri(first_song.cover_image.url) if request else first_song.cover_image.url
-        return None
+        return get_media_urls(self.context.get('request')).playlist_cover_url(obj)
+
+    def get_cover_srcset(self, obj):
+        return get_media_urls(self.context.get('request')).srcset(obj.mosaic)
 
     def get_is_liked_playlist(self, obj):
         return False
@@ -64,13 +108,7 @@ class PlaylistSerializer(serializers.ModelSerializer):
 class PlaylistDetailSerializer(serializers.ModelSerializer):
     songs = MusicSerializer(many=True, read_only=True)
     owner_username = serializers.CharField(source='owner.username', read_only=True)
-    song_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Playlist
-        fields = ['id', 'name', 'description', 'songs', 'created_at', 'owner_username', 'is_public', 'song_count']
-
-    def get_song_count(self, obj):
-
-     
-        return obj.songs.count()
+        fields = ['id', 'name', 'description', 'songs', 'created_at', 'updated_at', 'owner_username', 'is_public', 'song_count', 'total_duration']
@@ -0,0 +1,120 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import suggest
+from .blobs import release_blob
+from .jobs import enqueue
+from .models import Change, CustomUser, Music, MusicLike, Playlist, PlaylistSong
+from .playlists import in_bulk_edit, refresh_playlists_with_songs, refresh_summary
+from .thumbnails import delete_thumbnails
+from .sync import record
+from .versions import CATALOG, bump, likes_scope, playlists_scope
+
+
+@receiver(post_save, sender=Music)
+def update_suggest_index(sender, instance, **kwargs):
+    suggest.upsert(instance.id, instance.title, instance.artist, instance.like_count)
+
+
+@receiver(post_delete, sender=Music)
+def remove_from_suggest_index(sender, instance, **kwargs):
+    suggest.remove(instance.id)
+
+
+@receiver(post_delete, sender=Music)
+def release_audio_blob(sender, instance, **kwargs):
+    # هم DeleteMusicView و هم حذف آبشاری در DeleteAccountView از این مسیر می‌گذرند
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+
+
+@receiver(post_save, sender=Music)
+def queue_cover_thumbnails(sender, instance, created=False, **kwargs):
+    # فقط وقتی کاور با منبع thumbnailهای فعلی فرق دارد
+    if (instance.cover_image.name or None) != (instance.cover_thumbnails or {}).get("source"):
+        enqueue("thumbnail_music_cover", {"music_id": instance.id}, unique=True)
+        if not created:
+            # آهنگ ممکن است تازه کاور گرفته یا کاورش را از دست داده باشد
+            refresh_playlists_with_songs([instance.id])
+
+
+@receiver(post_save, sender=CustomUser)
+def queue_profile_thumbnails(sender, instance, **kwargs):
+    if (instance.profile_image.name or None) != (instance.profile_thumbnails or {}).get("source"):
+        enqueue("thumbnail_profile_image", {"user_id": instance.id}, unique=True)
+
+
+@receiver(post_save, sender=PlaylistSong)
+@receiver(post_delete, sender=PlaylistSong)
+def playlist_songs_changed(sender, instance, origin=None, **kwargs):
+    # ویرایش گروهی خودش یک بار خلاصه را حساب می‌کند؛ حذف خود پلی‌لیست هم خلاصه نمی‌خواهد
+    if in_bulk_edit() or isinstance(origin, Playlist):
+        return
+    owner_id = Playlist.objects.filter(id=instance.playlist_id).values_list("owner_id", flat=True).first()
+    if owner_id is None:
+        return
+    action = Change.ACTION_DELETE if kwargs["signal"] is post_delete else Change.ACTION_UPSERT
+    record(Change.ENTITY_PLAYLIST_SONG, instance.id, action, user_id=owner_id)
+    refresh_summary(instance.playlist_id)
+    enqueue("build_playlist_mosaic", {"playlist_id": instance.playlist_id}, unique=True)
+
+
+@receiver(post_delete, sender=Music)
+def delete_cover_thumbnails(sender, instance, **kwargs):
+    delete_thumbnails(instance.cover_thumbnails)
+
+
+@receiver(post_delete, sender=Playlist)
+def delete_playlist_mosaic(sender, instance, **kwargs):
+    delete_thumbnails(instance.mosaic)
+
+
+@receiver(post_save, sender=Music)
+@receiver(post_delete, sender=Music)
+def bump_catalog_version(sender, instance, **kwargs):
+    bump(CATALOG)
+
+
+@receiver(post_save, sender=MusicLike)
+@receiver(post_delete, sender=MusicLike)
+def bump_like_versions(sender, instance, **kwargs):
+    # add_like/remove_like از مدل through می‌نویسند، پس m2m_changed صدا زده نمی‌شود.
+    # like_count آهنگ خودش جزو ETag لیست‌هاست (COUNTER_FIELDS)؛ کاتالوگ بقیه دست نمی‌خورد
+    bump(likes_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Playlist)
+@receiver(post_delete, sender=Playlist)
+def bump_playlists_version(sender, instance, **kwargs):
+    bump(playlists_scope(instance.owner_id))
+
+
+@receiver(post_save, sender=Music)
+def log_music_saved(sender, instance, **kwargs):
+    record(Change.ENTITY_MUSIC, instance.id)
+
+
+@receiver(post_delete, sender=Music)
+def log_music_deleted(sender, instance, **kwargs):
+    record(Change.ENTITY_MUSIC, instance.id, Change.ACTION_DELETE)
+
+
+@receiver(post_save, sender=Playlist)
+def log_playlist_saved(sender, instance, **kwargs):
+    record(Change.ENTITY_PLAYLIST, instance.id, user_id=instance.owner_id)
+
+
+@receiver(post_delete, sender=Playlist)
+def log_playlist_deleted(sender, instance, **kwargs):
+    # ردیف‌های PlaylistSong آن جدا لاگ نمی‌شوند؛ کلاینت با حذف پلی‌لیست آن‌ها را هم پاک می‌کند
+    record(Change.ENTITY_PLAYLIST, instance.id, Change.ACTION_DELETE, user_id=instance.owner_id)
+
+
+@receiver(post_save, sender=MusicLike)
+def log_like_saved(sender, instance, **kwargs):
+    record(Change.ENTITY_LIKE, instance.music_id, user_id=instance.user_id)
+
+
+@receiver(post_delete, sender=MusicLike)
+def log_like_deleted(sender, instance, **kwargs):
+    record(Change.ENTITY_LIKE, instance.music_id, Change.ACTION_DELETE, user_id=instance.user_id)
@@ -0,0 +1,187 @@
+import mimetypes
+import mmap
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+from .seek_index import seek_offset
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    هدر Range را به (start, end) تبدیل می‌کند (end شامل می‌شود).
+    فقط یک بازه پشتیبانی می‌شود؛ برای هدرهای دیگر None برمی‌گردد تا کل فایل ارسال شود.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # bytes=-500 یعنی 500 بایت آخر
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        start, end = max(size - length, 0), size - 1
+    else:
+        start = int(first)
+        end = int(last) if last else size - 1
+        end = min(end, size - 1)
+
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return since is not None and int(mtime) <= since
+
+
+def _range_allowed(request, etag, mtime):
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def _iter_mmap(path, start, end):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        position = start
+        while position <= end:
+            stop = min(position + STREAM_CHUNK_SIZE, end + 1)
+            yield mm[position:stop]
+            position = stop
+
+
+def ranged_file_response(request, path, content_type=None, start=None):
+    """
+    فایل را با پشتیبانی از Range (پاسخ 206)، ETag و Last-Modified برمی‌گرداند.
+    اگر start داده شود، مثل Range: bytes=start- رفتار می‌شود.
+
+    درخواست کامل با FileResponse ارسال می‌شود تا وب‌سرور بتواند از sendfile استفاده کند؛
+    درخواست‌های جزئی مستقیم از mmap خوانده می‌شوند.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = file_etag(stat)
+    content_type = content_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    byte_range = None
+    range_header = request.META.get("HTTP_RANGE")
+    if start is not None:
+        # فایل خالی بازه‌ای ندارد و کامل (با بدنه‌ی خالی) فرستاده می‌شود
+        if size:
+            byte_range = (min(start, size - 1), size - 1)
+    elif range_header and _range_allowed(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            response["Accept-Ranges"] = "bytes"
+            return response
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type)
+        response["Content-Length"] = str(size)
+        if byte_range is not None:
+            start, end = byte_range
+            response.status_code = 206
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = str(end - start + 1)
+    elif byte_range is None:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _iter_mmap(path, start, end), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Cache-Control"] = "public, max-age=86400"
+    return response
+
+
+def offloaded_file_response(name):
+    """
+    اگر MEDIA_OFFLOAD تنظیم شده باشد، ارسال بایت‌ها را به وب‌سرور جلویی می‌سپارد.
+
+    'nginx' هدر X-Accel-Redirect و 'sendfile' هدر X-Sendfile را برمی‌گرداند؛
+    در غیر این صورت None.
+    """
+    mode = getattr(settings, "MEDIA_OFFLOAD", None)
+    if not mode:
+        return None
+
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    response = HttpResponse(content_type=content_type)
+    if mode == "nginx":
+        prefix = getattr(settings, "MEDIA_OFFLOAD_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(name)
+    elif mode == "sendfile":
+        response["X-Sendfile"] = safe_join(settings.MEDIA_ROOT, name)
+    else:
+        raise ValueError(f"Unknown MEDIA_OFFLOAD mode: {mode}")
+    return response
+
+
+def serve_media_file(request, name, seek=None):
+    """
+    فایل مدیا را از طریق وب‌سرور (در صورت فعال بودن) یا مستقیم با پشتیبانی Range برمی‌گرداند.
+
+    seek (ثانیه) اگر داده شود و کلاینت Range نفرستاده باشد، پاسخ از مرز فریم آن
+    زمان شروع می‌شود (با ایندکس فریم‌ها، core/seek_index.py). زمان دقیق شروع در
+    هدر X-Seek-Time برمی‌گردد.
+    """
+    path = safe_join(settings.MEDIA_ROOT, name)
+    if seek is not None and "HTTP_RANGE" not in request.META:
+        found = seek_offset(path, seek)
+        if found is not None:
+            offset, at = found
+            response = ranged_file_response(request, path, start=offset)
+            response["X-Seek-Time"] = f"{at:.3f}"
+            return response
+
+    response = offloaded_file_response(name)
+    if response is not None:
+        # وب‌سرور جلویی برای فایل گم‌شده صفحه‌ی خطای خودش را می‌دهد؛ 404 همین‌جا برمی‌گردد
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        return response
+    return ranged_file_response(request, path)
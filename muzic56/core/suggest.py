@@ -0,0 +1,289 @@
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+
+DEFAULT_SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 20
+# سقف تعداد عباراتی که برای یک پیشوند یا سه‌حرفی بررسی می‌شوند تا زمان پاسخ ثابت بماند
+MAX_PREFIX_SCAN = 2000
+MAX_TRIGRAM_POSTINGS = 5000
+MAX_FUZZY_TERMS = 5
+MIN_FUZZY_SIMILARITY = 0.4
+
+NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize(text):
+    text = (text or "").casefold()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return NON_WORD_RE.sub(" ", text).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    """
+    ایندکس درون‌حافظه‌ای پیشوندی و سه‌حرفی (trigram) روی عنوان و هنرمند آهنگ‌ها.
+
+    هر آهنگ یک «خانه» (slot) در آرایه‌های فشرده دارد. عبارات در یک لیست مرتب
+    نگه داشته می‌شوند تا جستجوی پیشوندی با bisect انجام شود. برای غلط تایپی،
+    سه‌حرفی‌های واژگان (نه تک‌تک آهنگ‌ها) ایندکس می‌شوند و نزدیک‌ترین واژه‌ها
+    جایگزین کلمه‌ی کاربر می‌شوند. حذف فقط خانه را غیرفعال می‌کند و وقتی
+    خانه‌های مرده زیاد شوند ایندکس فشرده می‌شود.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._ids = array("q")
+        self._weights = array("l")
+        self._alive = bytearray()
+        self._titles = []
+        self._artists = []
+        self._slot_by_id = {}
+        self._terms = []
+        self._term_slots = array("l")
+        self._vocab = {}
+        self._vocab_terms = []
+        self._vocab_gram_counts = array("l")
+        self._vocab_grams = {}
+        self._dead = 0
+
+    def build(self, rows):
+        """rows: (id, title, artist, weight) — خروجی یک values_list."""
+        with self._lock:
+            self._reset()
+            pairs = []
+            for music_id, title, artist, weight in rows:
+                slot, terms = self._append(music_id, title, artist, weight)
+                pairs.extend((term, slot) for term in terms)
+            pairs.sort()
+            self._terms = [term for term, _ in pairs]
+            self._term_slots = array("l", (slot for _, slot in pairs))
+            self.built_at = time.monotonic()
+
+    def _append(self, music_id, title, artist, weight):
+        slot = len(self._ids)
+        self._ids.append(music_id)
+        self._weights.append(weight or 0)
+        self._alive.append(1)
+        self._titles.append(title)
+        self._artists.append(artist or "")
+        self._slot_by_id[music_id] = slot
+        terms = set(normalize(f"{title} {artist or ''}").split())
+        for term in terms:
+            if term not in self._vocab:
+                self._add_vocab(term)
+        return slot, terms
+
+    def _add_vocab(self, term):
+        term_id = len(self._vocab_terms)
+        self._vocab[term] = term_id
+        self._vocab_terms.append(term)
+        grams = trigrams(term)
+        self._vocab_gram_counts.append(len(grams))
+        for gram in grams:
+            if gram in self._vocab_grams:
+                self._vocab_grams[gram].append(term_id)
+            else:
+                self._vocab_grams[gram] = array("l", (term_id,))
+
+    def upsert(self, music_id, title, artist, weight=0):
+        with self._lock:
+            self._remove(music_id)
+            slot, terms = self._append(music_id, title, artist, weight)
+            for term in terms:
+                position = bisect_left(self._terms, term)
+                self._terms.insert(position, term)
+                self._term_slots.insert(position, slot)
+
+    def remove(self, music_id):
+        with self._lock:
+            self._remove(music_id)
+
+    def _remove(self, music_id):
+        slot = self._slot_by_id.pop(music_id, None)
+        if slot is None:
+            return
+        self._alive[slot] = 0
+        self._dead += 1
+        if self._dead > 1000 and self._dead * 4 > len(self._ids):
+            self._compact()
+
+    def _compact(self):
+        rows = [
+            (self._ids[slot], self._titles[slot], self._artists[slot], self._weights[slot])
+            for slot in range(len(self._ids))
+            if self._alive[slot]
+        ]
+        built_at = self.built_at
+        self.build(rows)
+        self.built_at = built_at
+
+    def _term_range_slots(self, term, prefix=True):
+        slots = set()
+        position = bisect_left(self._terms, term)
+        end = min(position + MAX_PREFIX_SCAN, len(self._terms))
+        while position < end:
+            current = self._terms[position]
+            if not (current.startswith(term) if prefix else current == term):
+                break
+            slot = self._term_slots[position]
+            if self._alive[slot]:
+                slots.add(slot)
+            position += 1
+        return slots
+
+    def _fuzzy_slots(self, token):
+        """آهنگ‌های شامل واژه‌هایی که از نظر سه‌حرفی به token نزدیک‌اند (ضریب Dice)."""
+        grams = trigrams(token)
+        overlaps = {}
+        for gram in grams:
+            postings = self._vocab_grams.get(gram)
+            if not postings or len(postings) > MAX_TRIGRAM_POSTINGS:
+                continue
+            for term_id in postings:
+                overlaps[term_id] = overlaps.get(term_id, 0) + 1
+
+        scored = []
+        for term_id, overlap in overlaps.items():
+            dice = 2 * overlap / (len(grams) + self._vocab_gram_counts[term_id])
+            if dice >= MIN_FUZZY_SIMILARITY:
+                scored.append((dice, term_id))
+        scored.sort(reverse=True)
+
+        slots = set()
+        for _, term_id in scored[:MAX_FUZZY_TERMS]:
+            slots |= self._term_range_slots(self._vocab_terms[term_id], prefix=False)
+        return slots
+
+    def suggest(self, query, limit=DEFAULT_SUGGEST_LIMIT):
+        text = normalize(query)
+        if not text:
+            return []
+        with self._lock:
+            matched = None
+            for token in text.split():
+                slots = self._term_range_slots(token) or self._fuzzy_slots(token)
+                matched = slots if matched is None else matched & slots
+                if not matched:
+                    return []
+
+            best = sorted(
+                matched,
+                key=lambda slot: (self._weights[slot], -self._ids[slot]),
+                reverse=True,
+            )[:limit]
+            return [
+                {
+                    "id": self._ids[slot],
+                    "title": self._titles[slot],
+                    "artist": self._artists[slot],
+                }
+                for slot in best
+            ]
+
+
+index = SuggestIndex()
+_refresh_lock = threading.Lock()
+_build_lock = threading.Lock()
+# تغییراتی که در حین ساخت ایندکس تازه روی ایندکس فعلی اعمال شده‌اند: (id، (title, artist, weight) یا None)
+_pending = None
+_pending_lock = threading.Lock()
+
+
+def upsert(music_id, title, artist, weight=0):
+    """تغییر یک آهنگ؛ اگر ایندکس تازه در حال ساخت باشد، قبل از جایگزینی روی آن هم اعمال می‌شود."""
+    with _pending_lock:
+        index.upsert(music_id, title, artist, weight)
+        if _pending is not None:
+            _pending.append((music_id, (title, artist, weight)))
+
+
+def remove(music_id):
+    with _pending_lock:
+        index.remove(music_id)
+        if _pending is not None:
+            _pending.append((music_id, None))
+
+
+def load_snapshot():
+    """
+    کل کاتالوگ را با یک کوئری values_list (بدون ساختن آبجکت مدل) در یک ایندکس تازه
+    بارگذاری و سپس جایگزین ایندکس فعلی می‌کند تا درخواست‌ها در حین ساخت منتظر نمانند.
+    upsert و remove هایی که در این فاصله رسیده‌اند قبل از جایگزینی روی ایندکس تازه تکرار می‌شوند.
+    """
+    global index, _pending
+    from .models import Music
+
+    with _build_lock:
+        with _pending_lock:
+            _pending = []
+        try:
+            rows = Music.objects.values_list("id", "title", "artist", "like_count").iterator(
+                chunk_size=2000
+            )
+            fresh = SuggestIndex()
+            fresh.build(rows)
+            with _pending_lock:
+                for music_id, row in _pending:
+                    if row is None:
+                        fresh.remove(music_id)
+                    else:
+                        fresh.upsert(music_id, *row)
+                index = fresh
+        finally:
+            with _pending_lock:
+                _pending = None
+
+
+def _refresh_in_background():
+    if not _refresh_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            load_snapshot()
+        finally:
+            connection.close()
+            _refresh_lock.release()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def suggest(query, limit=DEFAULT_SUGGEST_LIMIT):
+    """
+    اولین بار ایندکس را می‌سازد. بعد از آن اگر از SUGGEST_INDEX_MAX_AGE قدیمی‌تر باشد
+    (تغییرات پروسس‌های دیگر)، در پس‌زمینه تازه می‌شود و درخواست منتظر دیتابیس نمی‌ماند.
+    """
+    if not index.built_at:
+        with _refresh_lock:
+            if not index.built_at:
+                load_snapshot()
+    elif time.monotonic() - index.built_at > getattr(settings, "SUGGEST_INDEX_MAX_AGE", 300):
+        _refresh_in_background()
+    return index.suggest(query, limit)
+
+
+def warm():
+    """هنگام بالا آمدن سرور ایندکس را می‌سازد تا اولین درخواست منتظر نماند."""
+    try:
+        load_snapshot()
+    except DatabaseError:
+        # مثلاً قبل از اجرای migrate؛ اولین درخواست ایندکس را می‌سازد
+        pass
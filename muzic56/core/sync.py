@@ -0,0 +1,200 @@
+"""
+لاگ تغییرات و همگام‌سازی تدریجی کلاینت‌ها.
+
+هر نوشتن روی آهنگ، پلی‌لیست، آهنگ‌های پلی‌لیست و لایک‌ها یک ردیف Change در همان
+تراکنش اضافه می‌کند. کلاینت بار اول snapshot کامل کتابخانه‌اش را می‌گیرد و بعد از آن
+فقط با ?since=<cursor> تغییرات بعدی را؛ چند تغییر روی یک چیز به آخرین حالت آن خلاصه
+می‌شود و برای هر upsert نسخه‌ی فعلی ردیف فرستاده می‌شود.
+"""
+from django.db.models import Max, Q
+
+from .models import Change, Music, MusicLike, Playlist, PlaylistSong, ResourceVersion
+from .serializers import MusicSerializer, PlaylistSerializer
+from .versions import CATALOG, bump
+
+
+SYNC_PAGE_SIZE = 1000
+# ResourceVersion با این scope، id آخرین تغییر پاک‌شده را نگه می‌دارد (prune_change_log)
+PRUNED_SCOPE = "changes:pruned"
+
+
+class SyncCursorExpired(Exception):
+    """تغییرات بعد از این cursor پاک شده‌اند؛ کلاینت باید snapshot کامل بگیرد."""
+
+
+def record(entity, entity_id, action=Change.ACTION_UPSERT, user_id=None):
+    Change.objects.create(entity=entity, entity_id=entity_id, action=action, user_id=user_id)
+
+
+def record_many(entity, entity_ids, action=Change.ACTION_UPSERT, user_id=None):
+    Change.objects.bulk_create(
+        [
+            Change(entity=entity, entity_id=entity_id, action=action, user_id=user_id)
+            for entity_id in entity_ids
+        ]
+    )
+
+
+def music_updated(*music_ids):
+    """برای جاهایی که Music را با queryset.update تغییر می‌دهند و signal ندارند."""
+    bump(CATALOG)
+    record_many(Change.ENTITY_MUSIC, music_ids)
+
+
+def pruned_until():
+    return (
+        ResourceVersion.objects.filter(scope=PRUNED_SCOPE)
+        .values_list("version", flat=True)
+        .first()
+        or 0
+    )
+
+
+def library_song_filter(user, field="id"):
+    """آهنگ‌های کتابخانه‌ی کاربر: لایک‌شده، در پلی‌لیست‌هایش، یا آپلود خودش."""
+    return (
+        Q(**{f"{field}__in": MusicLike.objects.filter(user_id=user.id).values("music_id")})
+        | Q(**{f"{field}__in": PlaylistSong.objects.filter(playlist__owner_id=user.id).values("song_id")})
+        | Q(**{f"{field}__in": Music.objects.filter(uploaded_by_id=user.id).values("id")})
+    )
+
+
+def prune_changes(before):
+    """تغییرات قدیمی‌تر از before را پاک می‌کند؛ cursorهای قبل از آن‌ها منقضی می‌شوند."""
+    old = Change.objects.filter(created_at__lt=before)
+    last_id = old.aggregate(last=Max("id"))["last"]
+    if last_id is None:
+        return 0
+    deleted, _ = Change.objects.filter(id__lte=last_id).delete()
+    ResourceVersion.objects.update_or_create(scope=PRUNED_SCOPE, defaults={"version": last_id})
+    return deleted
+
+
+def latest_cursor():
+    return Change.objects.aggregate(latest=Max("id"))["latest"] or 0
+
+
+def changes_since(user, since, limit=SYNC_PAGE_SIZE):
+    """
+    تغییرات مربوط به user بعد از since، خلاصه‌شده به آخرین action هر چیز.
+    (changes, cursor, has_more) برمی‌گرداند؛ changes: {(entity, entity_id): action}
+    """
+    if since < pruned_until():
+        raise SyncCursorExpired()
+
+    latest = latest_cursor()
+    music_changes = Q(user__isnull=True, entity=Change.ENTITY_MUSIC) & (
+        Q(action=Change.ACTION_DELETE) | library_song_filter(user, "entity_id")
+    )
+    rows = list(
+        Change.objects.filter(id__gt=since, id__lte=latest)
+        .filter(Q(user_id=user.id) | music_changes)
+        .order_by("id")
+        .values_list("id", "entity", "entity_id", "action")[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # اگر صفحه پر نشده، cursor تا آخرین تغییر موجود جلو می‌رود تا دفعه‌ی بعد دوباره اسکن نشود
+    cursor = rows[-1][0] if has_more else latest
+
+    changes = {}
+    for _, entity, entity_id, action in rows:
+        changes[(entity, entity_id)] = action
+    return changes, cursor, has_more
+
+
+def _empty_payload():
+    return {
+        "music": {"upserted": [], "deleted": []},
+        "playlists": {"upserted": [], "deleted": []},
+        "playlist_songs": {"upserted": [], "deleted": []},
+        "likes": {"upserted": [], "deleted": []},
+    }
+
+
+def _playlist_song_rows(queryset):
+    return list(queryset.values("id", "playlist_id", "song_id", "position", "added_at"))
+
+
+def _like_rows(queryset):
+    return [
+        {"song_id": music_id, "liked_at": liked_at}
+        for music_id, liked_at in queryset.values_list("music_id", "liked_at")
+    ]
+
+
+def build_delta(request, changes):
+    """upsert ها با یک کوئری برای هر نوع از ردیف‌های فعلی ساخته می‌شوند."""
+    user = request.user
+    context = {"request": request}
+    payload = _empty_payload()
+    wanted = {key: set() for key in payload}
+    keys = {
+        Change.ENTITY_MUSIC: "music",
+        Change.ENTITY_PLAYLIST: "playlists",
+        Change.ENTITY_PLAYLIST_SONG: "playlist_songs",
+        Change.ENTITY_LIKE: "likes",
+    }
+    for (entity, entity_id), action in changes.items():
+        key = keys[entity]
+        if action == Change.ACTION_DELETE:
+            payload[key]["deleted"].append(entity_id)
+        else:
+            wanted[key].add(entity_id)
+
+    if wanted["playlists"]:
+        playlists = Playlist.objects.filter(
+            id__in=wanted["playlists"], owner_id=user.id
+        ).select_related("owner", "cover_song")
+        payload["playlists"]["upserted"] = PlaylistSerializer(
+            playlists, many=True, context=context
+        ).data
+    if wanted["playlist_songs"]:
+        payload["playlist_songs"]["upserted"] = _playlist_song_rows(
+            PlaylistSong.objects.filter(
+                id__in=wanted["playlist_songs"], playlist__owner_id=user.id
+            )
+        )
+    if wanted["likes"]:
+        payload["likes"]["upserted"] = _like_rows(
+            MusicLike.objects.filter(user_id=user.id, music_id__in=wanted["likes"])
+        )
+
+    # آهنگ تازه لایک‌شده یا اضافه‌شده به پلی‌لیست ممکن است بیرون از کتابخانه‌ی قبلی کاربر
+    # باشد؛ داده‌اش همین‌جا فرستاده می‌شود تا کلاینت به ردیفی بی‌آهنگ ارجاع ندهد
+    referenced = {row["song_id"] for row in payload["playlist_songs"]["upserted"]}
+    referenced.update(row["song_id"] for row in payload["likes"]["upserted"])
+    if wanted["music"] or referenced:
+        songs = Music.objects.filter(id__in=wanted["music"] | referenced).select_related(
+            "uploaded_by"
+        )
+        payload["music"]["upserted"] = MusicSerializer(songs, many=True, context=context).data
+
+    # ردیفی که دیگر وجود ندارد (یا دیگر مال این کاربر نیست) برای کلاینت حذف‌شده است
+    for key, found_key in (
+        ("music", "id"),
+        ("playlists", "id"),
+        ("playlist_songs", "id"),
+        ("likes", "song_id"),
+    ):
+        found = {row[found_key] for row in payload[key]["upserted"]}
+        payload[key]["deleted"].extend(sorted(wanted[key] - found))
+    return payload
+
+
+def build_snapshot(request):
+    """کل کتابخانه‌ی کاربر برای همگام‌سازی اول."""
+    user = request.user
+    context = {"request": request}
+    payload = _empty_payload()
+    songs = Music.objects.filter(library_song_filter(user)).select_related("uploaded_by")
+    payload["music"]["upserted"] = MusicSerializer(songs, many=True, context=context).data
+    playlists = Playlist.objects.filter(owner_id=user.id).select_related("owner", "cover_song")
+    payload["playlists"]["upserted"] = PlaylistSerializer(
+        playlists, many=True, context=context
+    ).data
+    payload["playlist_songs"]["upserted"] = _playlist_song_rows(
+        PlaylistSong.objects.filter(playlist__owner_id=user.id).order_by("playlist_id", "position", "id")
+    )
+    payload["likes"]["upserted"] = _like_rows(MusicLike.objects.filter(user_id=user.id))
+    return payload
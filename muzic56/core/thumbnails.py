@@ -0,0 +1,185 @@
+"""
+ساخت تصاویر کوچک (WebP و JPEG در چند اندازه) برای کاور آهنگ، عکس پروفایل و
+کاور موزاییکی ۲×۲ پلی‌لیست. همه در صف کارها ساخته می‌شوند، نه در درخواست.
+
+نتیجه در یک JSONField به این شکل ذخیره می‌شود:
+{"source": ..., "webp": {"64": name, ...}, "jpeg": {"64": name, ...}}
+تصویری که باز نمی‌شود {"source": ..., "failed": true} می‌گیرد تا signal ها تا عوض شدن
+فایل دوباره کار نسازند؛ build_thumbnails آن را دوباره امتحان می‌کند.
+"""
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .jobs import enqueue, job
+from .models import Change, CustomUser, Music, Playlist, PlaylistSong
+from .sync import music_updated, record
+from .versions import bump, playlists_scope
+
+
+THUMBNAIL_SIZES = (64, 160, 320)
+THUMBNAIL_FORMATS = (
+    ("webp", "WEBP", {"quality": 80, "method": 4}),
+    ("jpeg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+)
+MOSAIC_TILES = 4
+
+
+def _open_rgb(name, size):
+    image = Image.open(default_storage.open(name))
+    # برای JPEG، decoder مستقیم با مقیاس کوچک‌تر decode می‌کند
+    image.draft("RGB", (size * 2, size * 2))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _save_variants(image, prefix, source):
+    """تصویر مربعی را در همه‌ی اندازه‌ها و فرمت‌ها ذخیره می‌کند؛ فایل‌های موجود دوباره ساخته نمی‌شوند."""
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+    thumbnails = {"source": source}
+    for key, image_format, options in THUMBNAIL_FORMATS:
+        thumbnails[key] = {}
+        for size in THUMBNAIL_SIZES:
+            name = f"thumbs/{prefix}/{digest}_{size}.{key}"
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS).save(
+                    buffer, image_format, **options
+                )
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            thumbnails[key][str(size)] = name
+    return thumbnails
+
+
+def _delete_variants(thumbnails, keep=None):
+    keep_names = set()
+    for key, _, _ in THUMBNAIL_FORMATS:
+        keep_names.update((keep or {}).get(key, {}).values())
+    for key, _, _ in THUMBNAIL_FORMATS:
+        for name in (thumbnails or {}).get(key, {}).values():
+            if name not in keep_names:
+                default_storage.delete(name)
+
+
+def delete_thumbnails(thumbnails):
+    """بعد از commit پاک می‌شوند تا اگر تراکنش برگشت، فایل‌ها سر جایشان باشند."""
+    if thumbnails:
+        transaction.on_commit(lambda: _delete_variants(thumbnails))
+
+
+def make_thumbnails(field_file, prefix, current):
+    """thumbnailهای یک ImageField؛ اگر منبع عوض نشده باشد همان current برمی‌گردد."""
+    if not field_file:
+        _delete_variants(current)
+        return {}
+    if current and current.get("source") == field_file.name and not current.get("failed"):
+        return current
+    try:
+        image = _open_rgb(field_file.name, max(THUMBNAIL_SIZES))
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        _delete_variants(current)
+        return {"source": field_file.name, "failed": True}
+    thumbnails = _save_variants(image, prefix, field_file.name)
+    _delete_variants(current, keep=thumbnails)
+    return thumbnails
+
+
+def mosaic_covers(playlist_id):
+    names = []
+    covers = (
+        PlaylistSong.objects.filter(playlist_id=playlist_id, song__cover_image__isnull=False)
+        .exclude(song__cover_image="")
+        .order_by("position", "id")
+        .values_list("song__cover_image", flat=True)
+    )
+    for name in covers.iterator():
+        if name not in names:
+            names.append(name)
+            if len(names) == MOSAIC_TILES:
+                break
+    return names
+
+
+def make_mosaic(playlist_id, current):
+    """
+    کاور پلی‌لیست: ۲×۲ از کاور چهار آهنگ اول، یا کاور اولین آهنگ اگر کمتر از چهار کاور باشد.
+    """
+    names = mosaic_covers(playlist_id)
+    if len(names) < MOSAIC_TILES:
+        names = names[:1]
+    if not names:
+        _delete_variants(current)
+        return {}
+    source = "|".join(names)
+    if current and current.get("source") == source:
+        return current
+
+    size = max(THUMBNAIL_SIZES)
+    try:
+        if len(names) == 1:
+            image = _open_rgb(names[0], size)
+        else:
+            half = size // 2
+            image = Image.new("RGB", (size, size))
+            for index, name in enumerate(names):
+                tile = ImageOps.fit(_open_rgb(name, half), (half, half), Image.Resampling.LANCZOS)
+                image.paste(tile, ((index % 2) * half, (index // 2) * half))
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return current or {}
+
+    thumbnails = _save_variants(image, f"playlists/{playlist_id}", source)
+    _delete_variants(current, keep=thumbnails)
+    return thumbnails
+
+
+@job("thumbnail_music_cover")
+def thumbnail_music_cover(music_id):
+    music = Music.objects.filter(id=music_id).only("cover_image", "cover_thumbnails").first()
+    if music is None:
+        return
+    thumbnails = make_thumbnails(music.cover_image, "covers", music.cover_thumbnails)
+    if thumbnails != music.cover_thumbnails:
+        Music.objects.filter(id=music_id).update(cover_thumbnails=thumbnails)
+        music_updated(music_id)
+        # کاور پلی‌لیست‌هایی که این آهنگ را دارند ممکن است عوض شود و آدرس کاور آهنگ
+        # در صفحه‌ی آن‌ها عوض شده است
+        playlist_ids = PlaylistSong.objects.filter(song_id=music_id).values("playlist_id")
+        playlists = Playlist.objects.filter(id__in=playlist_ids)
+        affected = list(playlists.values_list("id", "owner_id"))
+        bump(*[playlists_scope(owner_id) for _, owner_id in affected])
+        playlists.update(version=F("version") + 1)
+        for playlist_id, owner_id in affected:
+            record(Change.ENTITY_PLAYLIST, playlist_id, user_id=owner_id)
+            enqueue("build_playlist_mosaic", {"playlist_id": playlist_id}, unique=True)
+
+
+@job("thumbnail_profile_image")
+def thumbnail_profile_image(user_id):
+    user = CustomUser.objects.filter(id=user_id).only("profile_image", "profile_thumbnails").first()
+    if user is None:
+        return
+    thumbnails = make_thumbnails(user.profile_image, "profiles", user.profile_thumbnails)
+    if thumbnails != user.profile_thumbnails:
+        CustomUser.objects.filter(id=user_id).update(profile_thumbnails=thumbnails)
+
+
+@job("build_playlist_mosaic")
+def build_playlist_mosaic(playlist_id):
+    playlist = Playlist.objects.filter(id=playlist_id).only("mosaic", "owner_id").first()
+    if playlist is None:
+        return
+    mosaic = make_mosaic(playlist_id, playlist.mosaic)
+    if mosaic != playlist.mosaic:
+        Playlist.objects.filter(id=playlist_id).update(mosaic=mosaic)
+        bump(playlists_scope(playlist.owner_id))
+        record(Change.ENTITY_PLAYLIST, playlist_id, user_id=playlist.owner_id)
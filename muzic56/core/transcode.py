@@ -0,0 +1,155 @@
+"""
+ساخت نسخه‌های کم‌حجم‌تر (rendition) هر آهنگ با ffmpeg و انتخاب نسخه‌ی مناسب برای پخش.
+
+فایل‌ها کنار فایل اصلی با پسوند .<bitrate>k.mp3 ذخیره می‌شوند؛ آهنگ‌هایی که blob
+مشترک دارند فایل‌ها را هم مشترک استفاده می‌کنند و با حذف blob پاک می‌شوند.
+"""
+import logging
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .audio_meta import AudioParseError
+from .jobs import job
+from .models import Music, Rendition
+from .seek_index import write_frame_index
+
+
+logger = logging.getLogger(__name__)
+
+QUALITY_LEVELS = {"low": 64, "medium": 128, "high": 256}
+# از پهنای باند اعلام‌شده فقط این کسر برای صدا در نظر گرفته می‌شود
+BANDWIDTH_HEADROOM = 0.8
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def ffmpeg_binary():
+    return getattr(settings, "AUDIO_DECODER", None) or shutil.which("ffmpeg")
+
+
+def ladder():
+    return sorted(getattr(settings, "TRANSCODE_BITRATES", [64, 128, 256]))
+
+
+def rendition_name(audio_name, bitrate):
+    return f"{audio_name}.{bitrate}k.mp3"
+
+
+def needed_bitrates(music):
+    # نسخه‌ای با bitrate بیشتر یا برابر فایل اصلی فقط حجم را زیاد می‌کند
+    if music.bitrate is None:
+        return ladder()
+    return [bitrate for bitrate in ladder() if bitrate < music.bitrate]
+
+
+def transcode(source, destination, bitrate):
+    binary = ffmpeg_binary()
+    if not binary:
+        raise TranscodeError("ffmpeg is not installed")
+    temp = destination + ".tmp"
+    result = subprocess.run(
+        [
+            binary, "-nostdin", "-v", "error", "-y", "-i", source,
+            "-vn", "-map_metadata", "-1", "-codec:a", "libmp3lame",
+            "-b:a", f"{bitrate}k", "-f", "mp3", temp,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        if os.path.exists(temp):
+            os.remove(temp)
+        error = result.stderr.decode("utf-8", errors="replace").strip()
+        raise TranscodeError(error or f"ffmpeg exited with {result.returncode}")
+    os.replace(temp, destination)
+
+
+def _build(music, bitrate):
+    name = rendition_name(music.audio_file.name, bitrate)
+    path = Music.audio_file.field.storage.path(name)
+    if not os.path.exists(path):
+        transcode(music.audio_file.path, path, bitrate)
+    try:
+        write_frame_index(path)
+    except AudioParseError:
+        pass
+    return bitrate, name, os.path.getsize(path)
+
+
+@job("transcode_music", timeout=30 * 60)
+def transcode_music(music_id):
+    music = Music.objects.filter(id=music_id).first()
+    if music is None:
+        return
+    if not ffmpeg_binary():
+        logger.warning("ffmpeg is not installed; skipping renditions of music %s", music_id)
+        return
+
+    existing = set(music.renditions.values_list("bitrate", flat=True))
+    bitrates = [bitrate for bitrate in needed_bitrates(music) if bitrate not in existing]
+    if not bitrates:
+        return
+    # هر ffmpeg یک پروسس جداست؛ چند نسخه همزمان ساخته می‌شوند
+    concurrency = getattr(settings, "TRANSCODE_CONCURRENCY", 2)
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        built = list(pool.map(lambda bitrate: _build(music, bitrate), bitrates))
+
+    Rendition.objects.bulk_create(
+        [
+            Rendition(music=music, bitrate=bitrate, name=name, size=size)
+            for bitrate, name, size in built
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def parse_bandwidth(request):
+    """
+    پهنای باند کلاینت به kbps: از ?bandwidth=<kbps> یا هدر Client Hint به نام Downlink (Mbps).
+    """
+    value = request.GET.get("bandwidth")
+    scale = 1
+    if value is None:
+        value = request.META.get("HTTP_DOWNLINK")
+        scale = 1000
+    try:
+        bandwidth = float(value) * scale
+    except (TypeError, ValueError):
+        return None
+    return bandwidth if bandwidth > 0 else None
+
+
+def choose_rendition(renditions, source_bitrate=None, quality=None, bandwidth=None, save_data=False):
+    """
+    renditions: لیست (bitrate, name) به ترتیب صعودی. None یعنی فایل اصلی.
+    quality یکی از low/medium/high/original یا عدد kbps است؛ بعد از آن Save-Data و پهنای باند.
+    """
+    if quality == "original" or not renditions:
+        return None
+    if quality is not None:
+        target = QUALITY_LEVELS.get(quality)
+        if target is None:
+            try:
+                target = int(quality)
+            except ValueError:
+                return None
+    elif save_data:
+        return renditions[0]
+    elif bandwidth is not None:
+        target = bandwidth * BANDWIDTH_HEADROOM
+    else:
+        return None
+
+    if source_bitrate is not None and target >= source_bitrate:
+        return None
+    fitting = [rendition for rendition in renditions if rendition[0] <= target]
+    if fitting:
+        return fitting[-1]
+    # حتی کم‌حجم‌ترین نسخه از هدف بیشتر است؛ بهتر از فایل اصلی است
+    return renditions[0]
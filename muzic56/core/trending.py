@@ -0,0 +1,176 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ChartEntry, Music, MusicLike, PlayEvent, TrendingScore, TrendingState
+
+
+CHART_SIZE = 100
+# امتیازهایی که تا این حد کم‌رنگ شده‌اند (یا از بازه بیرون رفته‌اند) پاک می‌شوند
+MIN_SCORE = 1e-6
+
+# برای هر بازه: (چقدر به عقب نگاه کنیم، نیمه‌عمر امتیاز هر رویداد)؛
+# چارت همیشگی بازه ندارد و پخش‌ها در آن با نیمه‌عمر طولانی کم‌رنگ می‌شوند
+DECAY_WINDOWS = {
+    ChartEntry.WINDOW_DAILY: (timedelta(days=1), timedelta(hours=6)),
+    ChartEntry.WINDOW_WEEKLY: (timedelta(days=7), timedelta(days=2)),
+    ChartEntry.WINDOW_ALL_TIME: (None, timedelta(days=30)),
+}
+
+
+def event_sources(window):
+    """رویدادهایی که در امتیاز ترند حساب می‌شوند: (مدل، فیلد زمان، وزن)."""
+    # هر پخش سیگنال ضعیف‌تری از لایک است
+    sources = [(PlayEvent, "played_at", 0.2)]
+    if window != ChartEntry.WINDOW_ALL_TIME:
+        # در چارت همیشگی لایک‌ها با like_count و بدون کاهش حساب می‌شوند
+        sources.insert(0, (MusicLike, "liked_at", 1.0))
+    return sources
+
+
+def _add_events(scores, events, now, decay, sign=1):
+    for music_id, at in events.iterator(chunk_size=5000):
+        scores[music_id] += sign * math.exp(-decay * (now - at).total_seconds())
+
+
+def _rebuild_scores(window, now, decay, start):
+    """همه‌ی رویدادهای بازه را از نو می‌خواند؛ برای بار اول و refresh_charts --rebuild."""
+    scores = defaultdict(float)
+    cursors = {}
+    for model, time_field, weight in event_sources(window):
+        last_id = model.objects.aggregate(last=Max("id"))["last"] or 0
+        cursors[model._meta.label_lower] = last_id
+        events = model.objects.filter(id__lte=last_id)
+        if start is not None:
+            events = events.filter(**{f"{time_field}__gte": start})
+        weighted = defaultdict(float)
+        _add_events(weighted, events.values_list("music_id", time_field), now, decay)
+        for music_id, score in weighted.items():
+            scores[music_id] += weight * score
+
+    TrendingScore.objects.filter(window=window).delete()
+    TrendingScore.objects.bulk_create(
+        [
+            TrendingScore(window=window, music_id=music_id, score=score)
+            for music_id, score in scores.items()
+            if score > MIN_SCORE
+        ],
+        batch_size=1000,
+    )
+    return cursors
+
+
+def _apply_new_events(window, state, now, decay, span):
+    """
+    امتیازهای ذخیره‌شده تا now کم‌رنگ می‌شوند، رویدادهای بعد از cursor اضافه و رویدادهایی
+    که از ابتدای بازه بیرون رفته‌اند کم می‌شوند؛ فقط همین دو برش از جدول رویدادها خوانده می‌شود.
+    رویداد تازه با id دنبال می‌شود تا رویدادی که دیر نوشته شده (بافر پخش) جا نماند.
+    """
+    elapsed = (now - state.computed_at).total_seconds()
+    TrendingScore.objects.filter(window=window).update(score=F("score") * math.exp(-decay * elapsed))
+
+    deltas = defaultdict(float)
+    cursors = {}
+    start = previous_start = None
+    if span is not None:
+        start, previous_start = now - span, state.computed_at - span
+    for model, time_field, weight in event_sources(window):
+        label = model._meta.label_lower
+        seen_id = state.cursors.get(label, 0)
+        last_id = model.objects.aggregate(last=Max("id"))["last"] or 0
+        cursors[label] = max(seen_id, last_id)
+
+        weighted = defaultdict(float)
+        new = model.objects.filter(id__gt=seen_id, id__lte=last_id)
+        if start is not None:
+            new = new.filter(**{f"{time_field}__gte": start})
+        _add_events(weighted, new.values_list("music_id", time_field), now, decay)
+        if start is not None:
+            expired = model.objects.filter(
+                id__lte=seen_id,
+                **{f"{time_field}__gte": previous_start, f"{time_field}__lt": start},
+            )
+            _add_events(weighted, expired.values_list("music_id", time_field), now, decay, sign=-1)
+        for music_id, score in weighted.items():
+            deltas[music_id] += weight * score
+
+    if deltas:
+        rows = {
+            row.music_id: row
+            for row in TrendingScore.objects.filter(window=window, music_id__in=deltas)
+        }
+        for music_id, delta in deltas.items():
+            if music_id in rows:
+                rows[music_id].score += delta
+        TrendingScore.objects.bulk_update(rows.values(), ["score"], batch_size=1000)
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(window=window, music_id=music_id, score=delta)
+                for music_id, delta in deltas.items()
+                if music_id not in rows and delta > MIN_SCORE
+            ],
+            batch_size=1000,
+        )
+    # لایکی که بعداً برداشته شده در امتیاز می‌ماند تا کم‌رنگ شود؛ --rebuild آن را هم پاک می‌کند
+    TrendingScore.objects.filter(window=window, score__lte=MIN_SCORE).delete()
+    return cursors
+
+
+def update_scores(window, now, rebuild=False):
+    """TrendingScore های یک بازه را به لحظه‌ی now می‌رساند. باید داخل تراکنش صدا زده شود."""
+    span, half_life = DECAY_WINDOWS[window]
+    decay = math.log(2) / half_life.total_seconds()
+    state = TrendingState.objects.filter(window=window).first()
+    if rebuild or state is None or state.computed_at > now:
+        cursors = _rebuild_scores(window, now, decay, None if span is None else now - span)
+    else:
+        cursors = _apply_new_events(window, state, now, decay, span)
+    TrendingState.objects.update_or_create(
+        window=window, defaults={"computed_at": now, "cursors": cursors}
+    )
+
+
+def compute_chart(window, now, rebuild=False):
+    update_scores(window, now, rebuild)
+    if window == ChartEntry.WINDOW_ALL_TIME:
+        plays = TrendingScore.objects.filter(window=window, music_id=OuterRef("pk")).values("score")
+        return list(
+            Music.objects.annotate(score=F("like_count") + Coalesce(Subquery(plays), 0.0))
+            .order_by("-score", "-id")
+            .values_list("id", "score")[:CHART_SIZE]
+        )
+    return list(
+        TrendingScore.objects.filter(window=window)
+        .order_by("-score", "-music_id")
+        .values_list("music_id", "score")[:CHART_SIZE]
+    )
+
+
+def refresh_chart(window, now=None, rebuild=False):
+    """امتیازهای یک بازه را به‌روز و چارت آن را در یک تراکنش جایگزین ردیف‌های قبلی می‌کند."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        top = compute_chart(window, now, rebuild)
+
+        # آهنگ‌هایی که در این فاصله حذف شده‌اند کنار گذاشته می‌شوند
+        existing = set(
+            Music.objects.filter(id__in=[music_id for music_id, _ in top]).values_list(
+                "id", flat=True
+            )
+        )
+        entries = [
+            ChartEntry(window=window, music_id=music_id, score=score, computed_at=now)
+            for music_id, score in top
+            if music_id in existing
+        ]
+        for rank, entry in enumerate(entries, start=1):
+            entry.rank = rank
+
+        ChartEntry.objects.filter(window=window).delete()
+        ChartEntry.objects.bulk_create(entries)
+    return len(entries)
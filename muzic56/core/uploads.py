@@ -0,0 +1,155 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .audio_meta import read_tags
+from .blobs import file_sha256, restore_source, store_blob
+from .processing import enqueue_processing
+
+from .models import Music, UploadSession
+
+
+ALLOWED_AUDIO_FORMATS = ["audio/mpeg", "audio/wav", "audio/mp3", "audio/x-m4a"]
+
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # اندازه‌ی پیشنهادی هر تکه برای کلاینت
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def max_upload_size():
+    return getattr(settings, "MAX_UPLOAD_SIZE", 200 * 1024 * 1024)
+
+
+def part_path(session):
+    return os.path.join(settings.MEDIA_ROOT, "uploads", f"{session.id}.part")
+
+
+def fill_from_tags(path, filename, title, artist):
+    """عنوان و خواننده‌ای که فرم خالی گذاشته از تگ‌های فایل (یا نام فایل) پر می‌شود."""
+    if title and artist:
+        return title, artist
+    tags = read_tags(path)
+    title = title or tags.get("title") or os.path.splitext(os.path.basename(filename))[0]
+    return title[:255], (artist or tags.get("artist", ""))[:255]
+
+
+def create_session(user, filename, content_type, size, title="", artist=""):
+    if content_type not in ALLOWED_AUDIO_FORMATS:
+        raise UploadError("Invalid audio format")
+    if size <= 0 or size > max_upload_size():
+        raise UploadError("Invalid file size")
+
+    ttl = getattr(settings, "UPLOAD_SESSION_TTL", 24 * 60 * 60)
+    session = UploadSession.objects.create(
+        user=user,
+        filename=os.path.basename(filename)[:255] or "audio",
+        content_type=content_type,
+        size=size,
+        title=title,
+        artist=artist,
+        expires_at=timezone.now() + timedelta(seconds=ttl),
+    )
+    path = part_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    return session
+
+
+def check_not_expired(session):
+    if session.expires_at < timezone.now():
+        raise UploadError("Upload expired", status_code=410)
+
+
+def append_chunk(session, stream, offset, length):
+    """
+    تکه را بدون نگه داشتن کامل در حافظه از stream درخواست در فایل موقت می‌نویسد.
+    offset باید با مقدار دریافت‌شده‌ی فعلی برابر باشد تا تکه‌ها جابه‌جا نوشته نشوند.
+    """
+    check_not_expired(session)
+    with transaction.atomic():
+        # ردیف تا آخر نوشتن قفل می‌ماند تا دو درخواست با یک offset روی فایل هم ننویسند
+        session.received = (
+            UploadSession.objects.select_for_update()
+            .values_list("received", flat=True)
+            .get(id=session.id)
+        )
+        if offset != session.received:
+            raise UploadError("Offset mismatch", status_code=409)
+        if length <= 0 or length > MAX_CHUNK_SIZE or offset + length > session.size:
+            raise UploadError("Invalid chunk length")
+
+        written = 0
+        with open(part_path(session), "r+b") as f:
+            f.seek(offset)
+            while written < length:
+                block = stream.read(min(READ_BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+            # اگر اتصال وسط تکه قطع شود، فقط بایت‌های رسیده حساب می‌شوند
+            f.truncate(offset + written)
+
+        updated = UploadSession.objects.filter(id=session.id, received=offset).update(
+            received=offset + written
+        )
+        if not updated:
+            session.refresh_from_db(fields=["received"])
+            raise UploadError("Offset mismatch", status_code=409)
+    session.received = offset + written
+    return session.received
+
+
+def finalize_session(session, sha256, cover_image=None):
+    """بعد از بررسی اندازه و checksum، فایل را در انبار blobها ذخیره و Music را می‌سازد."""
+    check_not_expired(session)
+    if session.received != session.size:
+        raise UploadError("Upload is incomplete", status_code=409)
+
+    path = part_path(session)
+    digest = file_sha256(path)
+    if not sha256 or digest != sha256.lower():
+        raise UploadError("Checksum mismatch", status_code=422)
+
+    title, artist = fill_from_tags(path, session.filename, session.title, session.artist)
+    try:
+        with transaction.atomic():
+            blob = store_blob(path, digest, session.filename)
+            music = Music.objects.create(
+                title=title,
+                artist=artist,
+                audio_file=blob.name,
+                blob=blob,
+                cover_image=cover_image,
+                uploaded_by=session.user,
+            )
+            enqueue_processing(music)
+            session.delete()
+    except Exception:
+        # فایل .part سر جایش برمی‌گردد تا کلاینت بتواند دوباره finalize کند
+        restore_source(path, digest, session.filename)
+        raise
+    return music
+
+
+def cleanup_expired_sessions(now=None):
+    now = now or timezone.now()
+    expired = UploadSession.objects.filter(expires_at__lt=now)
+    count = 0
+    for session in expired.iterator():
+        try:
+            os.remove(part_path(session))
+        except FileNotFoundError:
+            pass
+        session.delete()
+        count += 1
+    return count
@@ -3,11 +3,12 @@ from django.urls import path
 from . import views
 from .views import (
     RegisterView, LoginView, UserProfileView, MusicUploadView, MusicListView, 
-    LogoutView, LikeMusicView, LikedMusicView, PlaylistListView, CreatePlaylistView,
+    LogoutView, LikeMusicView, MusicPlayedView, MusicPlayedBatchView, LikedMusicView, PlaylistListView, CreatePlaylistView,
     AddToPlaylistView, GetUserPlaylistsView, CreatePlaylistPageView, 
-    CreatePlaylistFinalView, PlaylistDetailView, DeletePlaylistView, RemoveSongFromPlaylistView,
-    PublicPlaylistsView,
-    PopularMusicView, SearchMusicView, DeleteAccountView, DeleteMusicView,
+    CreatePlaylistFinalView, PlaylistDetailView, DeletePlaylistView, RemoveSongFromPlaylistView, EditPlaylistSongsView,
+    PublicPlaylistsView, PublicPlaylistSearchView,
+    PopularMusicView, SearchMusicView, SuggestMusicView, DeleteAccountView, DeleteMusicView,
+    SyncView,
 )
 
 urlpatterns = [
@@ -19,7 +20,15 @@ urlpatterns = [
     
     
     path('music/upload/', MusicUploadView.as_view(), name='music-upload'),
+    path('music/uploads/', views.ResumableUploadView.as_view(), name='resumable-upload'),
+    path('music/uploads/<uuid:upload_id>/', views.ResumableUploadChunkView.as_view(), name='resumable-upload-chunk'),
+    path('music/uploads/<uuid:upload_id>/finalize/', views.ResumableUploadFinalizeView.as_view(), name='resumable-upload-finalize'),
     path('music/list/', MusicListView.as_view(), name='music-list'),
+    path('media/<path:name>', views.serve_media, name='serve-media'),
+    path('music/<int:music_id>/stream/', views.stream_music, name='music-stream'),
+    path('music/<int:music_id>/waveform/', views.music_waveform, name='music-waveform'),
+    path('music/<int:music_id>/played/', MusicPlayedView.as_view(), name='music-played'),
+    path('music/played/', MusicPlayedBatchView.as_view(), name='music-played-batch'),
     path('music/<int:music_id>/like/', LikeMusicView.as_view(), name='like-music'),
     path('music/liked/', LikedMusicView.as_view(), name='liked-music'),
     path('music/<int:music_id>/delete/', DeleteMusicView.as_view(), name='delete-music'),
@@ -27,6 +36,7 @@ urlpatterns = [
     
     path('music/popular/', PopularMusicView.as_view(), name='popular-music'),
     path('music/search/', SearchMusicView.as_view(), name='search-music'),
+    path('music/suggest/', SuggestMusicView.as_view(), name='suggest-music'),
     
     
     path('playlists/', PlaylistListView.as_view(), name='playlist-list'),
@@ -35,10 +45,10 @@ urlpatterns = [
     path('playlists/user-playlists/', GetUserPlaylistsView.as_view(), name='user-playlists'),
     path('playlists/create-page/', CreatePlaylistPageView.as_view(), name='create-playlist-page'),
     path('playlists/create-final/', CreatePlaylistFinalView.as_view(), name='create-playlist-final'),
-    path('playlists/<playlist_id>/', PlaylistDetailView.as_view(), name='playlist-detail'),
     
     
     path('playlists/public/', PublicPlaylistsView.as_view(), name='public_playlists'),
+    path('playlists/public/search/', PublicPlaylistSearchView.as_view(), name='public-playlist-search'),
     path('playlists/public/<int:playlist_id>/', views.public_playlist_detail_simple, name='public_playlist_detail'),
     path('playlists/public/<int:playlist_id>/detail/', views.public_playlist_detail, name='public-playlist-detail'),
     path('playlists/<int:playlist_id>/toggle-public/', views.toggle_playlist_public, name='toggle_playlist_public'),
@@ -46,12 +56,19 @@ urlpatterns = [
     
     path('playlists/<int:playlist_id>/delete/', DeletePlaylistView.as_view(), name='delete-playlist'),
     path('playlists/<int:playlist_id>/remove-song/', RemoveSongFromPlaylistView.as_view(), name='remove-song-from-playlist'),
+    path('playlists/<int:playlist_id>/songs/', EditPlaylistSongsView.as_view(), name='edit-playlist-songs'),
     
     
     path('playlists/test-public/', views.test_public_playlists, name='test_public_playlists'),
+    # بعد از مسیرهای ثابت بالا، وگرنه playlists/public/ هم به عنوان playlist_id گرفته می‌شود
+    path('playlists/<playlist_id>/', PlaylistDetailView.as_view(), name='playlist-detail'),
     
     
     path('account/delete/', DeleteAccountView.as_view(), name='delete-account'),
+    
+    
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('events/', views.event_stream, name='event-stream'),
 ]
     
 
@@ -0,0 +1,152 @@
+"""
+شمارنده‌ی نسخه برای هر دامنه از داده‌ها و پاسخ شرطی (ETag / 304) بر اساس آن‌ها.
+
+هر نوشتنی که روی خروجی یک endpoint اثر دارد، در همان تراکنش شمارنده‌ی دامنه‌اش را
+زیاد می‌کند (signals.py و جاهایی که با queryset.update می‌نویسند). endpoint قبل از
+کوئری اصلی فقط شمارنده‌ها را می‌خواند؛ اگر با If-None-Match کلاینت یکی باشد 304
+برمی‌گردد و کوئری اصلی اصلاً اجرا نمی‌شود.
+
+نسخه‌ی هر پلی‌لیست جداگانه در Playlist.version نگه داشته می‌شود. like_count و play_count
+آهنگ‌ها با هر لایک و پخش عوض می‌شوند؛ به جای زیاد کردن شمارنده‌ی کل کاتالوگ، همین ستون‌ها
+از ردیف‌های همان صفحه در ETag می‌آیند (COUNTER_FIELDS).
+"""
+import hashlib
+
+from django.db.models import F
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .media_urls import get_media_urls
+from .models import ResourceVersion
+
+
+# همه‌ی آهنگ‌ها و فیلدهای نمایشی‌شان، به جز شمارنده‌های COUNTER_FIELDS
+CATALOG = "catalog"
+COUNTER_FIELDS = ("id", "like_count", "play_count")
+
+
+def likes_scope(user_id):
+    return f"likes:{user_id}"
+
+
+def playlists_scope(user_id):
+    return f"playlists:{user_id}"
+
+
+def bump(*scopes):
+    """شمارنده‌ها را یکی زیاد می‌کند؛ داخل تراکنشی که داده را تغییر داده صدا زده شود."""
+    scopes = set(scopes)
+    if not scopes:
+        return
+    updated = ResourceVersion.objects.filter(scope__in=scopes).update(version=F("version") + 1)
+    if updated < len(scopes):
+        existing = set(
+            ResourceVersion.objects.filter(scope__in=scopes).values_list("scope", flat=True)
+        )
+        ResourceVersion.objects.bulk_create(
+            [ResourceVersion(scope=scope) for scope in scopes - existing],
+            ignore_conflicts=True,
+        )
+
+
+def current_versions(scopes):
+    """{scope: version} با یک کوئری؛ دامنه‌ای که هنوز نوشته نشده نسخه‌ی ۰ دارد."""
+    versions = dict(
+        ResourceVersion.objects.filter(scope__in=scopes).values_list("scope", "version")
+    )
+    return {scope: versions.get(scope, 0) for scope in scopes}
+
+
+async def acurrent_versions(scopes):
+    versions = {
+        scope: version
+        async for scope, version in ResourceVersion.objects.filter(scope__in=scopes).values_list(
+            "scope", "version"
+        )
+    }
+    return {scope: versions.get(scope, 0) for scope in scopes}
+
+
+def counter_rows(songs):
+    return [tuple(getattr(song, field) for field in COUNTER_FIELDS) for song in songs]
+
+
+def page_counters(page, page_size):
+    """شمارنده‌های آهنگ‌های یک صفحه (خروجی page_queryset) بدون خواندن بقیه‌ی ستون‌ها."""
+    return list(page.values_list(*COUNTER_FIELDS))[:page_size]
+
+
+async def apage_counters(page, page_size):
+    return [row async for row in page.values_list(*COUNTER_FIELDS)][:page_size]
+
+
+def compute_etag(request, scopes, counters=None):
+    return etag_for_versions(request, current_versions(scopes), counters)
+
+
+def etag_for_versions(request, versions, counters=None):
+    parts = [f"{scope}={versions[scope]}" for scope in sorted(versions)]
+    parts.append(f"user={request.user.id if request.user.is_authenticated else 0}")
+    if counters is not None:
+        parts.append("counters=" + ",".join(":".join(map(str, row)) for row in counters))
+    media_urls = get_media_urls(request)
+    if media_urls.signed:
+        # آدرس‌های امضاشده با پنجره‌ی انقضا عوض می‌شوند
+        parts.append(f"expires={media_urls.expires}")
+    digest = hashlib.sha1("|".join(parts).encode()).hexdigest()[:24]
+    return f'"{digest}"'
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        super().__init__("Not modified")
+        self.response = response
+
+
+class VersionedResponseMixin:
+    """
+    برای APIView: GET/HEAD بر اساس شمارنده‌های get_version_scopes() پاسخ شرطی می‌گیرد.
+    بررسی بعد از احراز هویت و قبل از اجرای متد get انجام می‌شود.
+    """
+    version_scopes = ()
+
+    def get_version_scopes(self, request, *args, **kwargs):
+        return list(self.version_scopes)
+
+    def get_version_counters(self, request, *args, **kwargs):
+        """برای لیست آهنگ‌ها: ردیف‌های COUNTER_FIELDS صفحه‌ی درخواستی (page_counters)."""
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = None
+        if request.method not in ("GET", "HEAD"):
+            return
+        self.etag = compute_etag(
+            request,
+            self.get_version_scopes(request, *args, **kwargs),
+            self.get_version_counters(request, *args, **kwargs),
+        )
+        response = get_conditional_response(request, etag=self.etag)
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, "etag", None)
+        if etag:
+            set_version_headers(response, etag)
+        return response
+
+
+def set_version_headers(response, etag):
+    if response.status_code == 200 or isinstance(response, HttpResponseNotModified):
+        response["ETag"] = etag
+        # پاسخ مخصوص همین کاربر است و هر بار باید با If-None-Match پرسیده شود
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization"])
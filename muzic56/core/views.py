@@ -1,27 +1,99 @@
+import asyncio
+import logging
+import math
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth.models import AnonymousUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status
-from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views import View
+from django.views.decorators.http import require_http_methods
 from rest_framework.decorators import (
     api_view,
     authentication_classes,
     permission_classes,
 )
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from django.db.models import Max
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from django.db.models import F, Max
 from rest_framework.permissions import AllowAny
-from .models import Music, Playlist, PlaylistSong
+from .models import ChartEntry, Music, Playlist, PlaylistSong, UploadSession
+from .pagination import InvalidCursor, KeysetPaginator
+from .processing import enqueue_processing
+from .plays import MAX_BATCH_PLAYS, record_plays
+from .blobs import HashingFileUploadHandler, peaks_path, store_blob
+from .events import hub, music_channel, sse_stream, user_channel
+from .media_urls import get_media_urls, stream_signature_name, verify_media_signature
+from .search import asearch_music, asearch_public_playlists, get_search_page
+from .sync import SyncCursorExpired, build_delta, build_snapshot, changes_since, latest_cursor
+from . import suggest
+from .playlists import PlaylistEditError, edit_playlist, valid_song_id
+from .versions import (
+    CATALOG,
+    VersionedResponseMixin,
+    acurrent_versions,
+    apage_counters,
+    counter_rows,
+    etag_for_versions,
+    likes_scope,
+    page_counters,
+    playlists_scope,
+    set_version_headers,
+)
+from .transcode import choose_rendition, parse_bandwidth
+from .trending import CHART_SIZE
 from .serializers import MusicSerializer, PlaylistSerializer
+from .streaming import ranged_file_response, serve_media_file
+from .uploads import (
+    ALLOWED_AUDIO_FORMATS,
+    UPLOAD_CHUNK_SIZE,
+    UploadError,
+    append_chunk,
+    create_session,
+    fill_from_tags,
+    finalize_session,
+)
+
 
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
 
+def json_response(data, status=200):
+    # همان encoder که Response در DRF دارد تا خروجی view های async با بقیه یکی باشد
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+async def jwt_user(request):
+    """
+    احراز هویت JWT برای view های async (که از APIView نیستند). بدون هدر AnonymousUser و
+    با توکن نامعتبر None برمی‌گرداند. خواندن کاربر از دیتابیس در thread انجام می‌شود.
+    """
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else AnonymousUser()
+
+
+def unauthorized():
+    return json_response({"error": "Authentication credentials were not provided or are invalid"}, status=401)
+
+
 
 class RegisterView(APIView):
     def post(self, request):
@@ -101,12 +173,15 @@ class UserProfileView(APIView):
     def get(self, request):
         try:
             user = request.user
-            profile_image_url = None
-            if user.profile_image:
-                profile_image_url = request.build_absolute_uri(user.profile_image.url)
-
+            media_urls = get_media_urls(request)
             return Response(
-                {"username": user.username, "profile_image": profile_image_url}
+                {
+                    "username": user.username,
+                    "profile_image": media_urls.thumbnail_url(
+                        user.profile_thumbnails, user.profile_image
+                    ),
+                    "profile_image_srcset": media_urls.srcset(user.profile_thumbnails),
+                }
             )
         except Exception as e:
             return Response(
@@ -119,6 +194,11 @@ class MusicUploadView(APIView):
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
 
+    def initialize_request(self, request, *args, **kwargs):
+        # sha256 فایل همزمان با دریافت آن حساب می‌شود
+        request.upload_handlers = [HashingFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     def post(self, request):
         try:
             title = request.data.get("title")
@@ -126,27 +206,39 @@ class MusicUploadView(APIView):
             audio_file = request.FILES.get("audio_file")
             cover_image = request.FILES.get("cover_image")
 
-            if not title or not audio_file:
+            if not audio_file:
                 return Response(
-                    {"error": "Title and audio file are required"},
+                    {"error": "Audio file is required"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            allowed_formats = ["audio/mpeg", "audio/wav", "audio/mp3", "audio/x-m4a"]
-            if audio_file.content_type not in allowed_formats:
+            if audio_file.content_type not in ALLOWED_AUDIO_FORMATS:
                 return Response(
                     {"error": "Invalid audio format"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            music = Music.objects.create(
-                title=title,
-                artist=artist,
-                audio_file=audio_file,
-                cover_image=cover_image,
-                uploaded_by=request.user,
+            # اگر عنوان یا خواننده وارد نشده باشد از تگ‌های فایل خوانده می‌شود
+            title, artist = fill_from_tags(
+                audio_file.temporary_file_path(), audio_file.name, title, artist
             )
 
+            with transaction.atomic():
+                blob = store_blob(
+                    audio_file.temporary_file_path(), audio_file.sha256, audio_file.name
+                )
+                music = Music.objects.create(
+                    title=title,
+                    artist=artist,
+                    audio_file=blob.name,
+                    blob=blob,
+                    cover_image=cover_image,
+                    uploaded_by=request.user,
+                )
+                # پردازش‌های سنگین در runworker انجام می‌شوند، نه در این درخواست
+                enqueue_processing(music)
+
+            media_urls = get_media_urls(request)
             return Response(
                 {
                     "message": "Music uploaded successfully",
@@ -154,12 +246,9 @@ class MusicUploadView(APIView):
                         "id": music.id,
                         "title": music.title,
                         "artist": music.artist,
-                        "audio_url": request.build_absolute_uri(music.audio_file.url),
-                        "cover_url": (
-                            request.build_absolute_uri(music.cover_image.url)
-                            if music.cover_image
-                            else None
-                        ),
+                        "audio_url": media_urls.audio_url(music),
+                        "cover_url": media_urls.cover_url(music),
+                        "processing_status": music.processing_status,
                     },
                 }
             )
@@ -169,22 +258,310 @@ class MusicUploadView(APIView):
             )
 
 
-class MusicListView(APIView):
-    authentication_classes = []
-    permission_classes = [AllowAny]
+def upload_session_data(session):
+    return {
+        "upload_id": str(session.id),
+        "offset": session.received,
+        "size": session.size,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+        "expires_at": session.expires_at,
+    }
 
-    def get(self, request):
+
+class ResumableUploadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """شروع آپلود چندتکه: {filename, content_type, size, title, artist}"""
+        try:
+            try:
+                size = int(request.data.get("size"))
+            except (TypeError, ValueError):
+                size = 0
+
+            session = create_session(
+                user=request.user,
+                filename=request.data.get("filename", ""),
+                content_type=request.data.get("content_type", ""),
+                size=size,
+                title=request.data.get("title", ""),
+                artist=request.data.get("artist", ""),
+            )
+            return Response(upload_session_data(session), status=status.HTTP_201_CREATED)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class ResumableUploadChunkView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id):
+        """وضعیت آپلود؛ کلاینت از offset برای ادامه استفاده می‌کند"""
+        try:
+            session = UploadSession.objects.get(id=upload_id, user=request.user)
+            return Response(upload_session_data(session))
+        except UploadSession.DoesNotExist:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    def patch(self, request, upload_id):
+        """یک تکه؛ بدنه بایت‌های خام و هدر Upload-Offset محل شروع آن است"""
+        try:
+            session = UploadSession.objects.get(id=upload_id, user=request.user)
+            try:
+                offset = int(request.headers.get("Upload-Offset", ""))
+                length = int(request.headers.get("Content-Length", ""))
+            except ValueError:
+                return Response(
+                    {"error": "Upload-Offset and Content-Length headers are required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            # request.data خوانده نمی‌شود تا بدنه مستقیم از stream روی دیسک برود
+            append_chunk(session, request.stream, offset, length)
+            return Response(upload_session_data(session))
+        except UploadSession.DoesNotExist:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        except UploadError as e:
+            return Response(
+                {"error": str(e), "offset": session.received}, status=e.status_code
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class ResumableUploadFinalizeView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+
+    def post(self, request, upload_id):
+        """پایان آپلود: بررسی sha256 و ساختن Music (cover_image اختیاری)"""
+        try:
+            session = UploadSession.objects.get(id=upload_id, user=request.user)
+            music = finalize_session(
+                session,
+                request.data.get("sha256", ""),
+                cover_image=request.FILES.get("cover_image"),
+            )
+
+            media_urls = get_media_urls(request)
+            return Response(
+                {
+                    "message": "Music uploaded successfully",
+                    "music": {
+                        "id": music.id,
+                        "title": music.title,
+                        "artist": music.artist,
+                        "audio_url": media_urls.audio_url(music),
+                        "cover_url": media_urls.cover_url(music),
+                        "processing_status": music.processing_status,
+                    },
+                },
+                status=status.HTTP_201_CREATED,
+            )
+        except UploadSession.DoesNotExist:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+MAX_FILTER_IDS = 200
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def filter_music_list(request, queryset):
+    """
+    فیلترهای لیست آهنگ‌ها که صفحه‌بندی را هم نگه می‌دارند:
+    ?uploaded_by=<username> (آپلودهای یک کاربر) و ?ids=1,2,3 (چند آهنگ مشخص).
+    """
+    uploaded_by = request.GET.get("uploaded_by")
+    if uploaded_by:
+        queryset = queryset.filter(uploaded_by__username=uploaded_by)
+    ids = request.GET.get("ids")
+    if ids:
+        try:
+            ids = {int(value) for value in ids.split(",") if value}
+        except ValueError:
+            raise InvalidFilter("ids must be a comma-separated list of numbers")
+        if len(ids) > MAX_FILTER_IDS:
+            raise InvalidFilter(f"At most {MAX_FILTER_IDS} ids")
+        queryset = queryset.filter(id__in=ids)
+    return queryset
+
+
+class MusicListView(View):
+    """
+    view async: زیر ASGI در زمان I/O دیتابیس threadی نگه نمی‌دارد. اگر کلاینت
+    If-None-Match دارد اول فقط شمارنده‌ی کاتالوگ و like_count/play_count آهنگ‌های صفحه
+    خوانده می‌شوند تا 304 بدون کوئری کامل صفحه برگردد؛ وگرنه شمارنده و صفحه همزمان.
+    """
+    http_method_names = ["get", "head"]
+
+    async def get(self, request):
+        request.user = AnonymousUser()
+        paginator = KeysetPaginator(request, "uploaded_at")
         try:
-            music_list = Music.objects.all().order_by("-uploaded_at")
+            page = paginator.page_queryset(
+                filter_music_list(request, Music.objects.select_related("uploaded_by"))
+            )
+            if request.headers.get("If-None-Match"):
+                versions, counters = await asyncio.gather(
+                    acurrent_versions([CATALOG]),
+                    apage_counters(page, paginator.get_page_size()),
+                )
+                etag = etag_for_versions(request, versions, counters)
+                not_modified = get_conditional_response(request, etag=etag)
+                if not_modified is not None:
+                    set_version_headers(not_modified, etag)
+                    return not_modified
+                music_list = await paginator.afetch(page)
+            else:
+                versions, music_list = await asyncio.gather(
+                    acurrent_versions([CATALOG]), paginator.afetch(page)
+                )
+                etag = etag_for_versions(request, versions, counter_rows(music_list))
             serializer = MusicSerializer(
                 music_list, many=True, context={"request": request}
             )
-            return Response(serializer.data)
+            response = json_response(paginator.get_response_data(serializer.data))
+            set_version_headers(response, etag)
+            return response
+        except (InvalidCursor, InvalidFilter) as e:
+            return json_response({"error": str(e)}, status=400)
         except Exception as e:
+            return json_response({"error": str(e)}, status=500)
+
+
+@require_http_methods(["GET", "HEAD"])
+def stream_music(request, music_id):
+    """
+    پخش فایل صوتی با پشتیبانی از Range تا پلیر بتواند بدون دانلود دوباره جابه‌جا شود.
+    ?t=<ثانیه> پخش را از مرز فریم همان زمان شروع می‌کند. با MEDIA_SIGNED_URLS آدرس
+    باید امضای audio_url را داشته باشد.
+    """
+    if getattr(settings, "MEDIA_SIGNED_URLS", False) and not verify_media_signature(
+        stream_signature_name(music_id), request.GET.get("exp"), request.GET.get("sig")
+    ):
+        return JsonResponse({"error": "Invalid or expired link"}, status=403)
+    seek = request.GET.get("t")
+    if seek is not None:
+        try:
+            seek = float(seek)
+            if not math.isfinite(seek) or seek < 0:
+                raise ValueError(seek)
+        except ValueError:
+            return JsonResponse({"error": "Invalid seek time"}, status=400)
+    try:
+        music = Music.objects.only("audio_file", "bitrate").get(id=music_id)
+        name = music.audio_file.name
+        rendition = select_rendition(request, music)
+        if rendition is not None:
+            name = rendition[1]
+        response = serve_media_file(request, name, seek=seek)
+    except (Music.DoesNotExist, FileNotFoundError, SuspiciousFileOperation):
+        return JsonResponse({"error": "Music not found"}, status=404)
+
+    response["X-Audio-Bitrate"] = str(rendition[0] if rendition else music.bitrate or "")
+    patch_vary_headers(response, ["Downlink", "Save-Data"])
+    return response
+
+
+def select_rendition(request, music):
+    """
+    نسخه‌ی مناسب بر اساس ?quality=low|medium|high|original|<kbps>، هدر Save-Data و
+    پهنای باند (?bandwidth=<kbps> یا Client Hint به نام Downlink). بدون هیچ‌کدام فایل اصلی.
+    """
+    quality = request.GET.get("quality")
+    bandwidth = parse_bandwidth(request)
+    save_data = request.META.get("HTTP_SAVE_DATA", "").lower() == "on"
+    if quality is None and bandwidth is None and not save_data:
+        return None
+    renditions = list(music.renditions.values_list("bitrate", "name"))
+    return choose_rendition(
+        renditions,
+        source_bitrate=music.bitrate,
+        quality=quality,
+        bandwidth=bandwidth,
+        save_data=save_data,
+    )
+
+
+@require_http_methods(["GET", "HEAD"])
+def music_waveform(request, music_id):
+    """
+    peaks شکل موج به صورت باینری (core/waveform.py). فایل از روی بایت‌های ثابت
+    آهنگ ساخته می‌شود، پس کلاینت می‌تواند آن را برای همیشه cache کند.
+    """
+    try:
+        music = Music.objects.only("audio_file").get(id=music_id)
+        response = ranged_file_response(
+            request, peaks_path(music.audio_file.path), content_type="application/octet-stream"
+        )
+    except (Music.DoesNotExist, FileNotFoundError, ValueError):
+        return JsonResponse({"error": "Waveform not found"}, status=404)
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_media(request, name):
+    """تحویل فایل مدیا با آدرس امضاشده و دارای انقضا"""
+    if not verify_media_signature(name, request.GET.get("exp"), request.GET.get("sig")):
+        return JsonResponse({"error": "Invalid or expired link"}, status=403)
+    try:
+        return serve_media_file(request, name)
+    except (FileNotFoundError, SuspiciousFileOperation):
+        return JsonResponse({"error": "File not found"}, status=404)
+
+
+class MusicPlayedView(APIView):
+    permission_classes = [AllowAny]
+
+    def post(self, request, music_id):
+        """ثبت یک پخش؛ فقط به بافر اضافه می‌شود و بعداً یکجا در دیتابیس نوشته می‌شود"""
+        record_plays([music_id], request.user)
+        return Response({"queued": 1}, status=status.HTTP_202_ACCEPTED)
+
+
+class MusicPlayedBatchView(APIView):
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        """ثبت چند پخش در یک درخواست: {"music_ids": [...]}"""
+        music_ids = request.data.get("music_ids")
+        if not isinstance(music_ids, list) or not music_ids:
             return Response(
-                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {"error": "music_ids must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(music_ids) > MAX_BATCH_PLAYS:
+            return Response(
+                {"error": f"At most {MAX_BATCH_PLAYS} plays per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            music_ids = [int(music_id) for music_id in music_ids]
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "music_ids must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
+        record_plays(music_ids, request.user)
+        return Response({"queued": len(music_ids)}, status=status.HTTP_202_ACCEPTED)
+
 
 class LikeMusicView(APIView):
     permission_classes = [IsAuthenticated]
@@ -192,14 +569,13 @@ class LikeMusicView(APIView):
     def post(self, request, music_id):
         try:
             music = Music.objects.get(id=music_id)
-            if music.likes.filter(id=request.user.id).exists():
-                music.likes.remove(request.user)
+            if music.remove_like(request.user):
                 liked = False
             else:
-                music.likes.add(request.user)
+                music.add_like(request.user)
                 liked = True
 
-            return Response({"liked": liked, "like_count": music.like_count()})
+            return Response({"liked": liked, "like_count": music.like_count})
         except Music.DoesNotExist:
             return Response(
                 {"error": "Music not found"}, status=status.HTTP_404_NOT_FOUND
@@ -210,16 +586,33 @@ class LikeMusicView(APIView):
             )
 
 
-class LikedMusicView(APIView):
+class LikedMusicView(VersionedResponseMixin, APIView):
     permission_classes = [IsAuthenticated]
 
+    def get_version_scopes(self, request):
+        return [CATALOG, likes_scope(request.user.id)]
+
+    def get_version_counters(self, request):
+        paginator = KeysetPaginator(request, "uploaded_at")
+        try:
+            page = paginator.page_queryset(Music.objects.filter(likes=request.user))
+        except InvalidCursor:
+            # get همان خطا را با 400 برمی‌گرداند
+            return None
+        return page_counters(page, paginator.get_page_size())
+
     def get(self, request):
         try:
-            liked_music = Music.objects.filter(likes=request.user)
+            paginator = KeysetPaginator(request, "uploaded_at")
+            liked_music = paginator.paginate(
+                Music.objects.filter(likes=request.user).select_related("uploaded_by")
+            )
             serializer = MusicSerializer(
                 liked_music, many=True, context={"request": request}
             )
-            return Response(serializer.data)
+            return Response(paginator.get_response_data(serializer.data))
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -227,13 +620,21 @@ class LikedMusicView(APIView):
 
 
 
-class PlaylistListView(APIView):
+class PlaylistListView(VersionedResponseMixin, APIView):
     permission_classes = [IsAuthenticated]
 
+    def get_version_scopes(self, request):
+        # لیست پلی‌لیست‌ها به همراه تعداد آهنگ‌های لایک‌شده
+        return [playlists_scope(request.user.id), likes_scope(request.user.id)]
+
     def get(self, request):
         try:
-            user_playlists = Playlist.objects.filter(owner=request.user)
-            playlist_data = PlaylistSerializer(user_playlists, many=True).data
+            user_playlists = Playlist.objects.filter(owner=request.user).select_related(
+                "owner", "cover_song"
+            )
+            playlist_data = PlaylistSerializer(
+                user_playlists, many=True, context={"request": request}
+            ).data
 
             liked_songs_count = Music.objects.filter(likes=request.user).count()
             liked_playlist = {
@@ -295,8 +696,7 @@ class AddToPlaylistView(APIView):
 
             if playlist_id == "liked_songs":
                 song = Music.objects.get(id=song_id)
-                if not song.likes.filter(id=request.user.id).exists():
-                    song.likes.add(request.user)
+                if song.add_like(request.user):
                     return Response({"message": "Added to liked songs"})
                 else:
                     return Response({"message": "Already in liked songs"})
@@ -323,13 +723,22 @@ class AddToPlaylistView(APIView):
             )
 
 
-class GetUserPlaylistsView(APIView):
+class GetUserPlaylistsView(VersionedResponseMixin, APIView):
     permission_classes = [IsAuthenticated]
 
+    def get_version_scopes(self, request):
+        return [playlists_scope(request.user.id)]
+
     def get(self, request):
         try:
-            playlists = Playlist.objects.filter(owner=request.user)
-            return Response(PlaylistSerializer(playlists, many=True).data)
+            playlists = Playlist.objects.filter(owner=request.user).select_related(
+                "owner", "cover_song"
+            )
+            return Response(
+                PlaylistSerializer(
+                    playlists, many=True, context={"request": request}
+                ).data
+            )
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -341,11 +750,16 @@ class CreatePlaylistPageView(APIView):
 
     def get(self, request):
         try:
-            all_music = Music.objects.all()
+            paginator = KeysetPaginator(request, "uploaded_at")
+            all_music = paginator.paginate(
+                filter_music_list(request, Music.objects.select_related("uploaded_by"))
+            )
             serializer = MusicSerializer(
                 all_music, many=True, context={"request": request}
             )
-            return Response(serializer.data)
+            return Response(paginator.get_response_data(serializer.data))
+        except (InvalidCursor, InvalidFilter) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -367,29 +781,36 @@ class CreatePlaylistFinalView(APIView):
                     {"error": "Playlist name is required"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-
-            playlist = Playlist.objects.create(
-                name=name,
-                description=description,
-                owner=request.user,
-                is_public=is_public,
-            )
-
-            for song_id in song_ids:
-                try:
-                    song = Music.objects.get(id=song_id)
-                    PlaylistSong.objects.create(playlist=playlist, song=song)
-                except Music.DoesNotExist:
-                    continue
+            if not isinstance(song_ids, list):
+                song_ids = []
+
+            with transaction.atomic():
+                playlist = Playlist.objects.create(
+                    name=name,
+                    description=description,
+                    owner=request.user,
+                    is_public=is_public,
+                )
+                # همه‌ی آهنگ‌ها با یک bulk_create؛ مثل قبل idهای نامعتبر یا ناموجود
+                # نادیده گرفته می‌شوند و ساخت پلی‌لیست را خراب نمی‌کنند
+                song_ids = [song_id for song_id in song_ids if valid_song_id(song_id)]
+                song_count = 0
+                if song_ids:
+                    editor = edit_playlist(
+                        playlist, [{"op": "add", "song_ids": song_ids}]
+                    )
+                    song_count = len(editor.order)
 
             return Response(
                 {
                     "message": "Playlist created successfully",
                     "playlist_id": playlist.id,
-                    "song_count": len(song_ids),
+                    "song_count": song_count,
                     "is_public": playlist.is_public,
                 }
             )
+        except PlaylistEditError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -402,7 +823,12 @@ class PlaylistDetailView(APIView):
     def get(self, request, playlist_id):
         try:
             if playlist_id == "liked_songs":
-                liked_songs = Music.objects.filter(likes=request.user)
+                paginator = KeysetPaginator(request, "uploaded_at")
+                liked_songs = paginator.paginate(
+                    Music.objects.filter(likes=request.user).select_related(
+                        "uploaded_by"
+                    )
+                )
                 playlist_data = {
                     "id": "liked_songs",
                     "name": "Liked Songs",
@@ -415,9 +841,12 @@ class PlaylistDetailView(APIView):
                 }
             else:
                 playlist = Playlist.objects.get(id=int(playlist_id), owner=request.user)
-                playlist_songs = PlaylistSong.objects.filter(
-                    playlist=playlist
-                ).order_by("added_at")
+                paginator = KeysetPaginator(request, "position", descending=False)
+                playlist_songs = paginator.paginate(
+                    PlaylistSong.objects.filter(playlist=playlist).select_related(
+                        "song__uploaded_by"
+                    )
+                )
                 songs = [ps.song for ps in playlist_songs]
 
                 playlist_data = {
@@ -431,8 +860,11 @@ class PlaylistDetailView(APIView):
                     ).data,
                 }
 
+            playlist_data["next"] = paginator.next_cursor
             return Response(playlist_data)
 
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Playlist.DoesNotExist:
             return Response(
                 {"error": "Playlist not found or access denied"},
@@ -444,6 +876,46 @@ class PlaylistDetailView(APIView):
             )
 
 
+class EditPlaylistSongsView(APIView):
+    """
+    ویرایش گروهی آهنگ‌های پلی‌لیست در یک تراکنش:
+    {"operations": [{"op": "add", "song_ids": [...], "after": id},
+                    {"op": "remove", "song_ids": [...]},
+                    {"op": "move", "song_id": id, "before": id}]}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, playlist_id):
+        try:
+            with transaction.atomic():
+                # قفل پلی‌لیست تا دو ویرایش همزمان position ها را از روی یک نسخه حساب نکنند
+                playlist = Playlist.objects.select_for_update().get(
+                    id=playlist_id, owner=request.user
+                )
+                body = request.data if isinstance(request.data, dict) else {}
+                editor = edit_playlist(playlist, body.get("operations"))
+
+            return Response(
+                {
+                    "message": "Playlist updated",
+                    "added": len(editor.added),
+                    "removed": len(editor.removed),
+                    "moved": len(editor.moved),
+                    "skipped": editor.skipped,
+                    "song_count": len(editor.order),
+                    "song_ids": editor.order,
+                }
+            )
+        except Playlist.DoesNotExist:
+            return Response({"error": "Playlist not found"}, status=404)
+        except PlaylistEditError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class DeletePlaylistView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -472,135 +944,164 @@ class RemoveSongFromPlaylistView(APIView):
             return Response({"error": "Playlist or song not found"}, status=404)
 
 
-class PublicPlaylistsView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
+# مرتب‌سازی‌های پلی‌لیست‌های عمومی؛ هر کدام ایندکس (is_public, -field, -id) دارد
+PUBLIC_PLAYLIST_SORTS = {
+    "newest": "created_at",
+    "songs": "song_count",
+    "likes": "total_likes",
+}
+
+
+class PublicPlaylistsView(View):
+    """
+    پلی‌لیست‌های عمومی با صفحه‌بندی cursor: ?sort=newest|songs|likes و ?name=<بخشی از نام>.
+    تعداد آهنگ، نام سازنده و کاور از خلاصه‌ی ذخیره‌شده روی Playlist در همان یک کوئری می‌آیند.
+    """
+    http_method_names = ["get", "head"]
+
+    async def get(self, request):
+        user = await jwt_user(request)
+        if user is None or not user.is_authenticated:
+            return unauthorized()
+        request.user = user
+
+        sort = request.GET.get("sort", "newest")
+        if sort not in PUBLIC_PLAYLIST_SORTS:
+            return json_response(
+                {"error": f"sort must be one of: {', '.join(PUBLIC_PLAYLIST_SORTS)}"},
+                status=400,
+            )
         try:
-            print("🔍 Fetching public playlists...")
+            playlists = (
+                Playlist.objects.filter(is_public=True)
+                .annotate(owner_name=F("owner__username"))
+                .select_related("cover_song")
+            )
+            name = request.GET.get("name", "").strip()
+            if name:
+                playlists = playlists.filter(name__icontains=name)
 
-            
-            playlists = Playlist.objects.filter(is_public=True)
-            print(f"📊 Found {playlists.count()} public playlists")
+            paginator = KeysetPaginator(request, PUBLIC_PLAYLIST_SORTS[sort])
+            page = await paginator.apaginate(playlists)
 
-            playlists_data = []
-            for playlist in playlists:
-                
-                playlist_info = {
+            media_urls = get_media_urls(request)
+            playlists_data = [
+                {
                     "id": playlist.id,
                     "name": playlist.name or "Unnamed Playlist",
-                    "owner_name": (
-                        playlist.owner.username if playlist.owner else "Unknown"
-                    ),
+                    "owner_name": playlist.owner_name,
                     "description": playlist.description or "",
-                    "song_count": 0,
-                    "cover_url": None,
+                    "song_count": playlist.song_count,
+                    "total_duration": playlist.total_duration,
+                    "total_likes": playlist.total_likes,
+                    "created_at": playlist.created_at,
+                    "cover_url": media_urls.playlist_cover_url(playlist),
+                    "cover_srcset": media_urls.srcset(playlist.mosaic),
                 }
-
-                
-                try:
-                    playlist_info["song_count"] = PlaylistSong.objects.filter(
-                        playlist=playlist
-                    ).count()
-                except Exception as e:
-                    print(f"⚠️ Error counting songs for playlist {playlist.id}: {e}")
-                    playlist_info["song_count"] = 0
-
-                
-                try:
-                    first_song_rel = PlaylistSong.objects.filter(
-                        playlist=playlist
-                    ).first()
-                    if (
-                        first_song_rel
-                        and first_song_rel.song
-                        and first_song_rel.song.cover_image
-                    ):
-                        playlist_info["cover_url"] = request.build_absolute_uri(
-                            first_song_rel.song.cover_image.url
-                        )
-                except Exception as e:
-                    print(f"⚠️ Error getting cover for playlist {playlist.id}: {e}")
-
-                playlists_data.append(playlist_info)
-                print(f"✅ Added playlist: {playlist_info['name']}")
-
-            print(f"🎉 Successfully processed {len(playlists_data)} playlists")
-            return Response(playlists_data)
-
-        except Exception as e:
-            print(f"❌ Critical error in PublicPlaylistsView: {str(e)}")
-            import traceback
-
-            print(f"❌ Traceback: {traceback.format_exc()}")
-            return Response(
-                {"error": "Failed to load public playlists", "debug": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
-
-
-@api_view(["GET"])
-@authentication_classes([JWTAuthentication])
-@permission_classes([IsAuthenticated])
-def public_playlist_detail_simple(request, playlist_id):
+                for playlist in page
+            ]
+            return json_response(paginator.get_response_data(playlists_data))
+        except InvalidCursor as e:
+            return json_response({"error": str(e)}, status=400)
+        except Exception:
+            logger.exception("Failed to load public playlists")
+            return json_response({"error": "Failed to load public playlists"}, status=500)
+
+
+def public_playlist_etag(playlist, media_urls):
+    # آدرس‌های امضاشده با پنجره‌ی انقضا عوض می‌شوند، پس آن هم جزو ETag است
+    etag = f"playlist-{playlist.id}-v{playlist.version}"
+    if media_urls.signed:
+        etag += f"-e{media_urls.expires}"
+    return f'"{etag}"'
+
+
+async def public_playlist_response(request, playlist_id):
+    """
+    صفحه‌ای از آهنگ‌های یک پلی‌لیست عمومی (به ترتیب position، با cursor).
+    اگر کلاینت If-None-Match دارد اول فقط خود پلی‌لیست خوانده می‌شود و با نسخه‌ی
+    یکسان 304 برمی‌گردد بدون اینکه سراغ آهنگ‌ها برود؛ وگرنه پلی‌لیست و صفحه‌ی آهنگ‌ها
+    (با آپلودکننده‌هایشان) همزمان خوانده می‌شوند.
+    """
+    paginator = KeysetPaginator(request, "position", descending=False)
     try:
-        print(f"🔍 Loading public playlist detail: {playlist_id}")
-
-        playlist = Playlist.objects.get(id=playlist_id, is_public=True)
-
-        songs_data = []
-        try:
-            playlist_songs = PlaylistSong.objects.filter(
-                playlist=playlist
-            ).select_related("song")
-
-            for playlist_song in playlist_songs:
-                song = playlist_song.song
-                song_data = {
-                    "id": song.id,
-                    "title": song.title,
-                    "artist": song.artist or "Unknown Artist",
-                    "uploaded_by": song.uploaded_by.username,
-                }
-
-                
-                try:
-                    song_data["audio_url"] = request.build_absolute_uri(
-                        song.audio_file.url
-                    )
-                except:
-                    song_data["audio_url"] = None
-
-                try:
-                    if song.cover_image:
-                        song_data["cover_url"] = request.build_absolute_uri(
-                            song.cover_image.url
-                        )
-                    else:
-                        song_data["cover_url"] = None
-                except:
-                    song_data["cover_url"] = None
-
-                songs_data.append(song_data)
-        except Exception as e:
-            print(f"⚠️ Error loading songs: {e}")
-
-        playlist_data = {
+        page = paginator.page_queryset(
+            PlaylistSong.objects.filter(playlist_id=playlist_id)
+            .select_related("song__uploaded_by")
+            .only(
+                "position",
+                "song__id",
+                "song__title",
+                "song__artist",
+                "song__audio_file",
+                "song__cover_image",
+                "song__cover_thumbnails",
+                "song__uploaded_by__username",
+            )
+        )
+    except InvalidCursor as e:
+        return json_response({"error": str(e)}, status=400)
+    playlist_query = (
+        Playlist.objects.filter(id=playlist_id, is_public=True)
+        .annotate(owner_name=F("owner__username"))
+    )
+
+    media_urls = get_media_urls(request)
+    if request.headers.get("If-None-Match"):
+        playlist = await playlist_query.afirst()
+        if playlist is None:
+            return json_response({"error": "Playlist not found or not public"}, status=404)
+        etag = public_playlist_etag(playlist, media_urls)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+            patch_cache_control(not_modified, no_cache=True)
+            return not_modified
+        playlist_songs = await paginator.afetch(page)
+    else:
+        playlist, playlist_songs = await asyncio.gather(
+            playlist_query.afirst(), paginator.afetch(page)
+        )
+        if playlist is None:
+            return json_response({"error": "Playlist not found or not public"}, status=404)
+        etag = public_playlist_etag(playlist, media_urls)
+
+    songs_data = [
+        {
+            "id": song.id,
+            "title": song.title,
+            "artist": song.artist or "Unknown Artist",
+            "uploaded_by": song.uploaded_by.username,
+            "audio_url": media_urls.audio_url(song),
+            "cover_url": media_urls.cover_url(song),
+        }
+        for song in (playlist_song.song for playlist_song in playlist_songs)
+    ]
+    response = json_response(
+        {
             "id": playlist.id,
             "name": playlist.name,
-            "owner": playlist.owner.username,
-            "description": playlist.description or "No description",
-            "song_count": len(songs_data),
+            "owner": playlist.owner_name,
+            "description": playlist.description or "",
+            "song_count": playlist.song_count,
+            "total_duration": playlist.total_duration,
+            "is_public": playlist.is_public,
             "songs": songs_data,
+            "next": paginator.next_cursor,
         }
+    )
+    response["ETag"] = etag
+    # کلاینت هر بار با If-None-Match می‌پرسد و اگر چیزی عوض نشده باشد 304 می‌گیرد
+    patch_cache_control(response, no_cache=True)
+    return response
 
-        return JsonResponse(playlist_data)
 
-    except Playlist.DoesNotExist:
-        return JsonResponse({"error": "Playlist not found or not public"}, status=404)
-    except Exception as e:
-        print(f"❌ Error in public_playlist_detail_simple: {str(e)}")
-        return JsonResponse({"error": "Internal server error"}, status=500)
+@require_http_methods(["GET", "HEAD"])
+async def public_playlist_detail_simple(request, playlist_id):
+    user = await jwt_user(request)
+    if user is None or not user.is_authenticated:
+        return unauthorized()
+    return await public_playlist_response(request, playlist_id)
 
 
 @api_view(["POST"])
@@ -654,72 +1155,134 @@ def test_public_playlists(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 
-from django.db.models import Count, Q
+class PopularMusicView(View):
+    http_method_names = ["get", "head"]
+
+    async def get(self, request):
+        """چارت موزیک‌های پرطرفدار (daily / weekly / all_time) از جدول از پیش محاسبه‌شده"""
+        request.user = AnonymousUser()
+        try:
+            window = request.GET.get("window", ChartEntry.WINDOW_ALL_TIME)
+            if window not in dict(ChartEntry.WINDOW_CHOICES):
+                return json_response({"error": "Invalid window"}, status=400)
+            try:
+                limit = int(request.GET.get("limit", 5))
+            except ValueError:
+                limit = 5
+            limit = max(1, min(limit, CHART_SIZE))
+
+            popular_music = [
+                entry.music
+                async for entry in ChartEntry.objects.filter(window=window)
+                .select_related("music__uploaded_by")
+                .order_by("rank")[:limit]
+            ]
+
+            # اگر چارت هنوز ساخته نشده، از ستون ایندکس‌دار like_count استفاده می‌شود؛
+            # هدر X-Chart-Fallback به کلاینت می‌گوید این چارت ترند واقعی نیست
+            fallback = not popular_music
+            if fallback:
+                logger.warning(
+                    "Chart %r has not been computed; falling back to like_count. "
+                    "Run the refresh_charts command.",
+                    window,
+                )
+                popular_music = [
+                    music
+                    async for music in Music.objects.select_related("uploaded_by").order_by(
+                        "-like_count", "-id"
+                    )[:limit]
+                ]
 
+            serializer = MusicSerializer(
+                popular_music, many=True, context={"request": request}
+            )
+            response = json_response(serializer.data)
+            if fallback:
+                response["X-Chart-Fallback"] = "like_count"
+            return response
 
-class PopularMusicView(APIView):
-    authentication_classes = []
-    permission_classes = [AllowAny]
+        except Exception as e:
+            return json_response({"error": str(e)}, status=500)
 
-    def get(self, request):
-        """لیست 5 موزیک پرطرفدار بر اساس تعداد لایک"""
-        try:
-            print("🔥 Fetching popular music...")
 
-            # روش بهینه: استفاده از annotate برای شمارش لایک‌ها
-            from django.db.models import Count
+class SearchMusicView(View):
+    http_method_names = ["get", "head"]
 
-            popular_music = Music.objects.annotate(
-                likes_count=Count("likes")  # نام فیلد را به likes_count تغییر دادیم
-            ).order_by("-likes_count")[:5]
+    async def get(self, request):
+        """جستجوی موزیک"""
+        request.user = AnonymousUser()
+        try:
+            query = request.GET.get("q", "").strip()
+            limit, offset = get_search_page(request)
 
-            print(f"✅ Found {popular_music.count()} popular songs")
+            if not query:
+                return json_response({"results": [], "next": None})
 
-            # دیباگ: چک کردن داده‌ها
-            for music in popular_music:
-                print(f"🎵 {music.title}: {music.likes_count} likes")
+            # جستجوی تمام‌متن (FTS5) با رتبه‌بندی bm25
+            results, has_more = await asearch_music(query, limit, offset)
 
             serializer = MusicSerializer(
-                popular_music, many=True, context={"request": request}
+                results, many=True, context={"request": request}
+            )
+            return json_response(
+                {
+                    "results": serializer.data,
+                    "next": offset + limit if has_more else None,
+                }
             )
-            return Response(serializer.data)
 
         except Exception as e:
-            print(f"❌ Error in PopularMusicView: {str(e)}")
-            import traceback
+            return json_response({"error": str(e)}, status=500)
 
-            print(f"❌ Traceback: {traceback.format_exc()}")
+
+class SuggestMusicView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """پیشنهاد هنگام تایپ از ایندکس درون‌حافظه‌ای؛ بدون کوئری به دیتابیس"""
+        try:
+            query = request.GET.get("q", "")
+            try:
+                limit = int(request.GET.get("limit", suggest.DEFAULT_SUGGEST_LIMIT))
+            except ValueError:
+                limit = suggest.DEFAULT_SUGGEST_LIMIT
+            limit = max(1, min(limit, suggest.MAX_SUGGEST_LIMIT))
+            return Response(suggest.suggest(query, limit))
+        except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
-class SearchMusicView(APIView):
-    authentication_classes = []
-    permission_classes = [AllowAny]
+class PublicPlaylistSearchView(View):
+    http_method_names = ["get", "head"]
 
-    def get(self, request):
-        """جستجوی موزیک"""
+    async def get(self, request):
+        """جستجوی پلی‌لیست‌های عمومی"""
+        request.user = AnonymousUser()
         try:
             query = request.GET.get("q", "").strip()
+            limit, offset = get_search_page(request)
 
             if not query:
-                return Response([])
+                return json_response({"results": [], "next": None})
 
-            # جستجو در دیتابیس
-            results = Music.objects.filter(
-                Q(title__icontains=query) | Q(artist__icontains=query)
-            ).order_by("-uploaded_at")[:10]
+            results, has_more = await asearch_public_playlists(query, limit, offset)
 
-            serializer = MusicSerializer(
+            serializer = PlaylistSerializer(
                 results, many=True, context={"request": request}
             )
-            return Response(serializer.data)
+            return json_response(
+                {
+                    "results": serializer.data,
+                    "next": offset + limit if has_more else None,
+                }
+            )
 
         except Exception as e:
-            return Response(
-                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+            return json_response({"error": str(e)}, status=500)
 
 
 from django.contrib.auth import get_user_model
@@ -752,8 +1315,7 @@ class DeleteAccountView(APIView):
             print(f"📋 Deleted {playlist_count} playlists")
 
             # 4. حذف لایک‌های کاربر
-            liked_music_count = user.liked_music.count()
-            user.liked_music.clear()
+            liked_music_count = Music.remove_all_likes(user)
             print(f"❤️ Removed {liked_music_count} likes")
 
             # 5. حذف خود کاربر از دیتابیس
@@ -805,8 +1367,7 @@ class DeleteAccountView(APIView):
             print(f"📋 Deleted {playlist_count} playlists")
 
             # 4. حذف لایک‌های کاربر
-            liked_music_count = user.liked_music.count()
-            user.liked_music.clear()
+            liked_music_count = Music.remove_all_likes(user)
             print(f"❤️ Removed {liked_music_count} likes")
 
             # 5. حذف خود کاربر از دیتابیس
@@ -860,76 +1421,102 @@ class DeleteMusicView(APIView):
 
 
 
-@api_view(["GET"])
-@authentication_classes([JWTAuthentication])
-def public_playlist_detail(request, playlist_id):
-    try:
-        print(f"🔍 Loading public playlist detail: {playlist_id}")
+@require_http_methods(["GET", "HEAD"])
+async def public_playlist_detail(request, playlist_id):
+    # ورود لازم نیست، ولی توکن نامعتبر مثل قبل 401 می‌گیرد
+    if await jwt_user(request) is None:
+        return unauthorized()
+    return await public_playlist_response(request, playlist_id)
 
-        
-        playlist = Playlist.objects.get(id=playlist_id, is_public=True)
 
-       
-        playlist_songs = PlaylistSong.objects.filter(playlist=playlist).select_related(
-            "song"
-        )
-        songs_data = []
-
-        for playlist_song in playlist_songs:
-            song = playlist_song.song
-            song_data = {
-                "id": song.id,
-                "title": song.title,
-                "artist": song.artist or "Unknown Artist",
-                "uploaded_by": song.uploaded_by.username,
-            }
 
-            
-            try:
-                if song.audio_file:
-                    song_data["audio_url"] = request.build_absolute_uri(
-                        song.audio_file.url
-                    )
-                else:
-                    song_data["audio_url"] = None
-            except Exception as e:
-                print(f"⚠️ Error getting audio URL: {e}")
-                song_data["audio_url"] = None
+class SyncView(APIView):
+    """
+    بدون since: snapshot کامل کتابخانه‌ی کاربر؛ با ?since=<cursor>: فقط تغییرات بعد از آن.
+    کلاینت cursor برگشتی را نگه می‌دارد و تا has_more درست است دوباره می‌پرسد.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        since = request.query_params.get("since")
+        try:
+            if since is None:
+                # cursor قبل از خواندن داده گرفته می‌شود تا تغییر همزمان از دست نرود
+                cursor = latest_cursor()
+                return Response(
+                    {
+                        "snapshot": True,
+                        "cursor": cursor,
+                        "has_more": False,
+                        "changes": build_snapshot(request),
+                    }
+                )
 
             try:
-                if song.cover_image:
-                    song_data["cover_url"] = request.build_absolute_uri(
-                        song.cover_image.url
-                    )
-                else:
-                    song_data["cover_url"] = None
-            except Exception as e:
-                print(f"⚠️ Error getting cover URL: {e}")
-                song_data["cover_url"] = None
+                since = int(since)
+            except ValueError:
+                return Response({"error": "Invalid since cursor"}, status=status.HTTP_400_BAD_REQUEST)
+            if since < 0:
+                return Response({"error": "Invalid since cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+            changes, cursor, has_more = changes_since(request.user, since)
+            return Response(
+                {
+                    "snapshot": False,
+                    "cursor": cursor,
+                    "has_more": has_more,
+                    "changes": build_delta(request, changes),
+                }
+            )
+        except SyncCursorExpired:
+            return Response(
+                {"error": "Sync cursor expired, fetch a full snapshot", "resync": True},
+                status=status.HTTP_410_GONE,
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
-            songs_data.append(song_data)
 
-        playlist_data = {
-            "id": playlist.id,
-            "name": playlist.name,
-            "owner": playlist.owner.username,
-            "description": playlist.description or "",
-            "song_count": len(songs_data),
-            "songs": songs_data,
-            "is_public": playlist.is_public,
-        }
 
-        print(
-            f"✅ Successfully loaded playlist: {playlist.name} with {len(songs_data)} songs"
+MAX_STREAM_SONGS = 200
+
+
+@require_http_methods(["GET"])
+async def event_stream(request):
+    """
+    SSE: رویدادهای like_count برای آهنگ‌های ?songs=1,2,3 و processing برای آپلودهای
+    خود کاربر. EventSource هدر نمی‌فرستد، پس توکن دسترسی با ?token= هم پذیرفته می‌شود.
+    توکن بدون کوئری دیتابیس بررسی می‌شود؛ فقط زیر ASGI (muzic56/asgi.py) اجرا شود.
+    """
+    authenticator = JWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header else request.GET.get("token")
+    if not raw_token:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    try:
+        token = authenticator.get_validated_token(raw_token)
+    except InvalidToken:
+        return JsonResponse({"error": "Invalid or expired token"}, status=401)
+    user_id = token[jwt_settings.USER_ID_CLAIM]
+
+    try:
+        song_ids = {int(value) for value in request.GET.get("songs", "").split(",") if value}
+    except ValueError:
+        return JsonResponse({"error": "songs must be a comma-separated list of ids"}, status=400)
+    if len(song_ids) > MAX_STREAM_SONGS:
+        return JsonResponse(
+            {"error": f"At most {MAX_STREAM_SONGS} songs per stream"}, status=400
         )
-        return JsonResponse(playlist_data)
 
-    except Playlist.DoesNotExist:
-        print(f"❌ Playlist not found or not public: {playlist_id}")
-        return JsonResponse({"error": "Playlist not found or not public"}, status=404)
-    except Exception as e:
-        print(f"❌ Error in public_playlist_detail: {str(e)}")
-        import traceback
+    channels = [user_channel(user_id)] + [music_channel(song_id) for song_id in song_ids]
+    listener = hub.subscribe(channels)
+    response = StreamingHttpResponse(
+        sse_stream(listener, token["exp"]), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # nginx نباید پاسخ را بافر کند
+    response["X-Accel-Buffering"] = "no"
+    return response
 
-        print(f"❌ Traceback: {traceback.format_exc()}")
-        return JsonResponse({"error": "Internal server error"}, status=500)
@@ -13,6 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'muzic56.settings')
 
+# /api/events/ (SSE) یک view async است و اتصال‌های باز را فقط زیر سرور ASGI
+# (مثلاً uvicorn muzic56.asgi:application) بدون گرفتن یک thread نگه می‌دارد
 application = get_asgi_application()
 
+# ساختن ایندکس پیشنهاد جستجو هنگام بالا آمدن سرور
+from core import suggest  # noqa: E402
+
+suggest.warm()
+
 #WSGI و ASGI هر دو interface (رابط) بین وب‌سرور و فریم‌ورک وب (مثل Django) هستن.
@@ -141,6 +141,38 @@ REST_FRAMEWORK = {
 }
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# آدرس‌دهی مدیا: پیشوند CDN (خالی یعنی هاست همان درخواست)، امضای آدرس‌ها و سپردن ارسال فایل به وب‌سرور
+MEDIA_BASE_URL = ''
+MEDIA_SIGNED_URLS = False
+MEDIA_URL_TTL = 3600
+MEDIA_OFFLOAD = None  # 'nginx' برای X-Accel-Redirect یا 'sendfile' برای X-Sendfile
+MEDIA_OFFLOAD_PREFIX = '/protected-media/'
+# حداکثر عمر ایندکس پیشنهاد جستجو (ثانیه) قبل از بازسازی در پس‌زمینه
+SUGGEST_INDEX_MAX_AGE = 300
+# بافر رویدادهای پخش: با رسیدن به این تعداد یا گذشتن این چند ثانیه یکجا نوشته می‌شود
+PLAY_BUFFER_SIZE = 500
+PLAY_BUFFER_FLUSH_SECONDS = 5
+# آپلود چندتکه: حداکثر اندازه‌ی فایل و عمر آپلودهای نیمه‌کاره (ثانیه)
+MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+# صف کارهای پس‌زمینه (python manage.py runworker)
+JOB_WORKER_CONCURRENCY = 4
+JOB_POLL_INTERVAL = 1.0
+JOB_VISIBILITY_TIMEOUT = 300  # ثانیه؛ بعد از آن کار نیمه‌تمام دوباره برداشته می‌شود
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10  # ثانیه، برای تلاش اول؛ هر بار دو برابر می‌شود
+# مسیر ffmpeg برای decode و transcode (خالی یعنی جستجو در PATH)
+AUDIO_DECODER = None
+# نسخه‌های کم‌حجم هر آهنگ (kbps) و تعداد ffmpegهای همزمان برای هر آهنگ
+TRANSCODE_BITRATES = [64, 128, 256]
+TRANSCODE_CONCURRENCY = 2
+# رویدادهای زنده (/api/events/): 'database' تا runworker و همه‌ی پروسس‌های ASGI شریک باشند،
+# 'local' برای یک پروسس تنها، یا مسیر کلاس یک backend دیگر
+EVENTS_BACKEND = 'database'
+EVENTS_POLL_INTERVAL = 0.5  # ثانیه
+EVENTS_RETENTION = 300  # ثانیه
+EVENTS_HEARTBEAT = 15  # ثانیه
+EVENTS_MAX_PENDING = 32  # رویدادهای منتظر هر اتصال؛ بیشتر از این قدیمی‌ها دور ریخته می‌شوند
 AUTH_USER_MODEL = 'core.CustomUser'
 SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
@@ -15,4 +15,9 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'muzic56.settings')
 
 application = get_wsgi_application()
 
+# ساختن ایندکس پیشنهاد جستجو هنگام بالا آمدن سرور
+from core import suggest  # noqa: E402
+
+suggest.warm()
+
 #WSGI و ASGI هر دو interface (رابط) بین وب‌سرور و فریم‌ورک وب (مثل Django) هستن.